@@ -0,0 +1,124 @@
+#----------------------------------------------------------------------------#
+# JSON API.
+#----------------------------------------------------------------------------#
+
+# Collections stream as NDJSON straight off a server-side cursor
+# (yield_per), so an export of any size runs in constant memory and the
+# first row goes out as soon as the database returns it.
+
+import json
+from datetime import datetime
+from flask import Blueprint, current_app, request, Response, jsonify, stream_with_context
+import bulk
+from artists import artist_detail
+from conditional import conditional
+from extensions import db, typeahead
+from models import Artist, Show, Venue
+from shows import show_listing, create_show_batch
+from venues import venue_detail, venue_directory
+
+bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+def to_json(value):
+  return value.isoformat() if isinstance(value, datetime) else value
+
+def ndjson(query, serialize):
+  def generate():
+    buffered = []
+    for i, row in enumerate(query.yield_per(current_app.config['API_STREAM_BATCH'])):
+      buffered.append(json.dumps(serialize(row), default=to_json) + '\n')
+      # flush the first row at once, then in batches to keep writes large.
+      if i == 0 or len(buffered) >= current_app.config['API_STREAM_BATCH']:
+        yield ''.join(buffered)
+        buffered = []
+    if buffered:
+      yield ''.join(buffered)
+  return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def detail_json(data):
+  for key in ('upcoming_shows', 'past_shows'):
+    data[key] = [dict(show, start_time=to_json(show['start_time'])) for show in data[key]]
+  return jsonify(data)
+
+@bp.route('/venues')
+def api_venues():
+  query = venue_directory(db.session.query(Venue)).order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+  return ndjson(query, lambda row: {
+    'id': row.id,
+    'name': row.name,
+    'city': row.city,
+    'state': row.state,
+    'num_upcoming_shows': row.num_upcoming_shows
+  })
+
+@bp.route('/venues/<int:venue_id>')
+@conditional(Venue, 'venue_id')
+def api_venue(venue_id):
+  return detail_json(venue_detail(venue_id))
+
+@bp.route('/artists')
+def api_artists():
+  query = db.session.query(Artist.id, Artist.name).order_by(Artist.name, Artist.id)
+  return ndjson(query, lambda row: {'id': row.id, 'name': row.name})
+
+@bp.route('/artists/<int:artist_id>')
+@conditional(Artist, 'artist_id')
+def api_artist(artist_id):
+  return detail_json(artist_detail(artist_id))
+
+@bp.route('/shows')
+def api_shows():
+  query = show_listing().order_by(Show.start_time.desc(), Show.id.desc())
+  return ndjson(query, lambda row: {
+    'venue_id': row.venue_id,
+    'venue_name': row.venue_name,
+    'artist_id': row.artist_id,
+    'artist_name': row.artist_name,
+    'artist_image_link': row.artist_image_link,
+    'start_time': row.start_time
+  })
+
+@bp.route('/shows/batch', methods=['POST'])
+def api_create_shows():
+  # {"shows": [{"artist_id", "venue_id", "start_time"[, "end_time"]}, ...]},
+  # or one show plus "rrule", e.g. "FREQ=WEEKLY;BYDAY=FR;UNTIL=20270430".
+  # Artists and venues may be named by artist_name / venue_name instead.
+  # Rows are numbered from 1; those rejected are listed with their errors.
+  body = request.get_json(silent=True)
+  limit = current_app.config['SHOW_BATCH_MAX']
+  try:
+    if not isinstance(body, dict):
+      raise ValueError('expected a JSON object')
+    if 'rrule' in body:
+      rows = bulk.recurrences({key: value for key, value in body.items() if key != 'rrule'}, body['rrule'], limit)
+    else:
+      shows = body.get('shows')
+      if not isinstance(shows, list) or not all(isinstance(show, dict) for show in shows):
+        raise ValueError('expected "shows", a list of objects, or "rrule"')
+      if len(shows) > limit:
+        raise ValueError('at most %d shows per batch' % limit)
+      rows = list(enumerate(shows, 1))
+  except ValueError as e:
+    return jsonify({'error': str(e)}), 400
+
+  report, created = create_show_batch(rows)
+  return jsonify({
+    'created': [{key: to_json(row[key]) for key in ('id', 'artist_id', 'venue_id', 'start_time', 'end_time')}
+                for row in created],
+    'rejected': [{'row': number, 'errors': errors} for number, errors in sorted(report.rejected, key=lambda r: r[0])],
+  }), 201 if created else 422
+
+@bp.route('/typeahead')
+def api_typeahead():
+  # ?q=<prefix>[&kind=artist|venue][&limit=N]; served from memory.
+  kind = request.args.get('kind')
+  if kind is not None and kind not in typeahead.indexes:
+    return jsonify({'error': 'kind must be one of %s' % ', '.join(typeahead.indexes)}), 400
+  matches = typeahead.search(request.args.get('q', ''), [kind] if kind else None,
+                             request.args.get('limit', type=int))
+  return jsonify({kind + 's': entries for kind, entries in matches.items()})
+
+@bp.errorhandler(404)
+def api_not_found(error):
+  return jsonify({'error': 'not found'}), 404
+
@@ -2,564 +2,122 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
-#----------------------------------------------------------------------------#
-# App Config.
-#----------------------------------------------------------------------------#
+from flask import Flask, current_app, render_template
+import config
+import search
+import bookings
+import filters
+from extensions import db, page_cache, metrics, typeahead, assets, replicas, logs, defer_migrate, defer_moment
+from metrics import Gauge
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app,db)
-# TODO: connect to a local postgresql database
-
-#----------------------------------------------------------------------------#
-# Models.
 #----------------------------------------------------------------------------#
-
-class Venue(db.Model):
-
-
-  __tablename__ = 'venue'
-
-  id = db.Column(db.Integer, primary_key=True)
-  name = db.Column(db.String, nullable=False)
-  city = db.Column(db.String, nullable=False)
-  state = db.Column(db.String,nullable=False)
-  address = db.Column(db.String,nullable=False)
-  phone = db.Column(db.String, nullable=False)
-  genres = db.Column(db.String, nullable=False)
-  image_link = db.Column(db.String)
-  facebook_link = db.Column(db.String)
-  website = db.Column(db.String, nullable=False)
-  seeking_talent=db.Column(db.String) 
-  seeking_description=db.Column(db.String,nullable = True)
-  shows = db.relationship('Show', backref='venue', lazy=False)
-  
-  def __repr__(self):
-    return f'<Venue: {self.id}, name: {self.name}, city: {self.city}, state: {self.state}, address: {self.address}, phone: {self.phone}, image_link: {self.image_link}, facebook_link: {self.facebook_link}, genres: {self.genres}, website: {self.website}, shows: {self.shows}>'
-  
-    # TODO: implement any missing fields, as a database migration using Flask-Migrate
-
-class Artist(db.Model):
-  __tablename__ = 'artist'
-
-  id = db.Column(db.Integer, primary_key=True)
-  name = db.Column(db.String, nullable=False)
-  city = db.Column(db.String, nullable=False)
-  state = db.Column(db.String, nullable=False)
-  phone = db.Column(db.String, nullable=False)
-  genres = db.Column(db.String, nullable=False)
-  image_link = db.Column(db.String)
-  facebook_link = db.Column(db.String)
-  website = db.Column(db.String)
-  seeking_talent=db.Column(db.String) 
-  seeking_description=db.Column(db.String,nullable = True)
-  shows = db.relationship('Show', backref='artist', lazy=False)
-
-  def __repr__(self):
-    return f'<Artist: {self.id}, name: {self.name}, city: {self.city}, state: {self.state}, phone: {self.phone}, genres: {self.genres}, image_link: {self.image_link}, facebook_link: {self.facebook_link}, shows: {self.shows}>'
-    # TODO: implement any missing fields, as a database migration using Flask-Migrate
-
-
-
-class Show(db.Model):
-  i_tablename__ = 'show'
-
-  id = db.Column(db.Integer, primary_key=True)
-  start_time = db.Column(db.DateTime, nullable=False)
-  artist_id = db.Column(db.Integer, db.ForeignKey("artist.id"), nullable=False)
-  venue_id = db.Column(db.Integer, db.ForeignKey("venue.id"), nullable=False)
-
-  def __repr__(self):
-    return f'<Show {self.id}, date: {self.date}, artist_id: {self.artist_id}, venue_id: {self.venue_id}>'
-
-  #ralation:
-  # artist = db.relation('Artist',backref = 'shows', lazy="joined")
-  # vanue = db.relation('Venue',backref='shows', lazy="joined")
-# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
-
-#----------------------------------------------------------------------------#
-# Filters.
+# App Config.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
-
-app.jinja_env.filters['datetime'] = format_datetime
+# Only what every process needs is imported above. Flask-Migrate, Flask-
+# Moment, babel and dateutil load on first use, so a worker, a CLI job or a
+# benchmark pays for them only if it reaches them; `python
+# benchmarks/startup.py` holds create_app() to a time budget.
+
+def create_app(profile=None, settings=None):
+  '''Build the app for config profile `profile` (default: $FYYUR_ENV),
+  with `settings` overriding individual keys.'''
+  app = Flask(__name__)
+  app.config.from_object('config')
+  app.config.from_mapping(config.profile(profile))
+  if settings:
+    app.config.from_mapping(settings)
+
+  logs.init_app(app)
+  db.init_app(app)
+  replicas.init_app(app, db)
+  defer_migrate(app, include_object=include_object)
+  defer_moment(app)
+  page_cache.init_app(app)
+  metrics.init_app(app)
+  assets.init_app(app)
+
+  # the models register their tables on `db` and the search index on import.
+  from models import Artist, Venue
+  typeahead.init_app(app, {'artist': Artist, 'venue': Venue})
+  metrics.register(Gauge('fyyur_typeahead_bytes', 'Approximate memory held by the typeahead index.',
+                         typeahead.nbytes))
+  metrics.register(Gauge('fyyur_read_replicas_up', 'Read replicas in rotation.', replicas.up))
+  metrics.register(Gauge('fyyur_log_records_dropped', 'Log records dropped because the log queue was full.',
+                         lambda: logs.dropped))
+
+  filters.register(app)
+
+  import venues, artists, shows, api
+  app.add_url_rule('/', 'index', index)
+  for blueprint in (venues.bp, artists.bp, shows.bp, api.bp):
+    app.register_blueprint(blueprint)
+  app.register_error_handler(404, not_found_error)
+  app.register_error_handler(500, server_error)
+  app.before_request(check_database)
+
+  import commands
+  app.cli.add_command(commands.fyyur_cli)
+  app.cli.add_command(commands.warm_cache_command)
+
+  return app
+
+def include_object(*args):
+  # tables, columns and indexes the search and booking indexes maintain
+  # outside the models
+  return search.include_object(*args) and bookings.include_object(*args)
+
+def check_database():
+  # startup self-check, on each process's first request: log the pool each
+  # worker actually got and, on Postgres, that the statement timeout
+  # reached the session.
+  if 'database_checked' in current_app.extensions:
+    return
+  current_app.extensions['database_checked'] = True
+  pool = db.engine.pool
+  current_app.logger.info('%s profile, database %s, %s(size=%s, max_overflow=%s, timeout=%s, recycle=%s, pre_ping=%s)',
+    current_app.config['FYYUR_ENV'], repr(db.engine.url), type(pool).__name__,
+    pool.size() if hasattr(pool, 'size') else None, getattr(pool, '_max_overflow', None),
+    getattr(pool, '_timeout', None), pool._recycle, pool._pre_ping)
+  try:
+    with db.engine.connect() as connection:
+      if connection.dialect.name == 'postgresql':
+        current_app.logger.info('statement_timeout %s', connection.execute(db.text('SHOW statement_timeout')).scalar())
+      else:
+        connection.execute(db.text('SELECT 1'))
+  except Exception:
+    current_app.logger.exception('database self-check failed')
+  for replica in replicas.replicas:
+    if replicas.check(replica):
+      current_app.logger.info('read replica %s %s, %.1fs behind', replica.name,
+                              repr(replica.engine.url), replica.lag)
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
-def index():
-  return render_template('pages/home.html')
-    
-
-#  Venues
-#  ----------------------------------------------------------------
-
-@app.route('/venues')
-def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  locals = []
-  venues = Venue.query.all()
-  places = Venue.query.distinct(Venue.city, Venue.state).all()
-	
-  for place in places:
-      locals.append({
-          'city': place.city,
-          'state': place.state,
-          'venues': [{
-              'id': venue.id,
-              'name': venue.name,
-              'num_upcoming_shows': len([show for show in venue.shows if show.start_time > datetime.now()])
-          } for venue in venues if
-             venue.city == place.city and venue.state == place.state]
-      })
-  return render_template('pages/venues.html', areas=locals)
-  
-
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  search_term = request.form.get('search_term')
-  venues = Venue.query.filter(Venue.name.ilike('%'+search_term+'%')).all()
-  venue_list = []
-  now = datetime.now()
-  for venue in venues:
-    venues_show = Show.query.filter_by(venue_id =venue.id).all()
-    num_upcoming = 0
-    for show in venues_show:
-      if show.start_time>now:
-        num_upcoming+=1
-
-    venue_list.append({'id':venue.id,'name':venue.name,'num_upcoming':num_upcoming})
-    
-    response = {
-      "count": len(venues),
-      "data": venue_list}
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  venue = Venue.query.get(venue_id)
-  shows = Show.query.filter_by(venue_id=venue_id).all()
-  past_shows = []
-  upcoming_shows = []
-  current_time = datetime.now()
-
-  for show in shows:
-    data = {
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-           "artist_image_link": show.artist.image_link,
-           "start_time": format_datetime(str(show.start_time))
-        }
-    if show.start_time > current_time:
-      upcoming_shows.append(data)
-    else:
-      past_shows.append(data)
-
-  data={
-    "id": venue.id,
-    "name": venue.name,
-    "genres": venue.genres.replace('{','').replace('}','').split(','),
-    "address": venue.address,
-    "city": venue.city,
-    "state": venue.state,
-    "phone": venue.phone,
-    "website": venue.website,
-    "facebook_link": venue.facebook_link,
-    "seeking_talent": venue.seeking_talent,
-    "seeking_description":venue.seeking_description,
-    "image_link": venue.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows)
-  }
-  
-  return render_template('pages/show_venue.html', venue=data)
-
-#  Create Venue
-#  ----------------------------------------------------------------
-
-@app.route('/venues/create', methods=['GET'])
-def create_venue_form():
-  form = VenueForm()
-  return render_template('forms/new_venue.html', form=form)
-
-@app.route('/venues/create', methods=['POST'])
-def create_venue_submission():
-  # TODO: insert form data as a new Venue record in the db, instead
-  # TODO: modify data to be the data object returned from db insertion
-  form = VenueForm(request.form, meta={'csrf': False})
-  if form.validate():
-    try:
-      venue = Venue(name = form.name.data,
-      city = form.city.data,
-      state = form.state.data,
-      address = form.address.data,
-      phone = form.phone.data,
-      genres = form.genres.data,
-      facebook_link = form.facebook_link.data,
-      image_link = form.image_link.data,
-      website = form.website_link.data,
-      seeking_talent = form.seeking_description.data,
-      seeking_description = form.seeking_description.data)
-      
-      with app.app_context():
-        db.session.add(venue)
-        db.session.commit()
-      # on successful db insert, flash success
-      flash('Venue ' + request.form['name'] + ' was successfully listed!')
-    except ValueError as e:
-      print(e)
-
-  else:
-    #  on unsuccessful db insert, flash an error instead.
-    # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    message = []
-    for field, err in form.errors.items():
-      message.append(field + ' ' + '|'.join(err))
-    flash('Errors ' + str(message))
-    form = VenueForm()
-    return render_template('forms/new_venue.html', form=form)
-  return render_template('pages/home.html')   
-    
-@app.route('/venues/<venue_id>', methods=['DELETE'])
-def delete_venue(venue_id):
-  # TODO: Complete this endpoint for taking a venue_id, and using
-  # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
-
-  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-  # clicking that button delete it from the db then redirect the user to the homepage
-  return None
-
-#  Artists
-#  ----------------------------------------------------------------
-@app.route('/artists')
-def artists():
-  # TODO: replace with real data returned from querying the database
-  data = Artist.query.all()
-
-  return render_template('pages/artists.html', artists=data)
-
-@app.route('/artists/search', methods=['POST'])
-def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  # search for "band" should return "The Wild Sax Band".
-  search_term = request.form.get('search_term')
-  venue = Venue.query.all()
-  artist = Artist.query.filter(Artist.name.ilike('%'+search_term+'%')).all()
-  artists = []
-
-  for artist in artist:
-    artists.append({
-      'id':artist.id,
-      'name':artist.name,
-      # 'num_upcoming_shows':len([show for show in venue.shows if show.start_time > datetime.now()])
-
-    })
-
-    response={
-      'count':len(artists),
-      'data':artists
-    }
-  
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-  # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
-  artist = Artist.query.get(artist_id)
-  shows = Show.query.filter_by(artist_id=artist_id).all()
-  past_shows = []
-  upcoming_shows = []
-  current_time = datetime.now()
-
-  for show in shows:
-    data = {
-          "artist_id": show.artist_id,
-          "artist_name": show.artist.name,
-           "artist_image_link": show.artist.image_link,
-           "start_time": format_datetime(str(show.start_time))
-        }
-    if show.start_time > current_time:
-      upcoming_shows.append(data)
-    else:
-      past_shows.append(data)
-
-  data={
-    "id": artist.id,
-    "name": artist.name,
-    "genres": artist.genres.replace('{','').replace('}','').split(','),
-    "city": artist.city,
-    "state": artist.state,
-    "phone": artist.phone,
-    "website": artist.website,
-    "facebook_link": artist.facebook_link,
-    "seeking_venue": True,
-    "seeking_description":artist.seeking_description,
-    "image_link": artist.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": len(past_shows),
-    "upcoming_shows_count": len(upcoming_shows)
-  }
-  
-  return render_template('pages/show_artist.html', artist=data)
-
-#  Update
-#  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
-def edit_artist(artist_id):
-  form = ArtistForm()
-  artist = Artist.query.get_or_404(artist_id)
-  form = ArtistForm(obj=artist)
-  
-  # TODO: populate form with fields from artist with ID <artist_id>
-  return render_template('forms/edit_artist.html', form=form, artist=artist)
-
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
-def edit_artist_submission(artist_id):
-  # TODO: take values from the form submitted, and update existing
-  # artist record with ID <artist_id> using the new attributes
-  form = ArtistForm(request.form, meta={'csrf': False})
-  if form.validate():
-        try:
-            artist = Artist.query.get_or_404(artist_id)
-            artist.name = form.name.data
-            artist.city=form.city.data
-            artist.state=form.state.data
-            artist.phone=form.phone.data
-            artist.genres=",".join(form.genres.data) # convert array to string separated by commas
-            artist.facebook_link=form.facebook_link.data
-            artist.image_link=form.image_link.data
-            artist.seeking_venue=form.seeking_venue.data
-            artist.seeking_description=form.seeking_description.data
-            artist.website=form.website_link.data
-    
-            db.session.commit()
-            flash("Artist " + artist.name + " was successfully edited!")
-        except:
-            db.session.rollback()
-            flash("Artist was not edited successfully.")
-        finally:
-            db.session.close()
-  else:
-      print("\n\n", form.errors)
-      flash("Artist was not edited successfully.")
-
-
-  return redirect(url_for('show_artist', artist_id=artist_id))
-
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
-def edit_venue(venue_id):
-  form = VenueForm()
-  venue = Venue.query.get_or_404(venue_id)
-  form = VenueForm(obj=venue)
-  
-  #
-  #  TODO: populate form with values from venue with ID <venue_id>
-  return render_template('forms/edit_venue.html', form=form, venue=venue)
-
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
-def edit_venue_submission(venue_id):
-  form = VenueForm(request.form, meta={'csrf': False})
-  if form.validate():
-        try:
-            venue = Venue.query.get_or_404(venue_id)
-            venue.name = form.name.data
-            venue.genres=",".join(form.genres.data)
-            venue.address=form.address.data
-            venue.city=form.city.data
-            venue.state=form.state.data
-            venue.phone=form.phone.data
-            venue.website_link=form.website_link.data
-            venue.facebook_link=form.facebook_link.data
-            venue.seeking_telant=form.seeking_talent.data
-            venue.seeking_disctiption=form.seeking_description.data
-            venue.image_link = form.image_link.data
-            db.session.commit()
-            flash("venue " + venue.name + " was successfully edited!")
-        except:
-            db.session.rollback()
-            flash("Venue was not edited successfully.")
-        finally:
-            db.session.close()
-  else:
-      print("\n\n", form.errors)
-      flash("Venue was not edited successfully.")
-  # TODO: take values from the form submitted, and update existing
-  # venue record with ID <venue_id> using the new attributes
-  return redirect(url_for('show_venue', venue_id=venue_id))
-
-#  Create Artist
-#  ----------------------------------------------------------------
-
-@app.route('/artists/create', methods=['GET'])
-def create_artist_form():
-  form = ArtistForm()
-  return render_template('forms/new_artist.html', form=form)
-
-@app.route('/artists/create', methods=['POST'])
-def create_artist_submission():
-  # called upon submitting the new artist listing form
-  #  insert form data as a new Venue record in the db, instead
-  #  modify data to be the data object returned from db insertion
-  # Set the FlaskForm
-  form = ArtistForm(request.form, meta={'csrf': False})
-  if form.validate():
-    try:
-      venue = Artist(name = form.name.data,
-      city = form.city.data,
-      state = form.state.data,
-      phone = form.phone.data,
-      genres = form.genres.data,
-      facebook_link = form.facebook_link.data,
-      image_link = form.image_link.data,
-      website = form.website_link.data,
-      seeking_talent = form.seeking_description.data,
-      seeking_description = form.seeking_description.data)
-      
-      with app.app_context():
-        db.session.add(venue)
-        db.session.commit()
-      # on successful db insert, flash success
-      flash('Artist ' + request.form['name'] + ' was successfully listed!')
-    except ValueError as e:
-      print(e)
-
-  else:
-    #  on unsuccessful db insert, flash an error instead.
-    # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    message = []
-    for field, err in form.errors.items():
-      message.append(field + ' ' + '|'.join(err))
-    flash('Errors ' + str(message))
-    form = ArtistForm()
-    return render_template('forms/new_artist.html', form=form)
-  return render_template('pages/home.html')
-  
-
-
-#  Shows
-#  ----------------------------------------------------------------
-
-@app.route('/shows')
-def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  show_query = db.session.query(Show,Artist,Venue).join(Venue,Show.venue_id==Venue.id).join(Artist,Show.artist_id==Artist.id).order_by(Show.start_time.desc()).all()
-  data = []
-  for show, venue, artist in show_query:
-    data.append({
-      "venue_id":venue.id,
-      "venue_name":venue.name,
-      "artist_id":artist.id,
-      "artist_name":artist.name,
-      "artist_image_link":artist.image_link,
-      "start_time": str(show.start_time)
-
-    })
-  
-  return render_template('pages/shows.html', shows=data)
-
-@app.route('/shows/create')
-def create_shows():
-  # renders form. do not touch.
-  form = ShowForm()
-  return render_template('forms/new_show.html', form=form)
-
-@app.route('/shows/create', methods=['POST'])
-def create_show_submission():
-  # called to create new shows in the db, upon submitting new show listing form
-  # TODO: insert form data as a new Show record in the db, instead
-  # Set the FlaskForm
-  data = ShowForm(request.form)
-  # Validate all fields
-  form = ShowForm(request.form, meta={'csrf': False})
-  if form.validate():
-    try:
-      show =Show(
-      artist_id = form.artist_id.data,
-      venue_id = form.venue_id.data,
-      start_time = form.start_time.data
-      )
-      with app.app_context():
-        db.session.add(show)
-        db.session.commit()
-      # on successful db insert, flash success
-      flash('Show ' + request.form['artist_id'] + ' was successfully listed!')
-    except ValueError as e:
-      print(e)
-
-  else:
-    #  on unsuccessful db insert, flash an error instead.
-    # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
-    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-    message = []
-    for field, err in form.errors.items():
-      message.append(field + ' ' + '|'.join(err))
-    flash('Errors ' + str(message))
-    form = ShowForm()
-    return render_template('forms/new_show.html', form=form)
+# Venues, artists, shows and the JSON API are blueprints in venues.py,
+# artists.py, shows.py and api.py.
 
+def index():
   return render_template('pages/home.html')
 
-@app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
-
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+      typeahead.build()
+    page_cache.warm()
     app.run()
 
 # Or specify port manually:
@@ -0,0 +1,188 @@
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, current_app, render_template, request, flash, redirect, url_for
+from conditional import conditional
+from extensions import db, page_cache, typeahead
+from forms import ArtistForm
+from models import Artist, Genre, Show, Venue, artist_genre, loaded
+from pagination import paginate
+from replicas import read_only
+from views import genre_filter, invalidate_artist_pages, render_listing, search_with_upcoming, split_shows
+
+bp = Blueprint('artists', __name__)
+
+@bp.route('/artists')
+@page_cache.cached('artists')
+def artists():
+  # TODO: replace with real data returned from querying the database
+  return render_artist_list(db.session.query(Artist))
+
+def render_artist_list(query):
+  query = query.with_entities(Artist.id, Artist.name)
+  page = paginate(query, (Artist.name, Artist.id), key=lambda row: (row.name, row.id),
+                  streamed=current_app.config['STREAM_LISTINGS'])
+
+  return render_listing('pages/artists.html', artists=page, page=page)
+
+@bp.route('/artists/search', methods=['POST'])
+@read_only
+def search_artists():
+  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+  # search for "band" should return "The Wild Sax Band".
+  search_term = request.form.get('search_term', '')
+  response = search_with_upcoming(Artist, search_term)
+  return render_template('pages/search_artists.html', results=response, search_term=search_term)
+
+def artist_detail(artist_id):
+  # the artist page's data, shared by the HTML page and the JSON API.
+  artist = loaded(Artist, 'detail').get_or_404(artist_id)
+  query = db.session.query(
+    Show.start_time,
+    Venue.id.label('venue_id'),
+    Venue.name.label('venue_name'),
+    Venue.image_link.label('venue_image_link')
+  ).join(Venue, Show.venue_id == Venue.id).filter(Show.artist_id == artist_id)
+  upcoming, past = split_shows(query)
+
+  upcoming_shows, past_shows = [[{
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_name,
+    "venue_image_link": show.venue_image_link,
+    "start_time": show.start_time
+  } for show in shows] for shows in (upcoming, past)]
+
+  data={
+    "id": artist.id,
+    "name": artist.name,
+    "genres": [genre.name for genre in artist.genres],
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "website": artist.website,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": True,
+    "seeking_description":artist.seeking_description,
+    "image_link": artist.image_link,
+    "past_shows": past_shows,
+    "upcoming_shows": upcoming_shows,
+    "past_shows_count": artist.past_shows_count,
+    "upcoming_shows_count": artist.upcoming_shows_count
+  }
+  return data
+
+@bp.route('/artists/<int:artist_id>')
+@conditional(Artist, 'artist_id')
+@page_cache.cached('artist', 'artist_id')
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  data = artist_detail(artist_id)
+  
+  return render_template('pages/show_artist.html', artist=data)
+
+#  Update
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+def edit_artist(artist_id):
+  form = ArtistForm()
+  artist = loaded(Artist, 'detail').get_or_404(artist_id)
+  form = ArtistForm(obj=artist)
+  form.genres.data = [genre.name for genre in artist.genres]
+  
+  # TODO: populate form with fields from artist with ID <artist_id>
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+  # TODO: take values from the form submitted, and update existing
+  # artist record with ID <artist_id> using the new attributes
+  form = ArtistForm(request.form, meta={'csrf': False})
+  if form.validate():
+        try:
+            artist = loaded(Artist, 'detail').get_or_404(artist_id)
+            artist.name = form.name.data
+            artist.city=form.city.data
+            artist.state=form.state.data
+            artist.phone=form.phone.data
+            artist.genres=Genre.named(form.genres.data)
+            artist.facebook_link=form.facebook_link.data
+            artist.image_link=form.image_link.data
+            artist.seeking_venue=form.seeking_venue.data
+            artist.seeking_description=form.seeking_description.data
+            artist.website=form.website_link.data
+    
+            db.session.commit()
+            invalidate_artist_pages(artist_id)
+            typeahead.update('artist', artist_id, form.name.data, form.city.data, form.state.data)
+            flash("Artist " + artist.name + " was successfully edited!")
+        except:
+            db.session.rollback()
+            flash("Artist was not edited successfully.")
+        finally:
+            db.session.close()
+  else:
+      print("\n\n", form.errors)
+      flash("Artist was not edited successfully.")
+
+
+  return redirect(url_for('artists.show_artist', artist_id=artist_id))
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/create', methods=['GET'])
+def create_artist_form():
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+  # called upon submitting the new artist listing form
+  #  insert form data as a new Venue record in the db, instead
+  #  modify data to be the data object returned from db insertion
+  # Set the FlaskForm
+  form = ArtistForm(request.form, meta={'csrf': False})
+  if form.validate():
+    try:
+      venue = Artist(name = form.name.data,
+      city = form.city.data,
+      state = form.state.data,
+      phone = form.phone.data,
+      genres = Genre.named(form.genres.data),
+      facebook_link = form.facebook_link.data,
+      image_link = form.image_link.data,
+      website = form.website_link.data,
+      seeking_talent = form.seeking_description.data,
+      seeking_description = form.seeking_description.data)
+      
+      db.session.add(venue)
+      db.session.flush()
+      artist_id = venue.id
+      db.session.commit()
+      invalidate_artist_pages()
+      typeahead.update('artist', artist_id, form.name.data, form.city.data, form.state.data)
+      # on successful db insert, flash success
+      flash('Artist ' + request.form['name'] + ' was successfully listed!')
+    except ValueError as e:
+      print(e)
+
+  else:
+    #  on unsuccessful db insert, flash an error instead.
+    # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    message = []
+    for field, err in form.errors.items():
+      message.append(field + ' ' + '|'.join(err))
+    flash('Errors ' + str(message))
+    form = ArtistForm()
+    return render_template('forms/new_artist.html', form=form)
+  return render_template('pages/home.html')
+  
+#  Genres
+#  ----------------------------------------------------------------
+
+@bp.route('/genres/<name>/artists')
+def genre_artists(name):
+  return render_artist_list(genre_filter(db.session.query(Artist), Artist, artist_genre, name))
@@ -0,0 +1,300 @@
+#----------------------------------------------------------------------------#
+# Static asset pipeline.
+#
+#   python assets.py [--static DIR] [--clean]
+#
+# Writes every file under static/ to static/dist/ with a hash of its
+# content in the name (css/main.css -> css/main.3f2a9c01d4e5.css), plus the
+# BUNDLES below, concatenated and minified; text files also get a gzip
+# variant, and a brotli one when the brotli package is installed.
+# static/dist/manifest.json maps each name to its fingerprinted path.
+#
+# A fingerprinted file never changes (a new version gets a new name), so
+# the app serves static/dist/ with a year-long immutable Cache-Control and
+# the variant the client's Accept-Encoding allows. Templates name files
+# through asset_url() and asset_urls(), which fall back to the plain
+# static/ files when ASSETS_BUNDLED is off (the dev profile) or nothing
+# has been built. Heroku runs the build from bin/post_compile.
+#----------------------------------------------------------------------------#
+
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+from flask import request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# bundle: its sources under static/, in load order
+BUNDLES = {
+  'css/site.css': ['css/bootstrap.min.css', 'css/layout.main.css', 'css/main.css',
+                   'css/main.responsive.css', 'css/main.quickfix.css'],
+  # blocking, in <head>: modernizr has to run before the page renders
+  'js/head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+  # deferred, so it runs after jQuery at the end of <body>
+  'js/site.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js', 'js/plugins.js'],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+HASH_LENGTH = 12
+# worth precompressing; images and woff fonts are compressed already
+COMPRESSIBLE = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.eot', '.otf', '.ttf'}
+# in order of preference, with the suffix of their variant
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+#----------------------------------------------------------------------------#
+# Minifiers.
+#----------------------------------------------------------------------------#
+
+# strings and /*! license */ comments are kept; other comments are dropped
+_CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|/\*!.*?\*/)|/\*.*?\*/''', re.S)
+
+
+def minify_css(css):
+  '''Strip the comments and whitespace `css` does not need.'''
+  parts = []
+  pending = ''
+  position = 0
+  for match in _CSS_TOKENS.finditer(css):
+    pending += css[position:match.start()]
+    position = match.end()
+    if match.group(1):
+      parts += [_squeeze_css(pending), match.group(1)]
+      pending = ''
+  parts.append(_squeeze_css(pending + css[position:]))
+  return ''.join(parts).strip()
+
+
+def _squeeze_css(css):
+  css = re.sub(r'\s+', ' ', css)
+  # a space before ':' is kept: in a selector it is a combinator ("a :hover")
+  css = re.sub(r' ?([{};,>]) ?', r'\1', css)
+  return css.replace(': ', ':').replace(';}', '}')
+
+
+def minify_js(js):
+  # JavaScript cannot be minified safely with regular expressions; the
+  # optional rjsmin package does it when installed. The bundled libraries
+  # ship minified anyway.
+  try:
+    import rjsmin
+  except ImportError:
+    return js
+  return rjsmin.jsmin(js, keep_bang_comments=True)
+
+
+def _brotli():
+  try:
+    import brotli
+  except ImportError:
+    return None
+  return brotli
+
+
+#----------------------------------------------------------------------------#
+# Build.
+#----------------------------------------------------------------------------#
+
+_CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def _relocate(css, source, target, files):
+  '''Point the relative url()s of `css`, written for static/`source`, at the
+  same files from dist/`target`, fingerprinted where they have been.'''
+  def replace(match):
+    quote, url = match.groups()
+    if re.match(r'([a-z][a-z0-9+.-]*:|/|#)', url, re.I):
+      return match.group(0)
+    path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+    name = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+    # paths relative to dist/; files outside the build stay in static/
+    built = files.get(name) or posixpath.join('..', name)
+    url = posixpath.relpath(built, posixpath.dirname(target) or '.') + suffix
+    return 'url(%s%s%s)' % (quote, url, quote)
+  return _CSS_URL.sub(replace, css)
+
+
+def _write_file(path, content):
+  # written aside and renamed in, so a running app never serves half a file
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  partial = '%s.%d.tmp' % (path, os.getpid())
+  with open(partial, 'wb') as f:
+    f.write(content)
+  os.replace(partial, path)
+
+
+def _write(dist, name, content):
+  '''Write `content` under `dist` as fingerprinted `name`, with its compressed
+  variants; return its path relative to `dist`.'''
+  stem, extension = posixpath.splitext(name)
+  fingerprinted = '%s.%s%s' % (stem, hashlib.sha256(content).hexdigest()[:HASH_LENGTH], extension)
+  path = os.path.join(dist, *fingerprinted.split('/'))
+  variants = {'': lambda: content}
+  if extension in COMPRESSIBLE:
+    variants['.gz'] = lambda: gzip.compress(content, 9, mtime=0)
+    brotli = _brotli()
+    if brotli is not None:
+      variants['.br'] = lambda: brotli.compress(content, quality=11)
+  for suffix, compress in variants.items():
+    # same name, same content: what an earlier build wrote can stay
+    if not os.path.exists(path + suffix):
+      data = compress()
+      if not suffix or len(data) < len(content):
+        _write_file(path + suffix, data)
+  return fingerprinted
+
+
+def _bundle(static_folder, bundle, sources, files):
+  texts = []
+  for name in sources:
+    with open(os.path.join(static_folder, *name.split('/')), encoding='utf-8') as f:
+      text = f.read()
+    if bundle.endswith('.css'):
+      texts.append(minify_css(_relocate(text, name, bundle, files)))
+    else:
+      texts.append(minify_js(text))
+  # ';' ends a script whose last statement relies on automatic semicolons
+  return ('\n' if bundle.endswith('.css') else '\n;\n').join(texts).encode('utf-8')
+
+
+def build(static_folder, bundles=BUNDLES):
+  '''Fingerprint `static_folder` and its `bundles` into its dist/ folder;
+  return the manifest.'''
+  dist = os.path.join(static_folder, DIST)
+  names = []
+  for directory, subdirectories, filenames in os.walk(static_folder):
+    if directory == static_folder and DIST in subdirectories:
+      subdirectories.remove(DIST)
+    relative = os.path.relpath(directory, static_folder).replace(os.sep, '/')
+    names.extend(posixpath.normpath(posixpath.join(relative, filename)) for filename in filenames)
+
+  files = {}
+  # stylesheets last, so what they point at has its fingerprinted name
+  for name in sorted(names, key=lambda name: (name.endswith('.css'), name)):
+    with open(os.path.join(static_folder, *name.split('/')), 'rb') as f:
+      content = f.read()
+    if name.endswith('.css'):
+      content = _relocate(content.decode('utf-8'), name, name, files).encode('utf-8')
+    files[name] = _write(dist, name, content)
+  for bundle, sources in sorted(bundles.items()):
+    files[bundle] = _write(dist, bundle, _bundle(static_folder, bundle, sources, files))
+
+  manifest = {'files': files, 'bundles': bundles}
+  _write_file(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+  return manifest
+
+
+def clean(static_folder, manifest):
+  '''Remove what earlier builds left in dist/ that `manifest` does not use;
+  return the paths removed.'''
+  dist = os.path.join(static_folder, DIST)
+  keep = {MANIFEST}
+  for path in manifest['files'].values():
+    keep.update(path + suffix for suffix in ('', '.gz', '.br'))
+  removed = []
+  for directory, subdirectories, filenames in os.walk(dist):
+    for filename in filenames:
+      path = os.path.join(directory, filename)
+      if os.path.relpath(path, dist).replace(os.sep, '/') not in keep:
+        os.remove(path)
+        removed.append(path)
+  return removed
+
+
+#----------------------------------------------------------------------------#
+# Serving.
+#----------------------------------------------------------------------------#
+
+class Assets(object):
+  '''Serves the build and gives templates asset_url() and asset_urls().'''
+
+  def __init__(self, app=None):
+    self.files = {}
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    config = app.config
+    config.setdefault('ASSETS_BUNDLED', True)
+    config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+    self.app = app
+    self.folder = os.path.join(app.static_folder, DIST)
+    self.files = {}
+    if config['ASSETS_BUNDLED']:
+      self.load()
+    app.add_url_rule('%s/%s/<path:filename>' % (app.static_url_path, DIST), 'assets', self.send)
+    app.jinja_env.globals.update(asset_url=self.url, asset_urls=self.urls)
+    app.extensions['assets'] = self
+
+  def load(self):
+    path = os.path.join(self.folder, MANIFEST)
+    try:
+      with open(path, encoding='utf-8') as f:
+        self.files = json.load(f)['files']
+    except FileNotFoundError:
+      self.app.logger.warning('%s not found, serving static files unbundled; run `python assets.py`', path)
+
+  def url(self, name):
+    '''URL of static file or bundle `name`, fingerprinted once built.'''
+    if name in self.files:
+      return url_for('assets', filename=self.files[name])
+    return url_for('static', filename=name)
+
+  def urls(self, name):
+    '''URLs a page loads for `name`: the built bundle, else its sources.'''
+    if name in self.files:
+      return [self.url(name)]
+    return [url_for('static', filename=source) for source in BUNDLES.get(name, [name])]
+
+  def send(self, filename):
+    options = {'cache_timeout': self.app.config['ASSETS_MAX_AGE']}
+    accepted = request.accept_encodings
+    for encoding, suffix in ENCODINGS:
+      # None for a name outside the folder, which send_from_directory 404s
+      path = safe_join(self.folder, filename + suffix)
+      if accepted[encoding] and path is not None and os.path.isfile(path):
+        response = send_from_directory(self.folder, filename + suffix,
+                                       mimetype=mimetypes.guess_type(filename)[0], **options)
+        response.headers['Content-Encoding'] = encoding
+        break
+    else:
+      response = send_from_directory(self.folder, filename, **options)
+    response.vary.add('Accept-Encoding')
+    # the name changes with the content, so browsers need never revalidate
+    response.headers['Cache-Control'] = 'public, max-age=%d, immutable' % options['cache_timeout']
+    return response
+
+
+def _size(path):
+  return os.path.getsize(path) if os.path.exists(path) else None
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Bundle, fingerprint and precompress static files.')
+  parser.add_argument('--static', default=os.path.join(ROOT, 'static'), help='folder to build (default: static/)')
+  parser.add_argument('--clean', action='store_true', help='remove files earlier builds left behind')
+  args = parser.parse_args()
+
+  manifest = build(args.static)
+  dist = os.path.join(args.static, DIST)
+  print('%d files fingerprinted into %s' % (len(manifest['files']), dist))
+  for bundle, sources in sorted(manifest['bundles'].items()):
+    path = os.path.join(dist, *manifest['files'][bundle].split('/'))
+    sizes = [sum(_size(os.path.join(args.static, *source.split('/'))) for source in sources),
+             _size(path), _size(path + '.gz'), _size(path + '.br')]
+    print('%-40s %s' % (manifest['files'][bundle], ', '.join(
+      '%s %s' % (label, '-' if value is None else '%.1fkB' % (value / 1000))
+      for label, value in zip(('sources', 'bundle', 'gzip', 'brotli'), sizes))))
+  if args.clean:
+    print('%d stale files removed' % len(clean(args.static, manifest)))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,59 @@
+#----------------------------------------------------------------------------#
+# Micro-benchmark for the `datetime` template filter.
+#
+#   python benchmarks/format_datetime.py [number of shows]
+#
+# Compares the per-show cost of the old parse-a-string path with the
+# cached filter and the batched format_datetimes() call, both on a cold
+# cache (first render) and a warm one (every later render).
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates
+import dateutil.parser
+from filters import format_datetime, format_datetime_cached, format_datetimes
+
+
+def legacy_format_datetime(value, format='medium'):
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return babel.dates.format_datetime(date, format, locale='en')
+
+
+def main(count):
+  start = datetime(2026, 1, 1, 20, 0)
+  # roughly what /shows holds: a few shows per evening slot
+  values = [start + timedelta(days=i // 3, hours=i % 3) for i in range(count)]
+
+  def cold(run):
+    def cleared():
+      format_datetime_cached.cache_clear()
+      return run()
+    return cleared
+
+  per_show = lambda: [format_datetime(v, 'full') for v in values]
+  batched = lambda: format_datetimes(values, 'full')
+  cases = [
+    ('legacy str -> parse -> format', lambda: [legacy_format_datetime(str(v), 'full') for v in values]),
+    ('filter per show, cold cache', cold(per_show)),
+    ('batched, cold cache', cold(batched)),
+    ('filter per show, warm cache', per_show),
+    ('batched, warm cache', batched),
+  ]
+  assert len(set(tuple(run()) for _, run in cases)) == 1
+  for name, run in cases:
+    best = min(timeit.repeat(run, number=1, repeat=5))
+    print('%-32s %8.2f us/show' % (name, best / count * 1e6))
+
+
+if __name__ == '__main__':
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
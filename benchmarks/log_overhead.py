@@ -0,0 +1,104 @@
+#----------------------------------------------------------------------------#
+# Logging overhead benchmark.
+#
+#   python benchmarks/log_overhead.py [--requests N] [--records N]
+#                                     [--budget-us US]
+#
+# Drives a route that logs --records INFO records per request through the
+# Flask test client, with app.logger set up three ways: logging nothing,
+# a plain FileHandler writing on the request thread (the setup logs.py
+# replaced), and the queued JSON pipeline of logs.py. For each it reports
+# the time the request thread spent in its logging calls, which is what
+# logging adds to a response, and the time per request overall, which
+# for the queued pipeline includes the listener thread formatting and
+# writing the records (it shares the interpreter with the requests). The
+# run fails (exit status 1) when the queued pipeline makes a logging call
+# take more than --budget-us longer than with no handler at all.
+#----------------------------------------------------------------------------#
+
+import argparse
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('FYYUR_ENV', 'test')
+
+# keeps Flask from adding its stderr handler, which would print every
+# record the benchmark logs.
+logging.getLogger('app').addHandler(logging.NullHandler())
+
+from app import create_app
+from extensions import logs
+
+
+def run(client, requests):
+  for i in range(requests):
+    client.get('/_log_overhead')
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Measure what logging adds to a request.')
+  parser.add_argument('--requests', type=int, default=2000, help='requests per setup')
+  parser.add_argument('--records', type=int, default=5, help='records each request logs')
+  parser.add_argument('--budget-us', type=float, default=20,
+                      help='most the queued pipeline may add to each logging call')
+  args = parser.parse_args()
+
+  scratch = tempfile.mkdtemp(prefix='fyyur-log-bench-')
+  try:
+    app = create_app(settings={'LOG_FILE': os.path.join(scratch, 'queued.log')})
+    logger = app.logger
+    spent = []
+
+    def log():
+      started = time.perf_counter()
+      for i in range(args.records):
+        logger.info('benchmark record %d of %d', i, args.records)
+      spent.append(time.perf_counter() - started)
+      return 'ok'
+    app.add_url_rule('/_log_overhead', '_log_overhead', log)
+
+    plain = logging.FileHandler(os.path.join(scratch, 'plain.log'))
+    plain.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+    setups = [('none', []), ('file handler', [plain]), ('queued json', [logs.handler])]
+    client = app.test_client()
+    run(client, 200)
+
+    results = {}
+    for name, handlers in setups:
+      logger.handlers = handlers
+      del spent[:]
+      started = time.perf_counter()
+      run(client, args.requests)
+      if name == 'queued json':
+        # what the listener has yet to write is part of the cost
+        logs.stop()
+      results[name] = statistics.median(spent), (time.perf_counter() - started) / args.requests
+    plain.close()
+  finally:
+    shutil.rmtree(scratch)
+
+  print('%d requests logging %d records each\n' % (args.requests, args.records))
+  none_calls, none_overall = results['none']
+  print('%-14s %20s %20s' % ('setup', 'logging calls us', 'per request us'))
+  for name, handlers in setups:
+    calls, overall = results[name]
+    print('%-14s %10.1f (%+7.1f) %10.1f (%+7.1f)' % (
+      name, calls * 1e6, (calls - none_calls) * 1e6, overall * 1e6, (overall - none_overall) * 1e6))
+  if logs.dropped:
+    print('\n%d records dropped: the queue was full' % logs.dropped)
+
+  added = (results['queued json'][0] - none_calls) / args.records * 1e6
+  print('\nqueued json adds %.1fus to each logging call (budget %.0fus)' % (added, args.budget_us))
+  if added > args.budget_us:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
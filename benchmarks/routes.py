@@ -0,0 +1,211 @@
+#----------------------------------------------------------------------------#
+# Route benchmark.
+#
+#   python benchmarks/routes.py [--scales small,medium] [--requests N]
+#                               [--database-url URL] [--save-baseline]
+#
+# Seeds a scratch database at each data scale (benchmarks/seed.py), drives
+# every route through the Flask test client and reports p50/p95/p99
+# latency and SQL statements per request. Runs are compared with
+# benchmarks/baseline.json: the run fails (exit status 1) when a route
+# issues more statements than its baseline, or its p95 grows by more than
+# --tolerance. --save-baseline records the current run instead; do so on
+# the machine the comparison will run on.
+#
+# Without --database-url each scale gets a temporary SQLite file. A given
+# URL (e.g. a scratch Postgres database) is emptied and reseeded per scale.
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('FYYUR_ENV', 'test')
+
+from sqlalchemy import event
+from app import create_app
+from extensions import db, page_cache
+from models import Genre
+from seed import seed
+
+app = create_app()
+
+SCALES = {
+  'small': dict(venues=50, artists=100, shows=500),
+  'medium': dict(venues=500, artists=1000, shows=10000),
+  'large': dict(venues=2000, artists=5000, shows=100000),
+}
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# below this many milliseconds a p95 change is noise, not a regression
+NOISE_FLOOR_MS = 2.0
+
+
+def routes(venue_id, artist_id, genre):
+  # (name, method, path, form data or a function of the request number
+  # returning it); venue_id and artist_id are the busiest ones, the worst
+  # case for the detail pages. DELETE /venues/<id> is not implemented yet
+  # and is left out.
+  venue = {'name': 'Bench Venue', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+           'phone': '5551234', 'genres': ['Jazz', 'Blues'], 'facebook_link': 'https://www.facebook.com/bench',
+           'website_link': 'https://bench.example.com'}
+  artist = dict(venue, name='Bench Artist')
+  return [
+    ('home', 'GET', '/', None),
+    ('venues', 'GET', '/venues', None),
+    ('venues search', 'POST', '/venues/search', {'search_term': 'the'}),
+    ('venue', 'GET', '/venues/%d' % venue_id, None),
+    ('venue create form', 'GET', '/venues/create', None),
+    ('venue create', 'POST', '/venues/create', venue),
+    ('venue edit form', 'GET', '/venues/%d/edit' % venue_id, None),
+    ('venue edit', 'POST', '/venues/%d/edit' % venue_id, venue),
+    ('artists', 'GET', '/artists', None),
+    ('artists search', 'POST', '/artists/search', {'search_term': 'band'}),
+    ('artist', 'GET', '/artists/%d' % artist_id, None),
+    ('artist create form', 'GET', '/artists/create', None),
+    ('artist create', 'POST', '/artists/create', artist),
+    ('artist edit form', 'GET', '/artists/%d/edit' % artist_id, None),
+    ('artist edit', 'POST', '/artists/%d/edit' % artist_id, artist),
+    ('genre venues', 'GET', '/genres/%s/venues' % genre, None),
+    ('genre artists', 'GET', '/genres/%s/artists' % genre, None),
+    ('shows', 'GET', '/shows', None),
+    ('show create form', 'GET', '/shows/create', None),
+    # a day apart, so no request is turned away as a double booking
+    ('show create', 'POST', '/shows/create', lambda i: {
+      'artist_id': artist_id, 'venue_id': venue_id,
+      'start_time': (datetime(2030, 1, 1, 20) + timedelta(days=i)).strftime('%Y-%m-%d %H:%M:%S')}),
+    ('venue calendar', 'GET', '/venues/%d/calendar?from=%s&to=%s' % (
+      venue_id, (date.today() - timedelta(days=365)).isoformat(), date.today().isoformat()), None),
+    ('api venues', 'GET', '/api/v1/venues', None),
+    ('api venue', 'GET', '/api/v1/venues/%d' % venue_id, None),
+    ('api artists', 'GET', '/api/v1/artists', None),
+    ('api artist', 'GET', '/api/v1/artists/%d' % artist_id, None),
+    ('api shows', 'GET', '/api/v1/shows', None),
+    ('api typeahead', 'GET', '/api/v1/typeahead?q=the', None),
+    # last, as it adds 26 shows a request: a 26-week residency, each
+    # half a year after the one before
+    ('show create recurring', 'POST', '/shows/create/recurring', lambda i: {
+      'artist_id': artist_id, 'venue_id': venue_id, 'frequency': 'WEEKLY', 'count': 26,
+      'start_time': (datetime(2040, 1, 1, 20) + timedelta(days=183 * i)).strftime('%Y-%m-%d %H:%M:%S')}),
+  ]
+
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def measure(client, method, path, data, requests, warmup=3):
+  statements = []
+  listener = lambda *args: statements.append(1)
+  event.listen(db.engine, 'before_cursor_execute', listener)
+  try:
+    timings, counts = [], []
+    for i in range(warmup + requests):
+      del statements[:]
+      started = time.perf_counter()
+      response = client.open(path, method=method, data=data(i) if callable(data) else data)
+      response.get_data()  # streamed pages render while being read
+      response.close()
+      elapsed = time.perf_counter() - started
+      if response.status_code >= 400:
+        raise RuntimeError('%s %s returned %d' % (method, path, response.status_code))
+      if i >= warmup:
+        timings.append(elapsed * 1000)
+        counts.append(len(statements))
+  finally:
+    event.remove(db.engine, 'before_cursor_execute', listener)
+  return {
+    'p50_ms': round(percentile(timings, .5), 3),
+    'p95_ms': round(percentile(timings, .95), 3),
+    'p99_ms': round(percentile(timings, .99), 3),
+    'queries': max(counts),
+  }
+
+
+def run_scale(scale, url, requests):
+  app.config['SQLALCHEMY_DATABASE_URI'] = url
+  with app.app_context():
+    db.drop_all()
+    db.create_all()
+    started = time.perf_counter()
+    venue_ids, artist_ids, show_ids = seed(**SCALES[scale])
+    print('%s: seeded %d venues, %d artists, %d shows in %.1fs' % (
+      scale, len(venue_ids), len(artist_ids), len(show_ids), time.perf_counter() - started))
+    genre = Genre.query.order_by(Genre.id).first().name
+    db.session.remove()
+
+    client = app.test_client()
+    results = {}
+    for name, method, path, data in routes(venue_ids[0], artist_ids[0], genre):
+      results[name] = measure(client, method, path, data, requests)
+    db.session.remove()
+    db.get_engine().dispose()
+  return results
+
+
+def compare(scale, results, baseline, tolerance):
+  failures = []
+  print('\n%-20s %9s %9s %9s %8s %12s' % (scale, 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'baseline p95'))
+  for name, result in results.items():
+    base = baseline.get(scale, {}).get(name)
+    status = ''
+    if base:
+      if result['queries'] > base['queries']:
+        status = 'REGRESSED: %d queries, baseline %d' % (result['queries'], base['queries'])
+      elif result['p95_ms'] > base['p95_ms'] * (1 + tolerance) and \
+          result['p95_ms'] - base['p95_ms'] > NOISE_FLOOR_MS:
+        status = 'REGRESSED: p95 +%d%%' % ((result['p95_ms'] / base['p95_ms'] - 1) * 100)
+    if status:
+      failures.append('%s %s: %s' % (scale, name, status))
+    print('%-20s %9.2f %9.2f %9.2f %8d %12s %s' % (
+      name, result['p50_ms'], result['p95_ms'], result['p99_ms'], result['queries'],
+      '%.2f' % base['p95_ms'] if base else '-', status))
+  return failures
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark every route at several data scales.')
+  parser.add_argument('--scales', default='small,medium', help='comma separated, from %s' % ', '.join(SCALES))
+  parser.add_argument('--requests', type=int, default=30, help='timed requests per route')
+  parser.add_argument('--database-url', help='scratch database to use instead of temporary SQLite files; '
+                                             'it is emptied and reseeded')
+  parser.add_argument('--tolerance', type=float, default=0.5, help='allowed p95 growth over the baseline')
+  parser.add_argument('--save-baseline', action='store_true', help='write this run to %s' % BASELINE)
+  args = parser.parse_args()
+
+  # measure the routes, not the page cache
+  page_cache.backend = None
+  baseline = {}
+  if os.path.exists(BASELINE):
+    with open(BASELINE) as f:
+      baseline = json.load(f)
+
+  scratch = tempfile.mkdtemp(prefix='fyyur-bench-')
+  runs, failures = {}, []
+  try:
+    for scale in args.scales.split(','):
+      url = args.database_url or 'sqlite:///%s' % os.path.join(scratch, '%s.db' % scale)
+      runs[scale] = run_scale(scale, url, args.requests)
+      failures += compare(scale, runs[scale], baseline, args.tolerance)
+  finally:
+    shutil.rmtree(scratch)
+
+  if args.save_baseline:
+    baseline.update(runs)
+    with open(BASELINE, 'w') as f:
+      json.dump(baseline, f, indent=2, sort_keys=True)
+    print('\nbaseline written to %s' % BASELINE)
+  elif failures:
+    print('\n' + '\n'.join(failures))
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
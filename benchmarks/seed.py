@@ -0,0 +1,181 @@
+#----------------------------------------------------------------------------#
+# Synthetic data generator.
+#
+#   python benchmarks/seed.py [--venues N] [--artists N] [--shows N]
+#                             [--upcoming FRACTION] [--seed N] [--create]
+#
+# Fills the database of the current profile (DATABASE_URL / FYYUR_ENV)
+# with venues, artists and shows. Cities, genres and bookings are skewed
+# the way real listings are: a few big cities and popular genres hold most
+# of the rows, and a few venues and artists play most of the shows. Rows go
+# in through the bulk import writers, in one transaction per batch.
+#----------------------------------------------------------------------------#
+
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulk
+from app import create_app
+from extensions import db
+from models import counters, Genre, Venue, Artist, Show, venue_genre, artist_genre
+from forms import VenueForm
+
+CITIES = [
+  ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Austin', 'TX'),
+  ('San Francisco', 'CA'), ('Nashville', 'TN'), ('Seattle', 'WA'), ('New Orleans', 'LA'),
+  ('Boston', 'MA'), ('Denver', 'CO'), ('Atlanta', 'GA'), ('Portland', 'OR'),
+  ('Philadelphia', 'PA'), ('Detroit', 'MI'), ('Minneapolis', 'MN'), ('Miami', 'FL'),
+  ('Memphis', 'TN'), ('Kansas City', 'MO'), ('Salt Lake City', 'UT'), ('Burlington', 'VT'),
+]
+GENRES = [name for name, label in VenueForm.genres.kwargs['choices']]
+ADJECTIVES = ['Blue', 'Velvet', 'Golden', 'Electric', 'Wild', 'Silver', 'Midnight', 'Rusty',
+              'Crimson', 'Lucky', 'Hollow', 'Neon', 'Painted', 'Iron', 'Broken', 'Little']
+NOUNS = ['Room', 'Hall', 'Lantern', 'Owl', 'Anchor', 'Cellar', 'Garden', 'Depot',
+         'Parlor', 'Station', 'Tavern', 'Theatre', 'Warehouse', 'Lounge', 'Mill', 'Barn']
+BANDS = ['Band', 'Collective', 'Trio', 'Quartet', 'Orchestra', 'Project', 'Brothers', 'Sound']
+# a venue's bookable start hours in a day, SHOW_LENGTH apart
+SLOTS = [14, 16, 18, 20, 22]
+SHOW_LENGTH = timedelta(hours=2)
+
+
+def zipf_weights(count, s=1.1):
+  return [1.0 / (rank ** s) for rank in range(1, count + 1)]
+
+
+def venue_rows(rng, count):
+  city_weights = zipf_weights(len(CITIES))
+  for i in range(count):
+    city, state = rng.choices(CITIES, city_weights)[0]
+    name = 'The %s %s' % (rng.choice(ADJECTIVES), rng.choice(NOUNS))
+    slug = '%s%d' % (name.lower().replace(' ', ''), i)
+    yield {
+      'name': name, 'city': city, 'state': state,
+      'address': '%d %s St' % (rng.randint(1, 9999), rng.choice(NOUNS)),
+      'phone': '%010d' % rng.randrange(10 ** 10),
+      'image_link': 'https://images.example.com/venues/%d.jpg' % i,
+      'facebook_link': 'https://www.facebook.com/%s' % slug,
+      'website': 'https://%s.example.com' % slug,
+      'seeking_talent': rng.choice([None, 'y']),
+      'seeking_description': None,
+    }
+
+
+def artist_rows(rng, count):
+  city_weights = zipf_weights(len(CITIES))
+  for i in range(count):
+    city, state = rng.choices(CITIES, city_weights)[0]
+    name = '%s %s %s' % (rng.choice(ADJECTIVES), rng.choice(NOUNS), rng.choice(BANDS))
+    yield {
+      'name': name, 'city': city, 'state': state,
+      'phone': '%010d' % rng.randrange(10 ** 10),
+      'image_link': 'https://images.example.com/artists/%d.jpg' % i,
+      'facebook_link': 'https://www.facebook.com/artist%d' % i,
+      'website': None,
+      'seeking_talent': None,
+      'seeking_description': None,
+    }
+
+
+def insert(connection, model, rows):
+  rows = list(rows)
+  for row, row_id in zip(rows, bulk.allocate_ids(connection, model.__table__, len(rows))):
+    row['id'] = row_id
+  bulk.insert_rows(connection, model.__table__, rows)
+  return [row['id'] for row in rows]
+
+
+def link_genres(connection, rng, table, fk, ids, genre_ids):
+  weights = zipf_weights(len(genre_ids), 0.8)
+  links = []
+  for entity_id in ids:
+    for genre_id in set(rng.choices(genre_ids, weights, k=rng.randint(1, 3))):
+      links.append({fk: entity_id, 'genre_id': genre_id})
+  connection.execute(table.insert(), links)
+
+
+def seed(venues=200, artists=400, shows=4000, upcoming=0.3, seed=0, batch_size=5000):
+  '''Add `venues`, `artists` and `shows` rows; returns their ids.'''
+  rng = random.Random(seed)
+  session = db.session
+  genres = Genre.named(GENRES)
+  session.add_all(genres)
+  session.flush()
+  genre_ids = [genre.id for genre in genres]
+  connection = session.connection()
+
+  venue_ids, artist_ids = [], []
+  for batch in bulk.batches(venue_rows(rng, venues), batch_size):
+    ids = insert(connection, Venue, batch)
+    counters.venues_inserted(connection, batch)
+    link_genres(connection, rng, venue_genre, 'venue_id', ids, genre_ids)
+    venue_ids += ids
+    session.commit()
+    connection = session.connection()
+  for batch in bulk.batches(artist_rows(rng, artists), batch_size):
+    ids = insert(connection, Artist, batch)
+    link_genres(connection, rng, artist_genre, 'artist_id', ids, genre_ids)
+    artist_ids += ids
+    session.commit()
+    connection = session.connection()
+
+  # shows span two years back and one ahead; `upcoming` of them are
+  # still to come. Each takes one of a venue's SLOTS on a day, and a venue
+  # is never double booked.
+  now = datetime.now().replace(minute=0, second=0, microsecond=0)
+  venue_weights = zipf_weights(len(venue_ids), 0.9)
+  artist_weights = zipf_weights(len(artist_ids), 0.9)
+  booked = set()
+
+  def show_rows():
+    for _ in range(shows):
+      while True:
+        if rng.random() < upcoming:
+          offset = timedelta(hours=rng.randint(1, 365 * 24))
+        else:
+          offset = -timedelta(hours=rng.randint(1, 2 * 365 * 24))
+        start_time = (now + offset).replace(hour=rng.choice(SLOTS))
+        venue_id = rng.choices(venue_ids, venue_weights)[0]
+        if (venue_id, start_time) not in booked:
+          break
+      booked.add((venue_id, start_time))
+      yield {
+        'start_time': start_time,
+        'end_time': start_time + SHOW_LENGTH,
+        'artist_id': rng.choices(artist_ids, artist_weights)[0],
+        'venue_id': venue_id,
+      }
+
+  show_ids = []
+  for batch in bulk.batches(show_rows(), batch_size):
+    show_ids += insert(connection, Show, batch)
+    counters.shows_inserted(connection, batch)
+    session.commit()
+    connection = session.connection()
+  return venue_ids, artist_ids, show_ids
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Fill the database with synthetic venues, artists and shows.')
+  parser.add_argument('--venues', type=int, default=200)
+  parser.add_argument('--artists', type=int, default=400)
+  parser.add_argument('--shows', type=int, default=4000)
+  parser.add_argument('--upcoming', type=float, default=0.3, help='fraction of shows in the future')
+  parser.add_argument('--seed', type=int, default=0, help='random seed, for repeatable data')
+  parser.add_argument('--create', action='store_true',
+                      help='create missing tables first (for scratch databases; use `flask db upgrade` otherwise)')
+  args = parser.parse_args()
+
+  with create_app().app_context():
+    if args.create:
+      db.create_all()
+    venue_ids, artist_ids, show_ids = seed(args.venues, args.artists, args.shows, args.upcoming, args.seed)
+  print('%d venues, %d artists, %d shows' % (len(venue_ids), len(artist_ids), len(show_ids)))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,157 @@
+#----------------------------------------------------------------------------#
+# Server throughput benchmark.
+#
+#   python benchmarks/server.py [--workers 1,2,4] [--concurrency N]
+#                               [--duration SECONDS] [--min-efficiency F]
+#
+# Seeds a temporary SQLite database, then for each worker count starts
+# server.py and drives it with --concurrency client processes for
+# --duration seconds, reporting requests per second, latency and the
+# speedup over one worker. Worker counts up to the number of CPUs should
+# scale close to linearly; the run fails (exit status 1) when one stays
+# below --min-efficiency of linear. The clients share the machine with the
+# server, so leave them cores to spare or expect a lower ceiling.
+#----------------------------------------------------------------------------#
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (method, path, form data): uncached JSON and search endpoints, which do
+# the real work per request, and one cached page.
+ROUTES = [
+  ('GET', '/api/v1/venues/1', None),
+  ('GET', '/api/v1/artists/1', None),
+  ('POST', '/venues/search', {'search_term': 'the'}),
+  ('GET', '/api/v1/typeahead?q=th', None),
+  ('GET', '/venues', None),
+]
+
+
+def percentile(values, fraction):
+  values = sorted(values)
+  return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))] if values else 0.0
+
+
+def free_port():
+  with socket.socket() as s:
+    s.bind(('127.0.0.1', 0))
+    return s.getsockname()[1]
+
+
+def client(port, deadline, offset):
+  # one connection per request: the server speaks HTTP/1.0.
+  latencies, errors = [], 0
+  i = offset
+  while time.monotonic() < deadline:
+    method, path, data = ROUTES[i % len(ROUTES)]
+    i += 1
+    body = urlencode(data) if data else None
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'} if data else {}
+    started = time.perf_counter()
+    try:
+      connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+      connection.request(method, path, body, headers)
+      response = connection.getresponse()
+      response.read()
+      connection.close()
+      if response.status >= 400:
+        errors += 1
+        continue
+    except (OSError, http.client.HTTPException):
+      errors += 1
+      continue
+    latencies.append((time.perf_counter() - started) * 1000)
+  return latencies, errors
+
+
+def wait_for(port, process, timeout=60):
+  deadline = time.monotonic() + timeout
+  while time.monotonic() < deadline:
+    if process.poll() is not None:
+      raise RuntimeError('server.py exited with status %d' % process.returncode)
+    try:
+      socket.create_connection(('127.0.0.1', port), timeout=1).close()
+      return
+    except OSError:
+      time.sleep(0.2)
+  raise RuntimeError('server.py did not start listening in %ds' % timeout)
+
+
+def run(workers, env, concurrency, duration):
+  port = free_port()
+  process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'server.py'), '--workers', str(workers),
+                              '--bind', '127.0.0.1:%d' % port], cwd=ROOT, env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+  try:
+    wait_for(port, process)
+    deadline = time.monotonic() + duration
+    with multiprocessing.get_context('fork').Pool(concurrency) as pool:
+      results = pool.starmap(client, [(port, deadline, i) for i in range(concurrency)])
+  finally:
+    process.send_signal(signal.SIGTERM)
+    process.wait()
+  latencies = [latency for worker_latencies, errors in results for latency in worker_latencies]
+  return {
+    'rps': len(latencies) / duration,
+    'p50_ms': percentile(latencies, .5),
+    'p95_ms': percentile(latencies, .95),
+    'errors': sum(errors for worker_latencies, errors in results),
+  }
+
+
+def main():
+  cpus = os.cpu_count() or 1
+  default_workers = sorted({2 ** i for i in range(cpus.bit_length()) if 2 ** i <= cpus} | {cpus})
+  parser = argparse.ArgumentParser(description='Measure server.py throughput against its worker count.')
+  parser.add_argument('--workers', default=','.join(map(str, default_workers)),
+                      help='comma separated worker counts (default: powers of two up to the %d CPUs)' % cpus)
+  parser.add_argument('--concurrency', type=int, help='client processes (default: twice the largest worker count)')
+  parser.add_argument('--duration', type=float, default=10, help='seconds per worker count')
+  parser.add_argument('--min-efficiency', type=float, default=0.6,
+                      help='lowest acceptable speedup / workers, for worker counts up to the CPU count')
+  args = parser.parse_args()
+  counts = [int(count) for count in args.workers.split(',')]
+  concurrency = args.concurrency or 2 * max(counts)
+
+  scratch = tempfile.mkdtemp(prefix='fyyur-server-bench-')
+  env = dict(os.environ, FYYUR_ENV='test', DATABASE_URL='sqlite:///%s' % os.path.join(scratch, 'bench.db'),
+             # one client process must not make a worker recycle mid-run
+             SERVER_MAX_REQUESTS='1000000')
+  failures = []
+  try:
+    subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'seed.py'), '--create'],
+                   env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    print('%d CPUs, %d client processes, %.0fs per run\n' % (cpus, concurrency, args.duration))
+    print('%8s %10s %9s %9s %8s %7s' % ('workers', 'req/s', 'p50 ms', 'p95 ms', 'speedup', 'errors'))
+    single = None
+    for workers in counts:
+      result = run(workers, env, concurrency, args.duration)
+      single = single or result['rps']
+      speedup = result['rps'] / single
+      status = ''
+      if workers <= cpus and speedup < args.min_efficiency * workers:
+        status = 'BELOW %.0f%% OF LINEAR' % (args.min_efficiency * 100)
+        failures.append('%d workers: %.2fx' % (workers, speedup))
+      print('%8d %10.1f %9.2f %9.2f %7.2fx %7d %s' % (
+        workers, result['rps'], result['p50_ms'], result['p95_ms'], speedup, result['errors'], status))
+  finally:
+    shutil.rmtree(scratch)
+  if failures:
+    print('\n' + '\n'.join(failures))
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
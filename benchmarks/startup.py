@@ -0,0 +1,98 @@
+#----------------------------------------------------------------------------#
+# Startup benchmark.
+#
+#   python benchmarks/startup.py [--runs N] [--budget-ms MS] [--top N]
+#
+# Times `from app import create_app; create_app()` in --runs fresh
+# interpreters and fails (exit status 1) when the median exceeds
+# --budget-ms, or when any of the modules that are meant to load on first
+# use (LAZY) was imported during startup. Interpreter start-up itself is
+# not counted. A `python -X importtime` run then lists the --top imports by
+# cumulative time, to show where the budget goes.
+#----------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# imported only by the processes that reach them: `flask db`, moment.js
+# helpers in templates, and the datetime filter. babel is not listed:
+# flask_wtf.form imports it (for its translations) whenever it is installed.
+LAZY = ['alembic', 'flask_migrate', 'flask_moment', 'dateutil']
+
+STARTUP = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - started
+print(json.dumps({'ms': elapsed * 1000, 'loaded': sorted(set(%r) & set(sys.modules))}))
+''' % LAZY
+
+
+def run(env, cwd, *options):
+  return subprocess.run([sys.executable] + list(options) + ['-c', STARTUP], env=env, cwd=cwd,
+                        check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+
+def import_times(stderr):
+  # `-X importtime` lines: "import time: self [us] | cumulative | name",
+  # nested imports indented under the one that pulled them in.
+  times = []
+  for line in stderr.splitlines():
+    if not line.startswith('import time:') or 'cumulative' in line:
+      continue
+    self_us, cumulative_us, name = line[len('import time:'):].split('|')
+    times.append((int(cumulative_us), int(self_us), name.rstrip()))
+  return times
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Hold the time to import and create the app to a budget.')
+  parser.add_argument('--runs', type=int, default=7, help='fresh interpreters to time')
+  parser.add_argument('--budget-ms', type=float, default=600, help='highest acceptable median startup time')
+  parser.add_argument('--top', type=int, default=15, help='imports to list, by cumulative time')
+  args = parser.parse_args()
+
+  scratch = tempfile.mkdtemp(prefix='fyyur-startup-bench-')
+  # run from a scratch directory so the app's error.log lands there.
+  env = dict(os.environ, FYYUR_ENV=os.environ.get('FYYUR_ENV', 'test'),
+             DATABASE_URL=os.environ.get('DATABASE_URL', 'sqlite://'),
+             PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+  try:
+    results = [json.loads(run(env, scratch).stdout) for i in range(args.runs)]
+    profile = run(env, scratch, '-X', 'importtime')
+  finally:
+    for name in os.listdir(scratch):
+      os.remove(os.path.join(scratch, name))
+    os.rmdir(scratch)
+
+  times = import_times(profile.stderr)
+  print('%12s %10s  %s' % ('cumulative', 'self', 'import'))
+  for cumulative_us, self_us, name in sorted(times, reverse=True)[:args.top]:
+    print('%10.1fms %8.1fms  %s' % (cumulative_us / 1000, self_us / 1000, name))
+
+  timings = [result['ms'] for result in results]
+  median = statistics.median(timings)
+  print('\ncreate_app() startup over %d runs: median %.0fms, min %.0fms, max %.0fms (budget %.0fms)' % (
+    len(timings), median, min(timings), max(timings), args.budget_ms))
+
+  failures = []
+  if median > args.budget_ms:
+    failures.append('startup median %.0fms is over the %.0fms budget' % (median, args.budget_ms))
+  loaded = sorted({name for result in results for name in result['loaded']})
+  if loaded:
+    failures.append('imported at startup, meant to load on first use: %s' % ', '.join(loaded))
+  if failures:
+    print('\n' + '\n'.join(failures))
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
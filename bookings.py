@@ -0,0 +1,152 @@
+#----------------------------------------------------------------------------#
+# Venue booking index.
+#
+# A show holds its venue from start_time up to (not including) end_time.
+# Two shows at one venue may not overlap, and the database enforces it so
+# every write path, bulk loads included, is covered; the same index serves
+# availability lookups ("what is booked at venue 7 in March?") without
+# reading the venue's other shows.
+#
+# Postgres: a GiST exclusion constraint on (venue_id, tsrange(start_time,
+# end_time)) (btree_gist provides the venue_id equality).
+# SQLite: an R*Tree over (venue_id, start minute, end minute) kept current
+# by triggers, and a trigger that aborts an insert or update overlapping a
+# show found through it.
+#----------------------------------------------------------------------------#
+
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import event, text, column, literal_column, and_, func, Integer
+
+EPOCH = datetime(1970, 1, 1)
+MINUTE = timedelta(minutes=1)
+
+
+def constraint_name(table):
+  return '%s_venue_no_overlap' % table
+
+
+# R*Tree coordinates are minutes since the epoch, rounded outwards so a
+# slot always covers its show: the tree finds candidates, exact times decide.
+def _sqlite_lo(value):
+  return "(CAST(strftime('%%s', %s) AS INTEGER) / 60)" % value
+
+
+def _sqlite_hi(value):
+  return "(CAST(strftime('%%s', %s) AS INTEGER) / 60 + 1)" % value
+
+
+def _minutes(value):
+  return (value - EPOCH) // MINUTE
+
+
+def _sqlite_ddl(table):
+  overlapping = (
+    "EXISTS (SELECT 1 FROM {t}_slot JOIN {t} AS booked ON booked.id = {t}_slot.id "
+    "WHERE {t}_slot.venue_lo <= new.venue_id AND {t}_slot.venue_hi >= new.venue_id "
+    "AND {t}_slot.start_lo < %s AND {t}_slot.end_hi > %s "
+    "AND booked.start_time < new.end_time AND booked.end_time > new.start_time "
+    "AND booked.start_time < booked.end_time AND new.start_time < new.end_time"
+    % (_sqlite_hi('new.end_time'), _sqlite_lo('new.start_time')))
+  slot = "new.venue_id, new.venue_id, %s, %s" % (_sqlite_lo('new.start_time'), _sqlite_hi('new.end_time'))
+  abort = "BEGIN SELECT RAISE(ABORT, '%s'); END" % constraint_name(table)
+  statements = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {t}_slot USING rtree_i32(id, venue_lo, venue_hi, start_lo, end_hi)",
+    "CREATE TRIGGER IF NOT EXISTS {t}_slot_bi BEFORE INSERT ON {t} WHEN " + overlapping + ") " + abort,
+    "CREATE TRIGGER IF NOT EXISTS {t}_slot_bu BEFORE UPDATE OF venue_id, start_time, end_time ON {t} WHEN "
+    + overlapping + " AND booked.id <> new.id) " + abort,
+    "CREATE TRIGGER IF NOT EXISTS {t}_slot_ai AFTER INSERT ON {t} BEGIN "
+    "INSERT INTO {t}_slot VALUES (new.id, " + slot + "); END",
+    "CREATE TRIGGER IF NOT EXISTS {t}_slot_au AFTER UPDATE OF venue_id, start_time, end_time ON {t} BEGIN "
+    "DELETE FROM {t}_slot WHERE id = old.id; INSERT INTO {t}_slot VALUES (new.id, " + slot + "); END",
+    "CREATE TRIGGER IF NOT EXISTS {t}_slot_ad AFTER DELETE ON {t} BEGIN "
+    "DELETE FROM {t}_slot WHERE id = old.id; END",
+    "DELETE FROM {t}_slot",
+    "INSERT INTO {t}_slot SELECT id, venue_id, venue_id, %s, %s FROM {t}"
+    % (_sqlite_lo('start_time'), _sqlite_hi('end_time')),
+  ]
+  return [statement.replace('{t}', table) for statement in statements]
+
+
+def _postgres_ddl(table):
+  statements = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    "ALTER TABLE {t} DROP CONSTRAINT IF EXISTS {c}",
+    "ALTER TABLE {t} ADD CONSTRAINT {c} EXCLUDE USING gist (venue_id WITH =, tsrange(start_time, end_time) WITH &&)",
+  ]
+  return [statement.format(t=table, c=constraint_name(table)) for statement in statements]
+
+
+def install(connection, table):
+  # idempotent, so it is safe from both create_all() and migrations.
+  dialect = connection.dialect.name
+  if dialect == 'postgresql':
+    statements = _postgres_ddl(table)
+  elif dialect == 'sqlite':
+    statements = _sqlite_ddl(table)
+  else:
+    return
+  for statement in statements:
+    connection.execute(text(statement))
+
+
+def uninstall(connection, table):
+  dialect = connection.dialect.name
+  if dialect == 'postgresql':
+    statements = ["ALTER TABLE {t} DROP CONSTRAINT IF EXISTS %s" % constraint_name(table)]
+  elif dialect == 'sqlite':
+    statements = ["DROP TRIGGER IF EXISTS {t}_slot_%s" % op for op in ('bi', 'bu', 'ai', 'au', 'ad')] + [
+      "DROP TABLE IF EXISTS {t}_slot"]
+  else:
+    return
+  for statement in statements:
+    connection.execute(text(statement.replace('{t}', table)))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+  # the R*Tree and its shadow tables, and the index behind the exclusion
+  # constraint, are not part of the models.
+  if reflected and compare_to is None:
+    if type_ == 'table':
+      return not re.search(r'_slot(_\w+)?$', name)
+    if type_ == 'index':
+      return not name.endswith('_venue_no_overlap')
+  return True
+
+
+def register(model):
+  table = model.__tablename__
+  event.listen(model.__table__, 'after_create',
+               lambda target, connection, **kw: install(connection, table))
+
+
+def is_conflict(error, table):
+  '''Whether an IntegrityError came from the no-overlap rule.'''
+  return constraint_name(table) in str(getattr(error, 'orig', error))
+
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def overlapping(table, venue_ids, start, end, dialect):
+  '''Return a condition on `table` for shows at `venue_ids` that overlap [start, end).'''
+  venue_ids = list(venue_ids)
+  c = table.c
+  if dialect == 'postgresql':
+    return and_(c.venue_id.in_(venue_ids),
+                func.tsrange(c.start_time, c.end_time).op('&&')(func.tsrange(start, end)))
+  if dialect != 'sqlite':
+    return and_(c.venue_id.in_(venue_ids), c.start_time < end, c.end_time > start)
+  slots = text(
+    "SELECT id FROM {t}_slot WHERE venue_lo <= :venue_hi AND venue_hi >= :venue_lo "
+    "AND start_lo < :until AND end_hi > :since".format(t=table.name)
+  ).bindparams(venue_lo=min(venue_ids), venue_hi=max(venue_ids),
+               since=_minutes(start), until=_minutes(end) + 1).columns(column('id', Integer))
+  # the exact test is on unary-plus copies of the columns, which keeps
+  # SQLite from scanning a (venue_id, start_time) index over the venue's
+  # whole history instead of looking up the R*Tree's candidates by id.
+  plain = {name: literal_column('+%s.%s' % (table.name, name), type_=c[name].type)
+           for name in ('venue_id', 'start_time', 'end_time')}
+  return and_(c.id.in_(slots), plain['venue_id'].in_(venue_ids), plain['start_time'] < end,
+              plain['end_time'] > start, plain['start_time'] < plain['end_time'])
@@ -0,0 +1,464 @@
+#----------------------------------------------------------------------------#
+# Bulk import and export.
+#
+# Files are CSV or JSONL, one artist, venue or show per row. Imports run in
+# batches: a batch is validated in memory through the site's own forms, its
+# genres and show foreign keys are resolved with one query apiece, shows
+# are checked for double bookings with one more, and its rows go in with a
+# single executemany (COPY on Postgres) and one commit. The batch and
+# recurring show forms and /api/v1/shows/batch go through the same loader,
+# all their rows in one transaction (create_rows).
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import itertools
+import json
+import time
+from bisect import bisect_left, insort
+from datetime import datetime
+from sqlalchemy import select, func, text
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+import bookings
+
+FORMATS = ('csv', 'jsonl')
+
+# the format ShowForm.start_time parses, used for exports too so that an
+# exported file imports unchanged.
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def detect_format(path, format=None):
+  if format:
+    return format
+  extension = path.rsplit('.', 1)[-1].lower()
+  if extension in ('jsonl', 'ndjson'):
+    return 'jsonl'
+  if extension == 'csv':
+    return 'csv'
+  raise ValueError('cannot tell the format of %s, pass --format' % path)
+
+
+def read_rows(stream, format):
+  # yields (line number, row dict).
+  if format == 'csv':
+    reader = csv.DictReader(stream)
+    for row in reader:
+      yield reader.line_num, row
+    return
+  for number, line in enumerate(stream, 1):
+    if not line.strip():
+      continue
+    try:
+      row = json.loads(line)
+    except ValueError as e:
+      raise ValueError('line %d: %s' % (number, e))
+    if not isinstance(row, dict):
+      raise ValueError('line %d: expected a JSON object' % number)
+    yield number, row
+
+
+def batches(iterable, size):
+  iterator = iter(iterable)
+  while True:
+    batch = list(itertools.islice(iterator, size))
+    if not batch:
+      return
+    yield batch
+
+
+def _text(value):
+  # string columns: blank means NULL, anything else is stored as text.
+  return None if value is None or value == '' else str(value)
+
+
+def _id(value):
+  return None if value is None or value == '' else int(value)
+
+
+def _datetime(value, name):
+  if isinstance(value, datetime):
+    return value
+  try:
+    return datetime.fromisoformat(str(value))
+  except ValueError:
+    raise ValueError('%s: not a valid datetime: %r' % (name, value))
+
+
+def _names(value):
+  # genres are a list in JSONL and comma separated in CSV.
+  if value is None:
+    return []
+  if isinstance(value, str):
+    value = value.split(',')
+  return [name.strip() for name in value if name and name.strip()]
+
+
+#----------------------------------------------------------------------------#
+# Writing rows.
+#----------------------------------------------------------------------------#
+
+def allocate_ids(connection, table, count, floor=0):
+  '''Reserve `count` primary keys for `table`, all above `floor`.
+
+  `floor` is the largest id given explicitly in the file; keys handed
+  out later, here or by the site, must not collide with it.
+  '''
+  if connection.dialect.name == 'postgresql':
+    sequence = "pg_get_serial_sequence('%s', 'id')" % table.name
+    if floor:
+      connection.execute(text("SELECT setval({s}, greatest(:floor, nextval({s})))".format(s=sequence)),
+                         floor=floor)
+    if not count:
+      return []
+    return [row[0] for row in connection.execute(
+      text("SELECT nextval(%s) FROM generate_series(1, :count)" % sequence), count=count)]
+  # elsewhere (SQLite) the keys simply follow the current maximum. SQLite
+  # has one writer at a time: a write committed since the maximum was read
+  # fails this transaction with "database is locked" rather than reuse a key.
+  start = max(floor, connection.execute(select([func.coalesce(func.max(table.c.id), 0)])).scalar()) + 1
+  return list(range(start, start + count))
+
+
+def copy_csv(rows, columns):
+  '''`rows` as COPY ... (FORMAT csv) input. COPY reads an unquoted empty
+  field as NULL and a quoted one ("") as '', so None is written unquoted
+  and everything else quoted; the csv module quotes one way or the other
+  for a whole file.'''
+  def field(value):
+    return '' if value is None else '"%s"' % str(value).replace('"', '""')
+  return ''.join(','.join(field(row[c]) for c in columns) + '\n' for row in rows)
+
+
+def insert_rows(connection, table, rows):
+  if not rows:
+    return
+  columns = list(rows[0])
+  if connection.dialect.driver == 'psycopg2':
+    connection.connection.cursor().copy_expert(
+      'COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (table.name, ', '.join(columns)),
+      io.StringIO(copy_csv(rows, columns)))
+  else:
+    connection.execute(table.insert(), rows)
+
+
+#----------------------------------------------------------------------------#
+# Loaders.
+#----------------------------------------------------------------------------#
+
+class Report(object):
+
+  def __init__(self):
+    self.read = 0
+    self.imported = 0
+    self.rejected = []
+    self.started = time.monotonic()
+
+  @property
+  def elapsed(self):
+    return time.monotonic() - self.started
+
+  @property
+  def rate(self):
+    return self.read / self.elapsed if self.elapsed else 0.0
+
+  def __str__(self):
+    return '%d imported, %d rejected of %d rows in %.1fs (%d rows/s)' % (
+      self.imported, len(self.rejected), self.read, self.elapsed, self.rate)
+
+
+class EntityLoader(object):
+  '''Imports and exports a venue or artist table with its genres.'''
+
+  def __init__(self, model, genre_model, genre_table, form_class, fields, after_insert=None):
+    self.table = model.__table__
+    self.genre = genre_model.__table__
+    self.genre_table = genre_table
+    self.fk = '%s_id' % self.table.name
+    self.form = form_class(meta={'csrf': False})
+    # form field name -> column name, for the columns the form validates
+    self.fields = fields
+    # derived columns (maintained counters) are neither imported nor exported
+    self.columns = [c.name for c in self.table.columns if not c.info.get('derived')]
+    # columns the forms leave optional but the table does not
+    self.required = [c.name for c in self.table.columns
+                     if not c.nullable and not c.primary_key and c.name in self.columns]
+    # called with (connection, rows) after each batch is inserted
+    self.after_insert = after_insert
+
+  def formdata(self, row):
+    data = MultiDict()
+    for field, column in self.fields.items():
+      if column == 'genres':
+        for name in _names(row.get('genres')):
+          data.add(field, name)
+      elif row.get(column) is not None:
+        data.add(field, str(row[column]))
+    return data
+
+  def validate(self, numbered_rows, report):
+    records = []
+    for number, row in numbered_rows:
+      # one form instance, re-bound per row, checks the same rules the
+      # create pages do without building a form per row.
+      self.form.process(self.formdata(row))
+      if not self.form.validate():
+        report.rejected.append((number, self.form.errors))
+        continue
+      record = {c: _text(row.get(c)) for c in self.columns if c != 'id'}
+      errors = {c: ['This field is required.'] for c in self.required if record[c] is None}
+      try:
+        record['id'] = _id(row.get('id'))
+      except ValueError:
+        errors['id'] = ['Not a valid integer value.']
+      if errors:
+        report.rejected.append((number, errors))
+        continue
+      records.append((record, _names(row.get('genres'))))
+    return records
+
+  def genre_ids(self, connection, names):
+    names = set(names)
+    if not names:
+      return {}
+    query = select([self.genre.c.name, self.genre.c.id]).where(self.genre.c.name.in_(names))
+    ids = dict(connection.execute(query).fetchall())
+    missing = [{'name': name} for name in sorted(names - set(ids))]
+    if missing:
+      connection.execute(self.genre.insert(), missing)
+      ids = dict(connection.execute(query).fetchall())
+    return ids
+
+  def load(self, connection, records, report):
+    rows = [record for record, genres in records]
+    explicit = [row['id'] for row in rows if row['id'] is not None]
+    ids = iter(allocate_ids(connection, self.table, len(rows) - len(explicit), max(explicit, default=0)))
+    for row in rows:
+      if row['id'] is None:
+        row['id'] = next(ids)
+    insert_rows(connection, self.table, rows)
+    if self.after_insert:
+      self.after_insert(connection, rows)
+
+    genre_ids = self.genre_ids(connection, itertools.chain.from_iterable(g for r, g in records))
+    links = [{self.fk: record['id'], 'genre_id': genre_ids[name]}
+             for record, genres in records for name in dict.fromkeys(genres)]
+    if links:
+      connection.execute(self.genre_table.insert(), links)
+    report.imported += len(rows)
+    return rows
+
+  def export(self, connection, batch_size):
+    query = select([self.table.c[c] for c in self.columns]).order_by(self.table.c.id)
+    result = connection.execution_options(stream_results=True).execute(query)
+    for rows in batches(result, batch_size):
+      names = {}
+      genres = select([self.genre_table.c[self.fk], self.genre.c.name]) \
+        .select_from(self.genre_table.join(self.genre)) \
+        .where(self.genre_table.c[self.fk].in_([row.id for row in rows])) \
+        .order_by(self.genre.c.name)
+      for entity_id, name in connection.execute(genres):
+        names.setdefault(entity_id, []).append(name)
+      for row in rows:
+        yield dict(row, genres=names.get(row.id, []))
+
+
+class ShowLoader(object):
+  '''Imports and exports shows, resolving artists and venues by id or name.'''
+
+  def __init__(self, model, artist_model, venue_model, form_class, duration, after_insert=None):
+    self.table = model.__table__
+    self.references = {'artist': artist_model.__table__, 'venue': venue_model.__table__}
+    self.form = form_class(meta={'csrf': False})
+    self.columns = ['id', 'start_time', 'end_time', 'artist_id', 'venue_id']
+    # the length of shows given without an end_time
+    self.duration = duration
+    self.touched = {'artist': set(), 'venue': set()}
+    self.after_insert = after_insert
+
+  def validate(self, numbered_rows, report):
+    records = []
+    for number, row in numbered_rows:
+      times = {}
+      for name in ('start_time', 'end_time'):
+        times[name] = row.get(name)
+        try:
+          times[name] = datetime.fromisoformat(str(times[name])).strftime(DATETIME_FORMAT)
+        except ValueError:
+          pass
+      self.form.process(MultiDict({name: value or '' for name, value in times.items()}))
+      if not self.form.validate():
+        report.rejected.append((number, self.form.errors))
+        continue
+      record = {'start_time': self.form.start_time.data,
+                'end_time': self.form.end_time.data or self.form.start_time.data + self.duration}
+      try:
+        for column in ('id', 'artist_id', 'venue_id'):
+          record[column] = _id(row.get(column))
+      except ValueError:
+        report.rejected.append((number, {column: ['Not a valid integer value.']}))
+        continue
+      for name in self.references:
+        record[name + '_name'] = _text(row.get(name + '_name'))
+      records.append((number, record))
+    return records
+
+  def resolve(self, connection, records, report):
+    # one query per referenced table for the ids and one for the names.
+    for name, table in self.references.items():
+      ids = {r[name + '_id'] for n, r in records if r[name + '_id'] is not None}
+      names = {r[name + '_name'] for n, r in records if r[name + '_id'] is None and r[name + '_name']}
+      known = {row.id for row in connection.execute(select([table.c.id]).where(table.c.id.in_(ids)))} if ids else set()
+      by_name = {}
+      if names:
+        for row in connection.execute(select([table.c.name, table.c.id]).where(table.c.name.in_(names))):
+          by_name.setdefault(row.name, []).append(row.id)
+      for number, record in records:
+        if record[name + '_id'] is not None:
+          if record[name + '_id'] not in known:
+            record['error'] = {name + '_id': ['No %s with id %s.' % (name, record[name + '_id'])]}
+        elif len(by_name.get(record[name + '_name'], ())) == 1:
+          record[name + '_id'] = by_name[record[name + '_name']][0]
+        elif record[name + '_name'] in by_name:
+          record['error'] = {name + '_name': ['%s name %r is ambiguous.' % (name, record[name + '_name'])]}
+        else:
+          record['error'] = {name + '_id': ['No %s given or found.' % name]}
+
+    resolved = []
+    for number, record in records:
+      if 'error' in record:
+        report.rejected.append((number, record['error']))
+      else:
+        resolved.append((number, {c: record[c] for c in self.columns}))
+    return resolved
+
+  def reject_overlaps(self, connection, records, report):
+    # a show overlapping one booked before, or an earlier row of the batch,
+    # at its venue is rejected here rather than failing the whole batch on
+    # the database's no-overlap rule (see bookings.py).
+    if not records:
+      return []
+    c = self.table.c
+    window = bookings.overlapping(self.table, {r['venue_id'] for n, r in records},
+                                  min(r['start_time'] for n, r in records),
+                                  max(r['end_time'] for n, r in records), connection.dialect.name)
+    booked = {}
+    for row in connection.execute(select([c.venue_id, c.start_time, c.end_time]).where(window)):
+      insort(booked.setdefault(row.venue_id, []), (row.start_time, row.end_time))
+
+    accepted = []
+    for number, record in records:
+      # slots at a venue never overlap, so sorted by start they are sorted
+      # by end too: only the last one starting before this end can clash.
+      slots = booked.setdefault(record['venue_id'], [])
+      i = bisect_left(slots, (record['end_time'],))
+      if i and slots[i - 1][1] > record['start_time']:
+        report.rejected.append((number, {'start_time': ['Venue %d is already booked from %s to %s.' % (
+          record['venue_id'], slots[i - 1][0].strftime(DATETIME_FORMAT), slots[i - 1][1].strftime(DATETIME_FORMAT))]}))
+        continue
+      insort(slots, (record['start_time'], record['end_time']))
+      accepted.append(record)
+    return accepted
+
+  def load(self, connection, records, report):
+    rows = self.reject_overlaps(connection, self.resolve(connection, records, report), report)
+    explicit = [row['id'] for row in rows if row['id'] is not None]
+    ids = iter(allocate_ids(connection, self.table, len(rows) - len(explicit), max(explicit, default=0)))
+    for row in rows:
+      if row['id'] is None:
+        row['id'] = next(ids)
+      self.touched['artist'].add(row['artist_id'])
+      self.touched['venue'].add(row['venue_id'])
+    insert_rows(connection, self.table, rows)
+    if self.after_insert:
+      self.after_insert(connection, rows)
+    report.imported += len(rows)
+    return rows
+
+  def export(self, connection, batch_size):
+    query = select([self.table.c[c] for c in self.columns]).order_by(self.table.c.id)
+    for row in connection.execution_options(stream_results=True).execute(query):
+      yield dict(row, start_time=row.start_time.strftime(DATETIME_FORMAT),
+                 end_time=row.end_time.strftime(DATETIME_FORMAT))
+
+
+def recurrences(row, rule, limit):
+  '''Return (number, show row) for each occurrence of show `row` under
+  recurrence rule `rule`, RFC 5545 RRULE syntax such as
+  "FREQ=WEEKLY;COUNT=26", starting at its start_time. Every copy keeps the
+  row's length, if it gives an end_time. A rule yielding more than `limit`
+  shows, or one without an end, is a ValueError.'''
+  # dateutil loads on first use (see app.py)
+  from dateutil.rrule import rrulestr
+  start = _datetime(row.get('start_time'), 'start_time')
+  length = _datetime(row['end_time'], 'end_time') - start if row.get('end_time') else None
+  try:
+    starts = list(itertools.islice(rrulestr(str(rule), dtstart=start), limit + 1))
+  except (ValueError, TypeError) as e:
+    raise ValueError('rrule: %r is not a valid rule (%s)' % (rule, e))
+  if len(starts) > limit:
+    raise ValueError('rrule: more than %d shows, or no COUNT or UNTIL' % limit)
+  numbered = []
+  for number, occurrence in enumerate(starts, 1):
+    show = dict(row, start_time=occurrence.strftime(DATETIME_FORMAT))
+    if length is not None:
+      show['end_time'] = (occurrence + length).strftime(DATETIME_FORMAT)
+    numbered.append((number, show))
+  return numbered
+
+
+#----------------------------------------------------------------------------#
+# Entry points.
+#----------------------------------------------------------------------------#
+
+def create_rows(session, loader, numbered_rows):
+  '''Load `numbered_rows` through `loader` in one transaction: rejected rows
+  are reported by number and the rest inserted. Return the report and the
+  rows inserted.'''
+  for attempt in range(2):
+    report = Report()
+    report.read = len(numbered_rows)
+    records = loader.validate(numbered_rows, report)
+    try:
+      rows = loader.load(session.connection(), records, report)
+      session.commit()
+      return report, rows
+    except IntegrityError as e:
+      session.rollback()
+      # a show committed elsewhere after the overlap check clashes on
+      # insert; the second pass finds it and rejects only the rows it hits.
+      if attempt or not bookings.is_conflict(e, loader.table.name):
+        raise
+
+
+def import_rows(session, loader, stream, format, batch_size):
+  '''Load every row of `stream` through `loader`, committing per batch.'''
+  report = Report()
+  for batch in batches(read_rows(stream, format), batch_size):
+    report.read += len(batch)
+    records = loader.validate(batch, report)
+    try:
+      loader.load(session.connection(), records, report)
+      session.commit()
+    except Exception as e:
+      session.rollback()
+      raise ValueError('batch starting at line %d failed (%s); %s' % (batch[0][0], getattr(e, 'orig', e), report))
+  return report
+
+
+def export_rows(session, loader, stream, format, batch_size):
+  count = 0
+  writer = None
+  for row in loader.export(session.connection(), batch_size):
+    if format == 'csv':
+      if writer is None:
+        writer = csv.DictWriter(stream, fieldnames=list(row))
+        writer.writeheader()
+      if 'genres' in row:
+        row['genres'] = ','.join(row['genres'])
+      writer.writerow(row)
+    else:
+      stream.write(json.dumps(row) + '\n')
+    count += 1
+  return count
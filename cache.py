@@ -0,0 +1,211 @@
+#----------------------------------------------------------------------------#
+# Rendered-page cache.
+#
+# GET pages are cached under a tag naming the route and entity, e.g.
+# 'venues' or 'venue:3'. Each tag has a generation number that is part of
+# every key stored under it, so invalidating a tag is a single counter
+# bump: all its variants (pagination cursors, query strings) become
+# unreachable at once and age out of the backend on their own.
+#----------------------------------------------------------------------------#
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+from flask import g, request, session
+
+
+class LRUBackend(object):
+  # in-process; bounded by entry count and per-entry TTL.
+
+  def __init__(self, max_entries=1024, ttl=300):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.evictions = 0
+    self._entries = OrderedDict()
+    # generation counters live outside the LRU: evicting one would revive
+    # pages cached under an older generation.
+    self._counters = {}
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      if key in self._counters:
+        return self._counters[key]
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      value, expires = entry
+      if expires is not None and expires < time.monotonic():
+        del self._entries[key]
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key, value, ttl=None):
+    ttl = self.ttl if ttl is None else ttl
+    with self._lock:
+      self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+        self.evictions += 1
+
+  def incr(self, key):
+    with self._lock:
+      self._counters[key] = self._counters.get(key, 0) + 1
+      return self._counters[key]
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._counters.clear()
+
+  def __len__(self):
+    return len(self._entries)
+
+
+class RedisBackend(object):
+  # shared between processes and hosts; needs the optional `redis` package.
+
+  def __init__(self, url, ttl=300, prefix='fyyur:page:'):
+    try:
+      import redis
+    except ImportError:
+      raise RuntimeError('PAGE_CACHE_BACKEND = "redis" requires the redis package')
+    self.client = redis.Redis.from_url(url)
+    self.ttl = ttl
+    self.prefix = prefix
+    self.evictions = 0
+
+  def get(self, key):
+    value = self.client.get(self.prefix + key)
+    return value.decode() if value is not None else None
+
+  def set(self, key, value, ttl=None):
+    ttl = self.ttl if ttl is None else ttl
+    self.client.set(self.prefix + key, value, ex=ttl or None)
+
+  def incr(self, key):
+    return self.client.incr(self.prefix + key)
+
+  def clear(self):
+    for key in self.client.scan_iter(self.prefix + '*'):
+      self.client.delete(key)
+
+  def __len__(self):
+    return sum(1 for _ in self.client.scan_iter(self.prefix + '*'))
+
+
+class PageCache(object):
+
+  def __init__(self, app=None):
+    self.backend = None
+    self.hits = 0
+    self.misses = 0
+    self.invalidations = 0
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    config = app.config
+    config.setdefault('PAGE_CACHE_BACKEND', 'lru')
+    config.setdefault('PAGE_CACHE_TTL', 300)
+    config.setdefault('PAGE_CACHE_MAX_ENTRIES', 1024)
+    config.setdefault('PAGE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    config.setdefault('PAGE_CACHE_WARM', [])
+    self.app = app
+    # reading from replicas (see replicas.py), a page rendered shortly after
+    # its tag was invalidated may still show what the write replaced; for
+    # the longest lag a replica in rotation can have, such pages are served
+    # but not stored.
+    self.settle = 0
+    if config.get('DATABASE_REPLICA_URLS'):
+      self.settle = int(config.get('REPLICA_MAX_LAG_SECONDS', 0) + config.get('REPLICA_CHECK_SECONDS', 0))
+
+    backend = config['PAGE_CACHE_BACKEND']
+    if backend == 'lru':
+      self.backend = LRUBackend(config['PAGE_CACHE_MAX_ENTRIES'], config['PAGE_CACHE_TTL'])
+    elif backend == 'redis':
+      self.backend = RedisBackend(config['PAGE_CACHE_REDIS_URL'], config['PAGE_CACHE_TTL'])
+    elif backend is None:
+      self.backend = None
+    else:
+      raise ValueError('unknown PAGE_CACHE_BACKEND %r' % backend)
+    app.extensions['page_cache'] = self
+
+  def _tag(self, route, entity_id=None):
+    return route if entity_id is None else '%s:%s' % (route, entity_id)
+
+  def _key(self, tag):
+    generation = self.backend.get('gen:' + tag) or 0
+    # a page answered conditionally is kept per ETag (see conditional.py):
+    # a body rendered before a write is never sent with a later version's.
+    return '%s@%s%s?%s' % (tag, generation, g.get('etag', ''), request.query_string.decode())
+
+  def cached(self, route, id_arg=None):
+    '''Cache a GET view's rendered body under the tag `route[:<id_arg>]`.'''
+    def decorator(view):
+      @functools.wraps(view)
+      def wrapper(**kwargs):
+        # pending flashes are rendered into (and consumed by) the page, so
+        # such a response is neither served from nor stored in the cache.
+        if self.backend is None or request.method != 'GET' or '_flashes' in session:
+          return view(**kwargs)
+        tag = self._tag(route, kwargs.get(id_arg) if id_arg else None)
+        key = self._key(tag)
+        body = self.backend.get(key)
+        if body is not None:
+          self.hits += 1
+          return body, 200, {'X-Cache': 'HIT'}
+        self.misses += 1
+        store = not (self.settle and self.backend.get('settle:' + tag))
+        response = view(**kwargs)
+        if getattr(response, 'is_streamed', False) and response.status_code == 200:
+          if store:
+            response.response = self._tee(key, response.response)
+          response.headers['X-Cache'] = 'MISS'
+          return response
+        if not isinstance(response, str):
+          return response
+        if store and '_flashes' not in session:
+          self.backend.set(key, response)
+        return response, 200, {'X-Cache': 'MISS'}
+      return wrapper
+    return decorator
+
+  def _tee(self, key, chunks):
+    # pass a streamed body through, storing it once it has been sent in
+    # full; a client that disconnects early leaves nothing in the cache.
+    body = []
+    for chunk in chunks:
+      body.append(chunk if isinstance(chunk, str) else chunk.decode())
+      yield chunk
+    self.backend.set(key, ''.join(body))
+
+  def invalidate(self, route, entity_ids=None):
+    # drop every cached variant of `route`, or of `route:<id>` for each id.
+    if self.backend is None:
+      return
+    tags = [self._tag(route)] if entity_ids is None else [self._tag(route, i) for i in entity_ids]
+    for tag in tags:
+      self.backend.incr('gen:' + tag)
+      if self.settle:
+        self.backend.set('settle:' + tag, '1', self.settle)
+      self.invalidations += 1
+
+  def warm(self, paths=None):
+    # render the given pages once so the first visitors get cache hits.
+    client = self.app.test_client()
+    for path in paths if paths is not None else self.app.config['PAGE_CACHE_WARM']:
+      # read the body through: streamed pages are stored once fully sent.
+      client.get(path).get_data()
+
+  def stats(self):
+    return {
+      'hits': self.hits,
+      'misses': self.misses,
+      'invalidations': self.invalidations,
+      'evictions': getattr(self.backend, 'evictions', 0),
+      'entries': len(self.backend) if self.backend is not None else 0,
+    }
@@ -0,0 +1,107 @@
+#----------------------------------------------------------------------------#
+# Commands.
+#----------------------------------------------------------------------------#
+
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+import bulk
+from extensions import db, page_cache
+from forms import ArtistForm, VenueForm
+from models import Artist, Genre, Venue, artist_genre, venue_genre, counters
+from shows import show_loader
+from views import invalidate_artist_pages, invalidate_venue_pages, sweep_counters
+
+fyyur_cli = AppGroup('fyyur', help='Bulk import and export of artists, venues and shows.')
+
+def bulk_loader(kind):
+  if kind == 'venues':
+    return bulk.EntityLoader(Venue, Genre, venue_genre, VenueForm, {
+      'name': 'name', 'city': 'city', 'state': 'state', 'address': 'address', 'phone': 'phone',
+      'genres': 'genres', 'image_link': 'image_link', 'facebook_link': 'facebook_link',
+      'website_link': 'website', 'seeking_description': 'seeking_description'},
+      after_insert=counters.venues_inserted)
+  if kind == 'artists':
+    return bulk.EntityLoader(Artist, Genre, artist_genre, ArtistForm, {
+      'name': 'name', 'city': 'city', 'state': 'state', 'phone': 'phone',
+      'genres': 'genres', 'image_link': 'image_link', 'facebook_link': 'facebook_link',
+      'website_link': 'website', 'seeking_description': 'seeking_description'})
+  return show_loader()
+
+KINDS = click.Choice(['venues', 'artists', 'shows'])
+
+@fyyur_cli.command('import')
+@click.argument('kind', type=KINDS)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--format', type=click.Choice(bulk.FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, help='Rows per transaction (BULK_BATCH_SIZE).')
+def import_command(kind, path, format, batch_size):
+  """Load venues, artists or shows from a CSV or JSONL file.
+
+  Rows are checked against the same rules as the create forms; rejected
+  rows are listed by line and the rest are loaded. Shows name their artist
+  and venue by artist_id/venue_id or by artist_name/venue_name.
+  """
+  loader = bulk_loader(kind)
+  try:
+    with click.open_file(path) as stream:
+      report = bulk.import_rows(db.session, loader, stream, bulk.detect_format(path, format),
+                                batch_size or current_app.config['BULK_BATCH_SIZE'])
+  except ValueError as e:
+    raise click.ClickException(str(e))
+  finally:
+    invalidate_venue_pages()
+    invalidate_artist_pages()
+    page_cache.invalidate('shows')
+    for route, ids in getattr(loader, 'touched', {}).items():
+      page_cache.invalidate(route, ids)
+
+  for number, errors in sorted(report.rejected, key=lambda rejected: rejected[0]):
+    click.echo('line %d: %s' % (number, errors), err=True)
+  click.echo(str(report))
+
+@fyyur_cli.command('export')
+@click.argument('kind', type=KINDS)
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', type=click.Choice(bulk.FORMATS), help='Defaults to the file extension.')
+def export_command(kind, path, format):
+  """Write every venue, artist or show to a CSV or JSONL file."""
+  try:
+    format = bulk.detect_format(path, format)
+  except ValueError as e:
+    raise click.ClickException(str(e))
+  with click.open_file(path, 'w') as stream:
+    started = time.monotonic()
+    count = bulk.export_rows(db.session, bulk_loader(kind), stream, format, current_app.config['BULK_BATCH_SIZE'])
+  elapsed = time.monotonic() - started
+  click.echo('%d rows in %.1fs (%d rows/s)' % (count, elapsed, count / elapsed if elapsed else 0), err=True)
+
+@fyyur_cli.command('sweep')
+def sweep_command():
+  """Move shows that have started from the upcoming to the past counts.
+
+  server.py does this every COUNTER_SWEEP_SECONDS; under any other server,
+  run it every minute or so (cron, a scheduler). Pages lag the clock by at
+  most the interval between runs.
+  """
+  venue_ids, artist_ids = sweep_counters()
+  click.echo('%d venues, %d artists swept' % (len(venue_ids), len(artist_ids)))
+
+@fyyur_cli.command('reconcile')
+def reconcile_command():
+  """Recompute every show counter from the shows and repair any drift."""
+  fixed = counters.reconcile(db.session.connection())
+  db.session.commit()
+  if fixed['venue'] or fixed['area']:
+    page_cache.invalidate('venues')
+  page_cache.invalidate('venue', fixed['venue'])
+  page_cache.invalidate('artist', fixed['artist'])
+  click.echo(', '.join('%d %s rows fixed' % (len(keys), table) for table, keys in sorted(fixed.items())))
+
+@click.command('warm-cache')
+@with_appcontext
+def warm_cache_command():
+  """Render the PAGE_CACHE_WARM pages into the page cache."""
+  page_cache.warm()
+  click.echo(page_cache.stats())
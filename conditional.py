@@ -0,0 +1,78 @@
+#----------------------------------------------------------------------------#
+# Conditional GETs of the venue and artist pages.
+#
+# A page showing one venue or artist is sent with a strong ETag, made of
+# the row's version (versions.py) and a fingerprint of the code and
+# templates rendering it, and with the row's updated_at as Last-Modified.
+# A request whose If-None-Match (or, without one, If-Modified-Since) still
+# matches is answered 304 from those two columns alone: nothing else is
+# loaded, rendered or looked up in the page cache. Responses say
+# Cache-Control: no-cache, so browsers and the CDN keep them but check
+# back each time.
+#
+# Nothing else goes into a page, the clock included: its upcoming / past
+# split is made at the counters' sweep watermark (views.split_shows), and
+# the sweep that moves the watermark past a show bumps the show's venue
+# and artist. A page is thus only as current as the last sweep, which
+# server.py runs every COUNTER_SWEEP_SECONDS.
+#----------------------------------------------------------------------------#
+
+import functools
+import hashlib
+import os
+from flask import current_app, g, request, session
+from werkzeug.http import is_resource_modified
+from extensions import db
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def release():
+  '''A fingerprint of what renders the pages: the modules, the templates
+  and the asset manifest. It changes with each deploy that changes them,
+  and is the same in every process running the same code.'''
+  fingerprint = current_app.extensions.get('release')
+  if fingerprint is None:
+    digest = hashlib.sha1()
+    paths = [os.path.join(ROOT, name) for name in os.listdir(ROOT) if name.endswith('.py')]
+    for directory, subdirectories, filenames in os.walk(os.path.join(ROOT, 'templates')):
+      paths.extend(os.path.join(directory, filename) for filename in filenames)
+    paths.append(os.path.join(current_app.static_folder, 'dist', 'manifest.json'))
+    for path in sorted(paths):
+      if os.path.isfile(path):
+        digest.update(os.path.relpath(path, ROOT).encode('utf-8'))
+        with open(path, 'rb') as f:
+          digest.update(f.read())
+    fingerprint = current_app.extensions['release'] = digest.hexdigest()[:12]
+  return fingerprint
+
+
+def conditional(model, id_arg):
+  '''Answer conditional GETs of a view of the `model` row the `id_arg`
+  argument names.'''
+  def decorator(view):
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+      # pending flashes are rendered into the page, so it is not the
+      # representation its ETag names.
+      if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+        return view(**kwargs)
+      row = db.session.query(model.version, model.updated_at).filter(model.id == kwargs[id_arg]).first()
+      if row is None:
+        # the view answers 404
+        return view(**kwargs)
+      etag = '%s-%d' % (release(), row.version)
+      if not is_resource_modified(request.environ, etag=etag, last_modified=row.updated_at):
+        response = current_app.response_class(status=304)
+      else:
+        # the page cache keeps the body under this ETag (see cache.py)
+        g.etag = etag
+        response = current_app.make_response(view(**kwargs))
+        if response.status_code != 200:
+          return response
+      response.set_etag(etag)
+      response.last_modified = row.updated_at
+      response.cache_control.no_cache = True
+      return response
+    return wrapper
+  return decorator
@@ -1,13 +1,219 @@
 import os
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Debug mode, the database and the secret key come from the profile
+# selected by FYYUR_ENV (see Profiles below).
+DEBUG = False
+SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-# Connect to the database
+# Listing pages (/venues, /artists, /shows) are keyset paginated.
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
+# Venue and artist search: terms shorter than SEARCH_MIN_LENGTH characters
+# are not run, and only the SEARCH_LIMIT best-ranked matches are shown.
+SEARCH_MIN_LENGTH = 2
+SEARCH_LIMIT = 50
 
-# TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://:admin@localhost:5432/fyyur'
+# Upper bound on the upcoming / past show lists rendered on a venue or artist page.
+DETAIL_SHOWS_LIMIT = 50
+
+# Raise on any relationship access a route did not declare in its loading
+# profile (see LOAD_PROFILES in models.py). Meant for tests.
+RAISE_ON_LAZY_LOAD = False
+
+# Rendered-page cache for the listing and detail pages; the backend and
+# its Redis URL are set per profile (PAGE_CACHE_BACKEND below).
+PAGE_CACHE_TTL = 300
+PAGE_CACHE_MAX_ENTRIES = 1024
+# rendered at startup so the first visitors hit a warm cache
+PAGE_CACHE_WARM = ['/venues', '/artists', '/shows']
+
+# Rows fetched per round trip (and per flushed chunk) when the JSON API
+# streams a collection.
+API_STREAM_BATCH = 1000
+
+# Stream the /venues, /artists and /shows pages: rows are fetched while
+# the template renders and sent in chunks of STREAM_BUFFER template events.
+STREAM_LISTINGS = True
+STREAM_BUFFER = 64
+
+# Rows per transaction for `flask fyyur import` and per fetch for export.
+BULK_BATCH_SIZE = 5000
+
+# A show holds its venue until its end time; shows created without one
+# (the form leaves it optional, imports may omit it) get this length.
+SHOW_DURATION_MINUTES = 180
+# Longest date range one /venues/<id>/calendar request may ask for.
+CALENDAR_MAX_DAYS = 366
+# Most shows one recurring show form or /api/v1/shows/batch request may create.
+SHOW_BATCH_MAX = 500
+
+
+# Read replicas (see replicas.py), listed in the profile's
+# DATABASE_REPLICA_URLS: how often each worker checks a replica, how long
+# one that fails a check sits out, the replication lag past which it
+# fails, and how long a client that wrote reads from the primary.
+REPLICA_CHECK_SECONDS = 5
+REPLICA_RETRY_SECONDS = 30
+REPLICA_MAX_LAG_SECONDS = 10
+REPLICA_STICKY_SECONDS = 15
+
+# Log records waiting for the listener thread to write them (see logs.py);
+# when it falls this far behind, further records are dropped.
+LOG_QUEUE_SIZE = 10000
+
+# Per-endpoint latency, SQL and render timings, served at /metrics.
+# Statements slower than METRICS_SLOW_QUERY_SECONDS are logged.
+METRICS_ENABLED = True
+METRICS_SLOW_QUERY_SECONDS = 0.25
+
+# /api/v1/typeahead: results per lookup (default and cap), and how often
+# each worker rebuilds its in-memory index to see other workers' writes.
+TYPEAHEAD_LIMIT = 8
+TYPEAHEAD_MAX_LIMIT = 20
+TYPEAHEAD_REFRESH = 300
+
+# Seconds browsers may cache the fingerprinted files `python assets.py`
+# builds into static/dist/ (see assets.py).
+ASSETS_MAX_AGE = 365 * 24 * 3600
+
+#----------------------------------------------------------------------------#
+# Profiles.
+#
+# FYYUR_ENV picks one of dev (default), test or prod. Any setting of the
+# profile can then be overridden by an environment variable of the same
+# name, e.g. DB_POOL_SIZE=20; DATABASE_URL sets SQLALCHEMY_DATABASE_URI.
+#----------------------------------------------------------------------------#
+
+class DevConfig(object):
+  DEBUG = True
+  # signs sessions and flashes; every worker, and every restart, must use
+  # the same one. Not a secret outside development.
+  SECRET_KEY = 'fyyur-development-key'
+  SQLALCHEMY_DATABASE_URI = 'postgresql://:admin@localhost:5432/fyyur'
+  # connections kept open, and extra ones opened under bursts
+  DB_POOL_SIZE = 5
+  DB_MAX_OVERFLOW = 5
+  # seconds a request waits for a free connection before failing
+  DB_POOL_TIMEOUT = 10
+  # seconds before a connection is replaced, ahead of server/proxy idle cutoffs
+  DB_POOL_RECYCLE = 1800
+  # test each connection on checkout so a restarted server costs no errors
+  DB_POOL_PRE_PING = True
+  # milliseconds any one statement may run (Postgres statement_timeout)
+  DB_STATEMENT_TIMEOUT = 30000
+  # seconds to wait for a new connection (Postgres connect_timeout), so an
+  # unreachable replica is given up on quickly
+  DB_CONNECT_TIMEOUT = 5
+  # comma-separated URLs of read replicas of SQLALCHEMY_DATABASE_URI; GET
+  # requests and searches read from them. SQLite files work too, e.g. for
+  # trying it out.
+  DATABASE_REPLICA_URLS = ''
+  # outside debug mode, app.logger writes JSON lines to LOG_FILE (none if
+  # empty), rotated at LOG_MAX_BYTES or, if set, on the LOG_ROTATE_WHEN
+  # schedule ('midnight', 'H', ...), keeping LOG_BACKUP_COUNT old files.
+  LOG_FILE = 'error.log'
+  LOG_LEVEL = 'INFO'
+  LOG_MAX_BYTES = 10 * 1024 * 1024
+  LOG_ROTATE_WHEN = ''
+  LOG_BACKUP_COUNT = 5
+  # server.py: address, worker processes (0: one per CPU), requests a
+  # worker serves before it is replaced (plus up to the jitter, so workers
+  # do not all restart at once), seconds a stopping worker gets to finish
+  # its request, and seconds a client may take to send a request.
+  SERVER_HOST = '127.0.0.1'
+  SERVER_PORT = 5000
+  SERVER_WORKERS = 0
+  SERVER_MAX_REQUESTS = 10000
+  SERVER_MAX_REQUESTS_JITTER = 1000
+  SERVER_GRACEFUL_TIMEOUT = 30
+  SERVER_TIMEOUT = 30
+  # seconds between server.py's sweeps of the show counters (counters.py),
+  # which move the upcoming / past split of every page on with the clock;
+  # 0 leaves it to `flask fyyur sweep` run from cron.
+  COUNTER_SWEEP_SECONDS = 60
+  # rendered-page cache: 'lru' keeps one in each process, which only that
+  # process's writes invalidate, so server.py turns it off when it runs
+  # more than one worker; 'redis' (needs the redis package) is shared by
+  # every worker and host. None disables it.
+  PAGE_CACHE_BACKEND = 'lru'
+  PAGE_CACHE_REDIS_URL = 'redis://localhost:6379/0'
+  # pages load the bundles built by `python assets.py`; in development,
+  # the source files, so edits show up without a rebuild.
+  ASSETS_BUNDLED = False
+
+class TestConfig(DevConfig):
+  DEBUG = False
+  TESTING = True
+  RAISE_ON_LAZY_LOAD = True
+  SQLALCHEMY_DATABASE_URI = 'sqlite://'
+  DB_STATEMENT_TIMEOUT = 5000
+  ASSETS_BUNDLED = True
+
+class ProdConfig(DevConfig):
+  DEBUG = False
+  # required: set DATABASE_URL and SECRET_KEY
+  SQLALCHEMY_DATABASE_URI = None
+  SECRET_KEY = None
+  SERVER_HOST = '0.0.0.0'
+  DB_POOL_SIZE = 10
+  DB_MAX_OVERFLOW = 20
+  DB_POOL_TIMEOUT = 5
+  DB_STATEMENT_TIMEOUT = 10000
+  ASSETS_BUNDLED = True
+
+profiles = {'dev': DevConfig, 'test': TestConfig, 'prod': ProdConfig}
+
+
+def from_env(name, default):
+  # environment values are cast to the type of the profile's default.
+  value = os.environ.get(name)
+  if value is None or value == '':
+    return default
+  if isinstance(default, bool):
+    return value.lower() in ('1', 'true', 'yes', 'on')
+  if isinstance(default, int):
+    return int(value)
+  return value
+
+
+def engine_options(settings):
+  uri = settings['SQLALCHEMY_DATABASE_URI']
+  options = {
+    'pool_pre_ping': settings['DB_POOL_PRE_PING'],
+    'pool_recycle': settings['DB_POOL_RECYCLE'],
+  }
+  # SQLite gets a static or null pool from Flask-SQLAlchemy and has no
+  # server-side statement timeout.
+  if uri.startswith('sqlite'):
+    return options
+  options.update(
+    pool_size=settings['DB_POOL_SIZE'],
+    max_overflow=settings['DB_MAX_OVERFLOW'],
+    pool_timeout=settings['DB_POOL_TIMEOUT'],
+  )
+  if uri.startswith('postgres'):
+    options['connect_args'] = {'options': '-c statement_timeout=%d' % settings['DB_STATEMENT_TIMEOUT'],
+                               'connect_timeout': settings['DB_CONNECT_TIMEOUT']}
+  return options
+
+
+def profile(name=None):
+  '''Return the settings of profile `name` (default: $FYYUR_ENV, else dev).'''
+  name = name or os.environ.get('FYYUR_ENV') or 'dev'
+  if name not in profiles:
+    raise RuntimeError('FYYUR_ENV must be one of %s, not %r' % (', '.join(profiles), name))
+  defaults = profiles[name]
+  settings = {key: from_env(key, getattr(defaults, key)) for key in dir(defaults) if key.isupper()}
+  settings['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or settings['SQLALCHEMY_DATABASE_URI']
+  if not settings['SQLALCHEMY_DATABASE_URI']:
+    raise RuntimeError('the %s profile needs DATABASE_URL' % name)
+  if not settings['SECRET_KEY']:
+    raise RuntimeError('the %s profile needs SECRET_KEY' % name)
+  # the port platforms such as Heroku assign
+  settings['SERVER_PORT'] = int(os.environ.get('PORT') or settings['SERVER_PORT'])
+  settings['FYYUR_ENV'] = name
+  settings['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(settings)
+  return settings
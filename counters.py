@@ -0,0 +1,247 @@
+#----------------------------------------------------------------------------#
+# Maintained show counters.
+#
+# Venues and artists carry their upcoming and past show counts, and the
+# area table rolls venues up per (city, state), so listing pages read the
+# counts straight from the rows instead of counting shows per request.
+#
+# A show counts as upcoming while its start_time is after the sweep
+# watermark (counter_sweep.swept_until). Writes adjust the counters in the
+# same transaction as the show itself; the sweep moves the shows that
+# started since the last run from upcoming to past and advances the
+# watermark, so counts lag the clock by at most the sweep interval.
+# reconcile recomputes everything from the show table and repairs drift.
+# A venue or artist whose counters change gets a new version (versions.py).
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from sqlalchemy import bindparam, event, func, select, text
+from sqlalchemy.orm import attributes
+from versions import bumped
+
+
+class Deltas(object):
+  # per-row [upcoming, past] changes; venue changes carry over to their
+  # areas. `area` holds changes made by venues moving in or out.
+
+  def __init__(self):
+    self.venue = {}
+    self.artist = {}
+    self.area = {}
+
+  def show(self, venue_id, artist_id, upcoming, sign=1):
+    column = 0 if upcoming else 1
+    for counts, key in ((self.venue, venue_id), (self.artist, artist_id)):
+      counts.setdefault(key, [0, 0])[column] += sign
+
+  def area_of(self, key, upcoming=0, past=0, venues=0):
+    counts = self.area.setdefault(key, [0, 0, 0])
+    counts[0] += upcoming
+    counts[1] += past
+    counts[2] += venues
+
+
+class ShowCounters(object):
+
+  def __init__(self, show, venue, artist, area, sweep_state):
+    self.show = show.__table__
+    self.venue = venue.__table__
+    self.artist = artist.__table__
+    self.area = area.__table__
+    self.state = sweep_state.__table__
+    event.listen(show, 'after_insert', self._show_inserted)
+    event.listen(show, 'after_delete', self._show_deleted)
+    event.listen(show, 'after_update', self._show_updated)
+    event.listen(venue, 'after_insert', self._venue_inserted)
+    event.listen(venue, 'after_delete', self._venue_deleted)
+    event.listen(venue, 'after_update', self._venue_updated)
+    # a new schema starts its watermark at creation time.
+    event.listen(self.state, 'after_create',
+                 lambda table, connection, **kw: connection.execute(table.insert(), id=1, swept_until=datetime.now()))
+
+  def swept_until(self, connection, lock=None):
+    # writers take the row in share mode and the sweep and reconcile
+    # exclusively (on Postgres), so a show is never counted on one side of
+    # a watermark that moves under it.
+    query = select([self.state.c.swept_until]).where(self.state.c.id == 1)
+    if lock:
+      query = query.with_for_update(read=lock == 'share')
+    swept_until = connection.execute(query).scalar()
+    if swept_until is None:
+      swept_until = datetime.now()
+      connection.execute(self.state.insert(), id=1, swept_until=swept_until)
+    return swept_until
+
+  def watermark(self):
+    '''swept_until as a scalar subquery, for splitting shows the way the
+    counters count them.'''
+    return select([self.state.c.swept_until]).where(self.state.c.id == 1).as_scalar()
+
+  #--------------------------------------------------------------------------#
+  # Writes.
+  #--------------------------------------------------------------------------#
+
+  def shows_changed(self, connection, rows, sign=1):
+    '''Count (venue_id, artist_id, start_time) rows in (sign=1) or out (sign=-1).'''
+    rows = [(int(venue_id), int(artist_id), start_time) for venue_id, artist_id, start_time in rows]
+    if not rows:
+      return
+    swept_until = self.swept_until(connection, lock='share')
+    deltas = Deltas()
+    for venue_id, artist_id, start_time in rows:
+      deltas.show(venue_id, artist_id, start_time > swept_until, sign)
+    self.apply(connection, deltas)
+
+  def shows_inserted(self, connection, rows):
+    # bulk loads, which insert show dicts without going through the ORM.
+    self.shows_changed(connection, [(row['venue_id'], row['artist_id'], row['start_time']) for row in rows])
+
+  def venues_inserted(self, connection, rows):
+    deltas = Deltas()
+    for row in rows:
+      deltas.area_of((row['city'], row['state']), venues=1)
+    self.apply(connection, deltas)
+
+  def apply(self, connection, deltas):
+    v = self.venue
+    for table, counts in ((v, deltas.venue), (self.artist, deltas.artist)):
+      changed = [{'_id': key, '_upcoming': upcoming, '_past': past}
+                 for key, (upcoming, past) in counts.items() if upcoming or past]
+      if not changed:
+        continue
+      connection.execute(table.update().where(table.c.id == bindparam('_id')).values(
+        upcoming_shows_count=table.c.upcoming_shows_count + bindparam('_upcoming'),
+        past_shows_count=table.c.past_shows_count + bindparam('_past'), **bumped(table)), changed)
+      if table is v:
+        # the venues' areas get the same deltas, found through the venue
+        # rows; a venue's area row exists from the venue's insert on.
+        located = lambda column: select([column]).where(v.c.id == bindparam('_id')).as_scalar()
+        area = self.area
+        connection.execute(area.update().where(area.c.city == located(v.c.city))
+                           .where(area.c.state == located(v.c.state)).values(
+          upcoming_shows_count=area.c.upcoming_shows_count + bindparam('_upcoming'),
+          past_shows_count=area.c.past_shows_count + bindparam('_past')), changed)
+
+    changed = [{'city': city, 'state': state, 'upcoming': upcoming, 'past': past, 'venues': venues}
+               for (city, state), (upcoming, past, venues) in deltas.area.items() if upcoming or past or venues]
+    if changed:
+      connection.execute(self._upsert_area('area.{0} + excluded.{0}'), changed)
+
+  @staticmethod
+  def _upsert_area(assignment):
+    # the same statement on Postgres and SQLite (3.24+).
+    return text(
+      'INSERT INTO area (city, state, upcoming_shows_count, past_shows_count, venue_count) '
+      'VALUES (:city, :state, :upcoming, :past, :venues) '
+      'ON CONFLICT (city, state) DO UPDATE SET ' +
+      ', '.join('{0} = {1}'.format(column, assignment.format(column))
+                for column in ('upcoming_shows_count', 'past_shows_count', 'venue_count')))
+
+  #--------------------------------------------------------------------------#
+  # ORM events, run inside the flush that writes the row.
+  #--------------------------------------------------------------------------#
+
+  @staticmethod
+  def _changed(instance, names):
+    # (old, new) values; after_update also fires for rows with no net change.
+    histories = [attributes.get_history(instance, name) for name in names]
+    old = tuple((history.deleted or history.unchanged or history.added)[0] for history in histories)
+    return old, tuple(getattr(instance, name) for name in names)
+
+  def _show_inserted(self, mapper, connection, show):
+    self.shows_changed(connection, [(show.venue_id, show.artist_id, show.start_time)])
+
+  def _show_deleted(self, mapper, connection, show):
+    self.shows_changed(connection, [(show.venue_id, show.artist_id, show.start_time)], -1)
+
+  def _show_updated(self, mapper, connection, show):
+    old, new = self._changed(show, ('venue_id', 'artist_id', 'start_time'))
+    if old != new:
+      self.shows_changed(connection, [old], -1)
+      self.shows_changed(connection, [new])
+
+  def _venue_inserted(self, mapper, connection, venue):
+    self.venues_inserted(connection, [{'city': venue.city, 'state': venue.state}])
+
+  def _venue_deleted(self, mapper, connection, venue):
+    deltas = Deltas()
+    deltas.area_of((venue.city, venue.state), -venue.upcoming_shows_count, -venue.past_shows_count, -1)
+    self.apply(connection, deltas)
+
+  def _venue_updated(self, mapper, connection, venue):
+    old, new = self._changed(venue, ('city', 'state'))
+    if old == new:
+      return
+    counts = connection.execute(select([self.venue.c.upcoming_shows_count, self.venue.c.past_shows_count])
+                                .where(self.venue.c.id == venue.id)).first()
+    deltas = Deltas()
+    deltas.area_of(old, -counts[0], -counts[1], -1)
+    deltas.area_of(new, counts[0], counts[1], 1)
+    self.apply(connection, deltas)
+
+  #--------------------------------------------------------------------------#
+  # Sweep and reconcile.
+  #--------------------------------------------------------------------------#
+
+  def sweep(self, connection, now=None):
+    '''Move shows that started since the last sweep from upcoming to past.
+
+    Returns the (venue_ids, artist_ids) whose counts changed.
+    '''
+    now = now or datetime.now()
+    swept_until = self.swept_until(connection, lock='update')
+    if now <= swept_until:
+      return set(), set()
+    started = select([self.show.c.venue_id, self.show.c.artist_id]) \
+      .where(self.show.c.start_time > swept_until).where(self.show.c.start_time <= now)
+    deltas = Deltas()
+    for venue_id, artist_id in connection.execute(started):
+      deltas.show(venue_id, artist_id, True, -1)
+      deltas.show(venue_id, artist_id, False)
+    self.apply(connection, deltas)
+    connection.execute(self.state.update().where(self.state.c.id == 1).values(swept_until=now))
+    return set(deltas.venue), set(deltas.artist)
+
+  def reconcile(self, connection):
+    '''Recompute every counter from the show table; returns the keys fixed per table.'''
+    swept_until = self.swept_until(connection, lock='update')
+    fixed = {}
+    actual = {}
+    for table, fk in ((self.venue, self.show.c.venue_id), (self.artist, self.show.c.artist_id)):
+      upcoming = (self.show.c.start_time > swept_until).label('upcoming')
+      counts = actual[table.name] = {}
+      for entity_id, is_upcoming, count in connection.execute(
+          select([fk, upcoming, func.count()]).group_by(fk, upcoming)):
+        counts.setdefault(entity_id, [0, 0])[0 if is_upcoming else 1] = count
+
+      stored = select([table.c.id, table.c.upcoming_shows_count, table.c.past_shows_count])
+      wrong = [{'_id': entity_id, '_upcoming': counts.get(entity_id, [0, 0])[0],
+                '_past': counts.get(entity_id, [0, 0])[1]}
+               for entity_id, upcoming_count, past_count in connection.execute(stored)
+               if [upcoming_count, past_count] != counts.get(entity_id, [0, 0])]
+      if wrong:
+        connection.execute(table.update().where(table.c.id == bindparam('_id')).values(
+          upcoming_shows_count=bindparam('_upcoming'), past_shows_count=bindparam('_past'), **bumped(table)), wrong)
+      fixed[table.name] = [row['_id'] for row in wrong]
+
+    areas = {}
+    for venue_id, city, state in connection.execute(select([self.venue.c.id, self.venue.c.city, self.venue.c.state])):
+      upcoming, past = actual['venue'].get(venue_id, [0, 0])
+      counts = areas.setdefault((city, state), [0, 0, 0])
+      counts[0] += upcoming
+      counts[1] += past
+      counts[2] += 1
+    area = self.area
+    stored = {(row.city, row.state): [row.upcoming_shows_count, row.past_shows_count, row.venue_count]
+              for row in connection.execute(select([area]))}
+    stale = [{'_city': city, '_state': state} for city, state in stored if (city, state) not in areas]
+    if stale:
+      connection.execute(area.delete().where(area.c.city == bindparam('_city'))
+                         .where(area.c.state == bindparam('_state')), stale)
+    wrong = [{'city': city, 'state': state, 'upcoming': upcoming, 'past': past, 'venues': venues}
+             for (city, state), (upcoming, past, venues) in areas.items()
+             if stored.get((city, state)) != [upcoming, past, venues]]
+    if wrong:
+      connection.execute(self._upsert_area('excluded.{0}'), wrong)
+    fixed['area'] = [(row['city'], row['state']) for row in wrong] + [(row['_city'], row['_state']) for row in stale]
+    return fixed
@@ -0,0 +1,59 @@
+#----------------------------------------------------------------------------#
+# Extensions.
+#
+# Created unbound here and attached to an app by create_app(), so models,
+# blueprints and commands can import them without building an app.
+# Extensions only some processes use (migrations, moment.js helpers) are
+# imported on first use rather than at startup; see Deferred.
+#----------------------------------------------------------------------------#
+
+import importlib
+from assets import Assets
+from cache import PageCache
+from logs import Logs
+from metrics import Metrics
+from replicas import Replicas, RoutingSQLAlchemy
+from typeahead import Typeahead
+
+db = RoutingSQLAlchemy()
+replicas = Replicas()
+page_cache = PageCache()
+metrics = Metrics()
+typeahead = Typeahead()
+assets = Assets()
+logs = Logs()
+
+
+class Deferred(object):
+  '''Stands in for the object `load()` returns, calling it on first use.'''
+
+  def __init__(self, load):
+    self._load = load
+    self._target = None
+
+  def _resolve(self):
+    if self._target is None:
+      self._target = self._load()
+    return self._target
+
+  def __getattr__(self, name):
+    return getattr(self._resolve(), name)
+
+  def __call__(self, *args, **kwargs):
+    return self._resolve()(*args, **kwargs)
+
+
+def defer_migrate(app, **kwargs):
+  # Flask-Migrate pulls in alembic, which only `flask db` needs.
+  def load():
+    from flask_migrate import Migrate
+    Migrate(app, db, **kwargs)
+    return app.extensions['migrate']
+  app.extensions['migrate'] = Deferred(load)
+
+
+def defer_moment(app):
+  # Flask-Moment imports distutils; templates reach it as `moment`.
+  moment = Deferred(lambda: importlib.import_module('flask_moment')._moment)
+  app.extensions['moment'] = moment
+  app.jinja_env.globals['moment'] = moment
@@ -0,0 +1,41 @@
+#----------------------------------------------------------------------------#
+# Template filters.
+#
+# babel and dateutil are imported on the first call, not at startup.
+#----------------------------------------------------------------------------#
+
+import functools
+from pagination import page_url
+
+DATETIME_FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+
+@functools.lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+  # compiling the babel pattern and loading the locale dominate a format
+  # call, so both are done once per (format, locale).
+  import babel
+  import babel.dates
+  return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format)), babel.Locale.parse(locale)
+
+@functools.lru_cache(maxsize=65536)
+def format_datetime_cached(value, format, locale):
+  # listings re-render the same start times on every request.
+  pattern, babel_locale = datetime_pattern(format, locale)
+  return pattern.apply(value, babel_locale)
+
+def format_datetime(value, format='medium', locale='en'):
+  if isinstance(value, str):
+    import dateutil.parser
+    value = dateutil.parser.parse(value)
+  return format_datetime_cached(value, format, locale)
+
+def format_datetimes(values, format='medium', locale='en'):
+  # format a whole list in one call, e.g. every tile on /shows.
+  return [format_datetime_cached(value, format, locale) for value in values]
+
+def register(app):
+  app.jinja_env.filters['datetime'] = format_datetime
+  app.jinja_env.globals['page_url'] = page_url
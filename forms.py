@@ -1,7 +1,7 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL,Regexp
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, DateField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL,Regexp, Optional, ValidationError, NumberRange
 
 class ShowForm(Form):
     
@@ -16,6 +16,48 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    # optional; defaults to start_time + SHOW_DURATION_MINUTES
+    end_time = DateTimeField(
+        'end_time',
+        validators=[Optional()]
+    )
+
+    def validate_end_time(self, field):
+        if field.data and self.start_time.data and field.data <= self.start_time.data:
+            raise ValidationError('End time must be after the start time.')
+
+class RecurringShowForm(ShowForm):
+    # the show repeats every `interval` days, weeks or months, up to and
+    # including the date `until` or `count` times; one of the two.
+    frequency = SelectField(
+        'frequency', validators=[DataRequired()],
+        choices=[('WEEKLY', 'weeks'), ('DAILY', 'days'), ('MONTHLY', 'months')]
+    )
+    interval = IntegerField(
+        'interval', validators=[Optional(), NumberRange(min=1)],
+        default=1
+    )
+    until = DateField(
+        'until', validators=[Optional()]
+    )
+    count = IntegerField(
+        'count', validators=[Optional(), NumberRange(min=1)]
+    )
+
+    def validate(self):
+        if not super().validate():
+            return False
+        if bool(self.until.data) == bool(self.count.data):
+            self.count.errors.append('Give either a last date or a number of shows.')
+            return False
+        return True
+
+    def rrule(self):
+        '''The recurrence as an RFC 5545 rule, e.g. FREQ=WEEKLY;INTERVAL=1;COUNT=26.'''
+        rule = 'FREQ=%s;INTERVAL=%d' % (self.frequency.data, self.interval.data or 1)
+        if self.count.data:
+            return rule + ';COUNT=%d' % self.count.data
+        return rule + ';UNTIL=%sT235959' % self.until.data.strftime('%Y%m%d')
 
 class VenueForm(Form):
     name = StringField(
@@ -0,0 +1,312 @@
+#----------------------------------------------------------------------------#
+# Logging.
+#
+# Outside debug mode, app.logger's records go to LOG_FILE as one JSON
+# object per line, with the id, method and route of the request that
+# logged them. The thread that logs only puts the record on a queue; a
+# listener thread writes it, rotating the file when it reaches
+# LOG_MAX_BYTES, or on the LOG_ROTATE_WHEN schedule (e.g. 'midnight'), and
+# keeping LOG_BACKUP_COUNT old files. Flask's stderr handler is moved
+# behind the same queue. When the queue is full, records are dropped (and
+# counted) rather than holding up requests. Putting a record on the queue
+# never wakes the listener, which would cost the request a context switch
+# per record: the listener drains the queue every POLL seconds instead.
+#
+# server.py's workers pass their records on to the master process through
+# a pipe, and the master alone writes the file: several processes rotating
+# one file lose lines.
+#
+# Every response carries its request id in X-Request-ID: the request's
+# own, when a proxy set a usable one, else a new one.
+#----------------------------------------------------------------------------#
+
+import atexit
+import collections
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_REQUEST_ID = re.compile(r'[A-Za-z0-9._:-]{1,128}\Z')
+
+# seconds between the listener's looks at an empty queue
+POLL = 0.05
+
+# request details the queue handler adds to each record
+CONTEXT = ('request_id', 'method', 'route', 'path')
+
+
+def request_id():
+  '''The current request's id, taken from its X-Request-ID if usable.'''
+  if 'request_id' not in g:
+    given = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = given if _REQUEST_ID.match(given) else uuid.uuid4().hex
+  return g.request_id
+
+
+def _request_context():
+  # worked out once per request and kept on it: records are logged on the
+  # request thread, so each should cost it as little as possible.
+  if not has_request_context():
+    return None
+  context = g.get('log_context')
+  if context is None:
+    rule = request.url_rule
+    context = g.log_context = {'request_id': request_id(), 'method': request.method,
+                               'route': rule.rule if rule is not None else None, 'path': request.path}
+  return context
+
+
+class JSONFormatter(logging.Formatter):
+
+  def format(self, record):
+    entry = {
+      'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+      'level': record.levelname,
+      'logger': record.name,
+      'message': record.getMessage(),
+      'process': record.process,
+      'location': '%s:%d' % (record.pathname, record.lineno),
+    }
+    for name in CONTEXT:
+      value = getattr(record, name, None)
+      if value is not None:
+        entry[name] = value
+    if record.exc_info and not record.exc_text:
+      record.exc_text = self.formatException(record.exc_info)
+    if record.exc_text:
+      entry['exception'] = record.exc_text
+    if record.stack_info:
+      entry['stack'] = record.stack_info
+    return json.dumps(entry, default=str)
+
+
+class RequestQueueHandler(logging.handlers.QueueHandler):
+  '''Puts records, with their request's details, on the queue without
+  ever waiting for it.'''
+
+  def __init__(self, records, logs):
+    logging.handlers.QueueHandler.__init__(self, records)
+    self.logs = logs
+
+  def prepare(self, record):
+    # the message and traceback are rendered here, while the arguments
+    # and the exception are still what they were; what the listener gets
+    # is plain data that also pickles across processes. The record is
+    # changed in place rather than copied: any other handler renders it
+    # just the same.
+    record.msg = record.getMessage()
+    record.args = None
+    if record.exc_info:
+      record.exc_text = logging.Formatter().formatException(record.exc_info)
+      record.exc_info = None
+    context = _request_context()
+    if context is not None:
+      record.__dict__.update(context)
+    return record
+
+  def handle(self, record):
+    # without Handler.handle()'s lock: preparing touches only the record,
+    # and putting it on the queue is thread-safe.
+    if self.filter(record):
+      self.emit(record)
+      return True
+    return False
+
+  def enqueue(self, record):
+    try:
+      self.queue.put_nowait(record)
+    except queue.Full:
+      self.logs.dropped += 1
+
+
+class RecordQueue(object):
+  '''A bounded queue that putting on never blocks or wakes a thread; an
+  empty one is polled.'''
+
+  def __init__(self, maxsize):
+    self.maxsize = maxsize
+    self.records = collections.deque()
+
+  def put_nowait(self, record):
+    if len(self.records) >= self.maxsize:
+      raise queue.Full
+    self.records.append(record)
+
+  def put(self, record):
+    self.records.append(record)
+
+  def get(self):
+    while True:
+      try:
+        return self.records.popleft()
+      except IndexError:
+        time.sleep(POLL)
+
+  def empty(self):
+    return not self.records
+
+
+class QueueListener(logging.handlers.QueueListener):
+  '''Listens on a RecordQueue or a multiprocessing.SimpleQueue, flushing
+  its handlers whenever it has emptied the queue.'''
+
+  def dequeue(self, block):
+    return self.queue.get()
+
+  def enqueue_sentinel(self):
+    self.queue.put(self._sentinel)
+
+  def handle(self, record):
+    logging.handlers.QueueListener.handle(self, record)
+    if self.queue.empty():
+      for handler in self.handlers:
+        handler.flush()
+
+
+class _Forward(logging.Handler):
+  # in a forked worker: passes records on to the master's listener
+
+  def __init__(self, records):
+    logging.Handler.__init__(self)
+    self.records = records
+
+  def emit(self, record):
+    self.records.put(record)
+
+
+class _Unflushed(object):
+  # emit() of the rotating handlers without the flush after each record:
+  # the listener flushes once it has written all that was queued.
+
+  def emit(self, record):
+    try:
+      if self.shouldRollover(record):
+        self.doRollover()
+      if self.stream is None:
+        self.stream = self._open()
+      self.stream.write(self.format(record) + self.terminator)
+    except Exception:
+      self.handleError(record)
+
+
+class RotatingFileHandler(_Unflushed, logging.handlers.RotatingFileHandler):
+
+  def shouldRollover(self, record):
+    # the size the file has reached, rather than formatting each record a
+    # second time to see what it would reach; a file ends up at most one
+    # record over LOG_MAX_BYTES.
+    if self.stream is None:
+      self.stream = self._open()
+    return self.maxBytes > 0 and self.stream.tell() >= self.maxBytes
+
+
+class TimedRotatingFileHandler(_Unflushed, logging.handlers.TimedRotatingFileHandler):
+  pass
+
+
+class Logs(object):
+  '''Queued, rotated JSON logging for app.logger.'''
+
+  def __init__(self, app=None):
+    self.handler = None
+    self.handlers = []
+    self.listeners = []
+    self.shared = None
+    self.dropped = 0
+    self._moved_default = False
+    self._exit_registered = False
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    config = app.config
+    config.setdefault('LOG_FILE', 'error.log')
+    config.setdefault('LOG_LEVEL', 'INFO')
+    config.setdefault('LOG_MAX_BYTES', 10 * 1024 * 1024)
+    config.setdefault('LOG_ROTATE_WHEN', '')
+    config.setdefault('LOG_BACKUP_COUNT', 5)
+    config.setdefault('LOG_QUEUE_SIZE', 10000)
+    self.app = app
+    app.after_request(self._tag_response)
+    app.extensions['logs'] = self
+    if app.debug:
+      return
+
+    # apps share their logger by name: one made earlier in this process
+    # (tests, benchmarks) hands it over.
+    self.stop()
+    logger = app.logger
+    if self.handler is not None:
+      logger.removeHandler(self.handler)
+    if default_handler in logger.handlers:
+      logger.removeHandler(default_handler)
+      self._moved_default = True
+
+    level = logging.getLevelName(str(config['LOG_LEVEL']).upper())
+    self.handlers = [self._file_handler(config)] if config['LOG_FILE'] else []
+    for handler in self.handlers:
+      handler.setLevel(level)
+      handler.setFormatter(JSONFormatter())
+    if self._moved_default:
+      self.handlers.append(default_handler)
+
+    self.handler = RequestQueueHandler(RecordQueue(config['LOG_QUEUE_SIZE']), self)
+    logger.addHandler(self.handler)
+    logger.setLevel(level)
+    self.listeners = [self._listen(self.handler.queue, self.handlers)]
+    if not self._exit_registered:
+      atexit.register(self.stop)
+      self._exit_registered = True
+
+  def _file_handler(self, config):
+    if config['LOG_ROTATE_WHEN']:
+      return TimedRotatingFileHandler(
+        config['LOG_FILE'], when=config['LOG_ROTATE_WHEN'], backupCount=config['LOG_BACKUP_COUNT'],
+        encoding='utf-8', delay=True)
+    return RotatingFileHandler(
+      config['LOG_FILE'], maxBytes=config['LOG_MAX_BYTES'], backupCount=config['LOG_BACKUP_COUNT'],
+      encoding='utf-8', delay=True)
+
+  def _listen(self, records, handlers):
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+  def _tag_response(self, response):
+    response.headers[REQUEST_ID_HEADER] = request_id()
+    return response
+
+  def share(self):
+    '''Have processes forked from now on send their records to this
+    process's listener. server.py calls it before starting workers.'''
+    if self.handler is None or self.shared is not None:
+      return
+    import multiprocessing
+    self.shared = multiprocessing.SimpleQueue()
+    self.listeners.append(self._listen(self.shared, self.handlers))
+    os.register_at_fork(after_in_child=self._forked)
+
+  def _forked(self):
+    # the listener threads stayed behind in the parent. Their handlers
+    # are its too: what their buffers held at the fork is the parent's to
+    # write, not this process's.
+    self.handlers = []
+    self.handler.queue = RecordQueue(self.app.config['LOG_QUEUE_SIZE'])
+    self.listeners = [self._listen(self.handler.queue, [_Forward(self.shared)])]
+
+  def stop(self):
+    '''Write out what is queued. A forked worker calls it before it exits.'''
+    for listener in self.listeners:
+      listener.stop()
+    self.listeners = []
+    for handler in self.handlers:
+      handler.flush()
@@ -0,0 +1,360 @@
+#----------------------------------------------------------------------------#
+# Request and SQL instrumentation.
+#
+# Every request records its latency, the number of SQL statements it ran,
+# the time spent in them and the time spent rendering templates, labelled
+# by endpoint. Statements slower than METRICS_SLOW_QUERY_SECONDS are logged
+# with their bound parameters. /metrics serves it all in the Prometheus
+# text format.
+#
+# Under server.py, each worker writes its numbers to a directory the
+# master made, at most every FLUSH_SECONDS between requests, and the
+# master folds in those of workers that exit. Whichever worker answers a
+# scrape reports the sum over all of them, so counters only ever go up.
+# Gauges are the answering worker's own.
+#----------------------------------------------------------------------------#
+
+import contextlib
+import fcntl
+import os
+import pickle
+import shutil
+import threading
+import time
+from flask import Response, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# seconds between a worker's writes of its numbers
+FLUSH_SECONDS = 1.0
+
+
+def _merge(states):
+  # {collector name: {label values: count, or [bucket counts..., sum, count]}}
+  merged = {}
+  for state in states:
+    for name, values in state.items():
+      into = merged.setdefault(name, {})
+      for key, value in values.items():
+        if key not in into:
+          into[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+          into[key] = [a + b for a, b in zip(into[key], value)]
+        else:
+          into[key] += value
+  return merged
+
+
+def _labels(names, values, **extra):
+  pairs = list(zip(names, values)) + sorted(extra.items())
+  if not pairs:
+    return ''
+  return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                           for name, value in pairs)
+
+
+class Counter(object):
+
+  def __init__(self, name, help, labels=()):
+    self.name = name
+    self.help = help
+    self.labels = tuple(labels)
+    self._values = {}
+    self._lock = threading.Lock()
+
+  def inc(self, amount=1, **labels):
+    key = tuple(labels[name] for name in self.labels)
+    with self._lock:
+      self._values[key] = self._values.get(key, 0) + amount
+
+  def state(self):
+    with self._lock:
+      return dict(self._values)
+
+  def reset(self):
+    with self._lock:
+      self._values = {}
+
+  def expose(self, state=None):
+    yield '# HELP %s %s' % (self.name, self.help)
+    yield '# TYPE %s counter' % self.name
+    for key, value in sorted((self.state() if state is None else state).items()):
+      yield '%s%s %s' % (self.name, _labels(self.labels, key), value)
+
+
+class Gauge(object):
+  # read from `value` at scrape time.
+
+  def __init__(self, name, help, value):
+    self.name = name
+    self.help = help
+    self.value = value
+
+  def expose(self):
+    yield '# HELP %s %s' % (self.name, self.help)
+    yield '# TYPE %s gauge' % self.name
+    yield '%s %s' % (self.name, self.value())
+
+
+class Histogram(object):
+
+  def __init__(self, name, help, buckets, labels=()):
+    self.name = name
+    self.help = help
+    self.buckets = tuple(buckets)
+    self.labels = tuple(labels)
+    # label values -> [count per bucket..., sum, count]
+    self._series = {}
+    self._lock = threading.Lock()
+
+  def observe(self, value, **labels):
+    key = tuple(labels[name] for name in self.labels)
+    with self._lock:
+      series = self._series.get(key)
+      if series is None:
+        series = self._series[key] = [0] * (len(self.buckets) + 2)
+      for i, bound in enumerate(self.buckets):
+        if value <= bound:
+          series[i] += 1
+          break
+      series[-2] += value
+      series[-1] += 1
+
+  def state(self):
+    with self._lock:
+      return {key: list(values) for key, values in self._series.items()}
+
+  def reset(self):
+    with self._lock:
+      self._series = {}
+
+  def expose(self, state=None):
+    yield '# HELP %s %s' % (self.name, self.help)
+    yield '# TYPE %s histogram' % self.name
+    for key, values in sorted((self.state() if state is None else state).items()):
+      cumulative = 0
+      for bound, count in zip(self.buckets, values):
+        cumulative += count
+        yield '%s_bucket%s %d' % (self.name, _labels(self.labels, key, le=bound), cumulative)
+      yield '%s_bucket%s %d' % (self.name, _labels(self.labels, key, le='+Inf'), values[-1])
+      yield '%s_sum%s %r' % (self.name, _labels(self.labels, key), values[-2])
+      yield '%s_count%s %d' % (self.name, _labels(self.labels, key), values[-1])
+
+
+class TimedTemplate(Template):
+  # charges rendering time, less any SQL run from inside the template
+  # (streamed pages fetch their rows while rendering), to the request.
+
+  def render(self, *args, **kwargs):
+    with _rendering():
+      return super(TimedTemplate, self).render(*args, **kwargs)
+
+  def generate(self, *args, **kwargs):
+    chunks = super(TimedTemplate, self).generate(*args, **kwargs)
+    while True:
+      with _rendering():
+        chunk = next(chunks, None)
+      if chunk is None:
+        return
+      yield chunk
+
+
+class _rendering(object):
+
+  def __enter__(self):
+    self.state = g.get('metrics') if has_request_context() else None
+    if self.state is not None:
+      self.started = time.perf_counter()
+      self.db_time = self.state['db_time']
+
+  def __exit__(self, *exc_info):
+    if self.state is not None:
+      elapsed = time.perf_counter() - self.started
+      self.state['render_time'] += elapsed - (self.state['db_time'] - self.db_time)
+
+
+class Metrics(object):
+
+  def __init__(self, app=None):
+    self.latency = Histogram('fyyur_request_duration_seconds', 'Request latency, including streamed bodies.',
+                             LATENCY_BUCKETS, ('endpoint', 'method', 'status'))
+    self.queries = Histogram('fyyur_request_queries', 'SQL statements run per request.',
+                             QUERY_BUCKETS, ('endpoint',))
+    self.db_time = Histogram('fyyur_request_db_seconds', 'Time per request spent in SQL statements.',
+                             LATENCY_BUCKETS, ('endpoint',))
+    self.render_time = Histogram('fyyur_request_render_seconds', 'Time per request spent rendering templates.',
+                                 LATENCY_BUCKETS, ('endpoint',))
+    self.slow_queries = Counter('fyyur_slow_queries_total', 'SQL statements slower than the slow query threshold.',
+                                ('endpoint',))
+    self.collectors = [self.latency, self.queries, self.db_time, self.render_time, self.slow_queries]
+    self.directory = None
+    self.changed = False
+    self.flushed = 0.0
+    if app is not None:
+      self.init_app(app)
+
+  def init_app(self, app):
+    app.config.setdefault('METRICS_ENABLED', True)
+    app.config.setdefault('METRICS_SLOW_QUERY_SECONDS', 0.25)
+    self.app = app
+    app.extensions['metrics'] = self
+    if not app.config['METRICS_ENABLED']:
+      return
+
+    app.jinja_env.template_class = TimedTemplate
+    app.before_request(self._start)
+    app.after_request(self._finish)
+    # every engine, including ones created after this point; once per
+    # process however many apps are created.
+    if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+      event.listen(Engine, 'before_cursor_execute', self._before_execute)
+      event.listen(Engine, 'after_cursor_execute', self._after_execute)
+    app.add_url_rule('/metrics', 'metrics', self.expose)
+
+  def register(self, collector):
+    # add, or replace the collector of the same name
+    self.collectors = [c for c in self.collectors if c.name != collector.name] + [collector]
+
+  def _start(self):
+    g.metrics = {'started': time.perf_counter(), 'queries': 0, 'db_time': 0.0, 'render_time': 0.0}
+
+  def _finish(self, response):
+    state = g.get('metrics')
+    if state is None:
+      return response
+    labels = (request.endpoint or 'unmatched', request.method, response.status_code)
+
+    # observed once the body has been sent, so streamed pages count in full.
+    def observe():
+      endpoint, method, status = labels
+      self.latency.observe(time.perf_counter() - state['started'], endpoint=endpoint, method=method, status=status)
+      self.queries.observe(state['queries'], endpoint=endpoint)
+      self.db_time.observe(state['db_time'], endpoint=endpoint)
+      self.render_time.observe(state['render_time'], endpoint=endpoint)
+      self.changed = True
+    response.call_on_close(observe)
+    return response
+
+  def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+    # kept on the statement's own execution context: one that raises never
+    # reaches after_cursor_execute, and its start goes away with it rather
+    # than being paired with a later statement's end.
+    if context is not None:
+      context.metrics_started = time.perf_counter()
+
+  def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+    # statements run without a context (column defaults executed on their
+    # own) are counted, but not timed.
+    started = getattr(context, 'metrics_started', None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    state = g.get('metrics') if has_request_context() else None
+    if state is not None:
+      state['queries'] += 1
+      state['db_time'] += elapsed
+    if elapsed >= self.app.config['METRICS_SLOW_QUERY_SECONDS']:
+      endpoint = request.endpoint if has_request_context() else None
+      self.slow_queries.inc(endpoint=endpoint or 'none')
+      self.changed = True
+      if executemany:
+        parameters = '%d parameter sets' % len(parameters)
+      self.app.logger.warning('slow query (%.3fs, %s): %s; parameters: %r',
+                              elapsed, endpoint or 'no request', statement, parameters)
+
+  def expose(self):
+    state = self._state()
+    if self.directory is not None:
+      state = _merge([state] + self._shared())
+    lines = [line for collector in self.collectors
+             for line in (collector.expose(state.get(collector.name, {})) if hasattr(collector, 'state')
+                          else collector.expose())]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+  def _state(self):
+    return {collector.name: collector.state() for collector in self.collectors if hasattr(collector, 'state')}
+
+  #--------------------------------------------------------------------------#
+  # Sharing between processes.
+  #--------------------------------------------------------------------------#
+
+  def share(self, directory):
+    '''Have processes forked from now on report through `directory`, so
+    that any of them answers /metrics for all. server.py calls it before
+    starting workers.'''
+    if self.directory is not None:
+      return
+    self.directory = directory
+    os.register_at_fork(after_in_child=self._forked)
+
+  def _forked(self):
+    # what the master observed (warming caches) is no worker's.
+    for collector in self.collectors:
+      if hasattr(collector, 'reset'):
+        collector.reset()
+    self.changed = False
+    self.flushed = 0.0
+
+  def _path(self, name):
+    return os.path.join(self.directory, '%s.pickle' % name)
+
+  @contextlib.contextmanager
+  def _locked(self, operation):
+    # a scrape never sees an exited worker's numbers both in its own file
+    # and in the retired ones, or in neither.
+    with open(os.path.join(self.directory, 'lock'), 'a') as lock:
+      fcntl.flock(lock, operation)
+      try:
+        yield
+      finally:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+
+  @staticmethod
+  def _read(path):
+    try:
+      with open(path, 'rb') as f:
+        return pickle.load(f)
+    except FileNotFoundError:
+      return {}
+
+  @staticmethod
+  def _write(path, state):
+    # written aside and renamed over, so a reader gets all of it or the last
+    with open(path + '.tmp', 'wb') as f:
+      pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(path + '.tmp', path)
+
+  def _shared(self):
+    own = os.path.basename(self._path(os.getpid()))
+    with self._locked(fcntl.LOCK_SH):
+      return [self._read(os.path.join(self.directory, name)) for name in os.listdir(self.directory)
+              if name.endswith('.pickle') and name != own]
+
+  def flush(self, force=False):
+    '''Write this process's numbers for the others to report; at most every
+    FLUSH_SECONDS unless `force`d. Workers call it between requests.'''
+    if self.directory is None or not self.changed:
+      return
+    if not force and time.monotonic() - self.flushed < FLUSH_SECONDS:
+      return
+    self.changed = False
+    self.flushed = time.monotonic()
+    self._write(self._path(os.getpid()), self._state())
+
+  def retire(self, pid):
+    '''Fold the numbers of the exited worker `pid` into the retired ones.'''
+    if self.directory is None:
+      return
+    path = self._path(pid)
+    with self._locked(fcntl.LOCK_EX):
+      if os.path.exists(path):
+        retired = self._path('retired')
+        self._write(retired, _merge([self._read(retired), self._read(path)]))
+        os.remove(path)
+
+  def close(self):
+    '''Remove the shared directory, once no worker is left.'''
+    if self.directory is not None:
+      shutil.rmtree(self.directory, ignore_errors=True)
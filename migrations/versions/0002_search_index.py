@@ -0,0 +1,83 @@
+"""search index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 18:31:05.412908
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# The DDL is frozen here rather than imported from search.py, so later
+# changes to the live index definition do not rewrite this revision.
+COLUMNS = ('name', 'city', 'state', 'genres')
+
+
+def document(table):
+    return "to_tsvector('simple', " + " || ' ' || ".join(
+        "coalesce(%s.%s, '')" % (table, col) for col in COLUMNS) + ")"
+
+
+def postgres_ddl(table):
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_%s_search ON %s USING gin ((%s))" % (table, table, document(table)),
+        "CREATE INDEX IF NOT EXISTS ix_%s_name_trgm ON %s USING gin (name gin_trgm_ops)" % (table, table),
+    ]
+
+
+def sqlite_ddl(table):
+    cols = ', '.join(COLUMNS)
+    new = ', '.join('new.' + col for col in COLUMNS)
+    old = ', '.join('old.' + col for col in COLUMNS)
+    insert = (
+        "INSERT INTO {t}_search(rowid, {cols}) VALUES (new.id, {new}); "
+        "INSERT INTO {t}_name_trgm(rowid, name) VALUES (new.id, new.name);")
+    delete = (
+        "INSERT INTO {t}_search({t}_search, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        "INSERT INTO {t}_name_trgm({t}_name_trgm, rowid, name) VALUES ('delete', old.id, old.name);")
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {t}_search USING fts5({cols}, content='{t}', content_rowid='id', prefix='2 3')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS {t}_name_trgm USING fts5(name, content='{t}', content_rowid='id', tokenize='trigram')",
+        "CREATE TRIGGER IF NOT EXISTS {t}_search_ai AFTER INSERT ON {t} BEGIN " + insert + " END",
+        "CREATE TRIGGER IF NOT EXISTS {t}_search_ad AFTER DELETE ON {t} BEGIN " + delete + " END",
+        "CREATE TRIGGER IF NOT EXISTS {t}_search_au AFTER UPDATE ON {t} BEGIN " + delete + " " + insert + " END",
+        "INSERT INTO {t}_search({t}_search) VALUES ('rebuild')",
+        "INSERT INTO {t}_name_trgm({t}_name_trgm) VALUES ('rebuild')",
+    ]
+    return [s.format(t=table, cols=cols, new=new, old=old) for s in statements]
+
+
+def drop_ddl(table, dialect):
+    if dialect == 'postgresql':
+        return ["DROP INDEX IF EXISTS ix_%s_search" % table,
+                "DROP INDEX IF EXISTS ix_%s_name_trgm" % table]
+    return ["DROP TRIGGER IF EXISTS %s_search_%s" % (table, op) for op in ('ai', 'ad', 'au')] + [
+        "DROP TABLE IF EXISTS %s_search" % table,
+        "DROP TABLE IF EXISTS %s_name_trgm" % table]
+
+
+def upgrade():
+    bind = op.get_bind()
+    ddl = {'postgresql': postgres_ddl, 'sqlite': sqlite_ddl}.get(bind.dialect.name)
+    if ddl is None:
+        return
+    for table in ('venue', 'artist'):
+        for statement in ddl(table):
+            op.execute(statement)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name not in ('postgresql', 'sqlite'):
+        return
+    for table in ('venue', 'artist'):
+        for statement in drop_ddl(table, bind.dialect.name):
+            op.execute(statement)
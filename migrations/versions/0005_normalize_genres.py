@@ -0,0 +1,104 @@
+"""normalize genres
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 19:02:41.730215
+
+"""
+from alembic import context, op
+import sqlalchemy as sa
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+ENTITIES = ('venue', 'artist')
+
+
+def parse_genres(value):
+    # rows hold either a Postgres array literal ('{Jazz,"R&B"}') or the
+    # comma-joined string written by the edit handlers ('Jazz,R&B').
+    names = (name.strip().strip('"').strip() for name in (value or '').strip('{}').split(','))
+    return [name for name in dict.fromkeys(names) if name]
+
+
+def old_search_revision():
+    return context.script.get_revision('0002').module
+
+
+def upgrade():
+    op.create_table('genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    for table in ENTITIES:
+        op.create_table('%s_genre' % table,
+        sa.Column('%s_id' % table, sa.Integer(), nullable=False),
+        sa.Column('genre_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['genre_id'], ['genre.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['%s_id' % table], ['%s.id' % table], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('%s_id' % table, 'genre_id')
+        )
+        op.create_index('ix_%s_genre_genre_id_%s_id' % (table, table), '%s_genre' % table,
+                        ['genre_id', '%s_id' % table], unique=False)
+
+    # move the existing genre strings into the lookup and association tables.
+    bind = op.get_bind()
+    parsed = {table: [(entity_id, parse_genres(genres)) for entity_id, genres in
+                      bind.execute(sa.text('SELECT id, genres FROM %s' % table))]
+              for table in ENTITIES}
+    names = sorted({name for rows in parsed.values() for _, genres in rows for name in genres})
+    if names:
+        op.bulk_insert(sa.table('genre', sa.column('name', sa.String)), [{'name': name} for name in names])
+    genre_ids = dict((name, genre_id) for genre_id, name in bind.execute(sa.text('SELECT id, name FROM genre')))
+    for table in ENTITIES:
+        links = [{'%s_id' % table: entity_id, 'genre_id': genre_ids[name]}
+                 for entity_id, genres in parsed[table] for name in genres]
+        if links:
+            association = sa.table('%s_genre' % table, sa.column('%s_id' % table, sa.Integer),
+                                   sa.column('genre_id', sa.Integer))
+            op.bulk_insert(association, links)
+
+    # the previous search index reads venue.genres / artist.genres, so it
+    # is replaced by the current one, which reads the association tables.
+    old = old_search_revision()
+    for table in ENTITIES:
+        for statement in old.drop_ddl(table, bind.dialect.name):
+            op.execute(statement)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('genres')
+        search.install(bind, table)
+
+
+def downgrade():
+    bind = op.get_bind()
+    old = old_search_revision()
+    for table in ENTITIES:
+        search.uninstall(bind, table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.String(), nullable=False, server_default=''))
+        rows = bind.execute(sa.text(
+            'SELECT {t}_genre.{t}_id, genre.name FROM {t}_genre '
+            'JOIN genre ON genre.id = {t}_genre.genre_id ORDER BY genre.name'.format(t=table))).fetchall()
+        genres = {}
+        for entity_id, name in rows:
+            genres.setdefault(entity_id, []).append(name)
+        for entity_id, names in genres.items():
+            bind.execute(sa.text('UPDATE %s SET genres = :genres WHERE id = :id' % table),
+                         genres='{' + ','.join(names) + '}', id=entity_id)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('genres', server_default=None)
+        ddl = {'postgresql': old.postgres_ddl, 'sqlite': old.sqlite_ddl}.get(bind.dialect.name)
+        if ddl is not None:
+            for statement in ddl(table):
+                op.execute(statement)
+
+        op.drop_index('ix_%s_genre_genre_id_%s_id' % (table, table), table_name='%s_genre' % table)
+        op.drop_table('%s_genre' % table)
+    op.drop_table('genre')
@@ -0,0 +1,76 @@
+"""show counters
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 21:14:05.118342
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+ENTITIES = ('venue', 'artist')
+COUNTERS = ('upcoming_shows_count', 'past_shows_count')
+
+
+def counter(name):
+    return sa.Column(name, sa.Integer(), server_default='0', nullable=False)
+
+
+def upgrade():
+    for table in ENTITIES:
+        for name in COUNTERS:
+            op.add_column(table, counter(name))
+    op.create_table('area',
+    sa.Column('city', sa.String(), nullable=False),
+    sa.Column('state', sa.String(), nullable=False),
+    counter('venue_count'),
+    counter('upcoming_shows_count'),
+    counter('past_shows_count'),
+    sa.PrimaryKeyConstraint('city', 'state')
+    )
+    op.create_table('counter_sweep',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('swept_until', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # count the existing shows as of now, which becomes the first watermark.
+    bind = op.get_bind()
+    now = datetime.now()
+    bind.execute(sa.text('INSERT INTO counter_sweep (id, swept_until) VALUES (1, :now)'), now=now)
+    for table in ENTITIES:
+        bind.execute(sa.text(
+            'UPDATE {t} SET '
+            'upcoming_shows_count = (SELECT count(*) FROM show WHERE show.{t}_id = {t}.id AND show.start_time > :now), '
+            'past_shows_count = (SELECT count(*) FROM show WHERE show.{t}_id = {t}.id AND show.start_time <= :now)'
+            .format(t=table)), now=now)
+    bind.execute(sa.text(
+        'INSERT INTO area (city, state, venue_count, upcoming_shows_count, past_shows_count) '
+        'SELECT city, state, count(*), sum(upcoming_shows_count), sum(past_shows_count) '
+        'FROM venue GROUP BY city, state'))
+
+
+def downgrade():
+    op.drop_table('counter_sweep')
+    op.drop_table('area')
+    # SQLite drops columns by rebuilding the table, which loses the search
+    # triggers, so the index is taken down and put back around it.
+    bind = op.get_bind()
+    rebuilt = bind.dialect.name == 'sqlite'
+    for table in ENTITIES:
+        if rebuilt:
+            search.uninstall(bind, table)
+        with op.batch_alter_table(table) as batch_op:
+            for name in COUNTERS:
+                batch_op.drop_column(name)
+        if rebuilt:
+            search.install(bind, table)
@@ -0,0 +1,65 @@
+"""venue bookings
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 22:41:37.502918
+
+"""
+from datetime import timedelta
+from alembic import op
+import sqlalchemy as sa
+import bookings
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# SHOW_DURATION_MINUTES when this revision was written
+DURATION = timedelta(minutes=180)
+BATCH = 5000
+
+show = sa.table('show',
+    sa.column('id', sa.Integer),
+    sa.column('venue_id', sa.Integer),
+    sa.column('start_time', sa.DateTime),
+    sa.column('end_time', sa.DateTime),
+)
+
+
+def backfill(bind):
+    # existing shows run DURATION, cut short by the venue's next show so
+    # that no two overlap; of two at the same venue and time the first
+    # (by id) ends as it starts, an empty booking that overlaps nothing.
+    rows = bind.execute(sa.select([show.c.id, show.c.venue_id, show.c.start_time])
+                        .order_by(show.c.venue_id, show.c.start_time, show.c.id)).fetchall()
+    update = show.update().where(show.c.id == sa.bindparam('show_id')).values(end_time=sa.bindparam('end'))
+    ends = []
+    for row, following in zip(rows, rows[1:] + [None]):
+        end = row.start_time + DURATION
+        if following is not None and following.venue_id == row.venue_id:
+            end = min(end, following.start_time)
+        ends.append({'show_id': row.id, 'end': end})
+        if len(ends) == BATCH:
+            bind.execute(update, ends)
+            ends = []
+    if ends:
+        bind.execute(update, ends)
+
+
+def upgrade():
+    op.add_column('show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    bind = op.get_bind()
+    backfill(bind)
+    with op.batch_alter_table('show') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(), nullable=False)
+    bookings.install(bind, 'show')
+
+
+def downgrade():
+    bind = op.get_bind()
+    bookings.uninstall(bind, 'show')
+    with op.batch_alter_table('show') as batch_op:
+        batch_op.drop_column('end_time')
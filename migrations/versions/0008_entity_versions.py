@@ -0,0 +1,55 @@
+"""entity versions
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 23:52:16.204731
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+import search
+from versions import utcnow
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+ENTITIES = ('venue', 'artist')
+
+
+def rebuild(bind, table, alter):
+    # SQLite alters columns by rebuilding the table, which loses the search
+    # triggers, so the index is taken down and put back around it.
+    rebuilt = bind.dialect.name == 'sqlite'
+    if rebuilt:
+        search.uninstall(bind, table)
+    with op.batch_alter_table(table) as batch_op:
+        alter(batch_op)
+    if rebuilt:
+        search.install(bind, table)
+
+
+def upgrade():
+    bind = op.get_bind()
+    # existing rows start at version 1, last modified now. Rows inserted
+    # without the ORM's defaults (bulk imports) get the database's now.
+    now = datetime.utcnow()
+    for table in ENTITIES:
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        bind.execute(sa.text('UPDATE {t} SET updated_at = :now'.format(t=table)), now=now)
+        rebuild(bind, table, lambda batch_op: batch_op.alter_column(
+            'updated_at', existing_type=sa.DateTime(), nullable=False, server_default=utcnow()))
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table in ENTITIES:
+        def alter(batch_op):
+            batch_op.drop_column('updated_at')
+            batch_op.drop_column('version')
+        rebuild(bind, table, alter)
@@ -0,0 +1,198 @@
+#----------------------------------------------------------------------------#
+# Models.
+#
+# Venues, artists, their shows and genres, and the rollups kept from them.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from flask import current_app
+import search
+import bookings
+from counters import ShowCounters
+from extensions import db
+from versions import EntityVersions, utcnow
+
+class Genre(db.Model):
+  __tablename__ = 'genre'
+
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String, nullable=False, unique=True)
+
+  def __repr__(self):
+    return f'<Genre: {self.id}, name: {self.name}>'
+
+  @classmethod
+  def named(cls, names):
+    # resolve genre names to rows in one query, creating any new ones.
+    names = list(dict.fromkeys(name.strip() for name in names if name.strip()))
+    genres = {genre.name: genre for genre in cls.query.filter(cls.name.in_(names))} if names else {}
+    return [genres.get(name) or cls(name=name) for name in names]
+
+# the (genre_id, <entity>_id) indexes serve genre browsing; the primary
+# keys serve loading an entity's genres.
+venue_genre = db.Table('venue_genre',
+  db.Column('venue_id', db.Integer, db.ForeignKey('venue.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True),
+  db.Index('ix_venue_genre_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+artist_genre = db.Table('artist_genre',
+  db.Column('artist_id', db.Integer, db.ForeignKey('artist.id', ondelete='CASCADE'), primary_key=True),
+  db.Column('genre_id', db.Integer, db.ForeignKey('genre.id', ondelete='CASCADE'), primary_key=True),
+  db.Index('ix_artist_genre_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
+def show_counter():
+  # kept current by counters.ShowCounters, never set directly; `derived`
+  # keeps it out of bulk imports and exports.
+  return db.Column(db.Integer, nullable=False, default=0, server_default='0', info={'derived': True})
+
+def entity_version():
+  # bumped by versions.EntityVersions and the counters; see versions.py
+  return db.Column(db.Integer, nullable=False, default=1, server_default='1', info={'derived': True})
+
+def entity_updated_at():
+  # the server default covers imports, which skip derived columns
+  return db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=utcnow(),
+                   info={'derived': True})
+
+class Venue(db.Model):
+
+
+  __tablename__ = 'venue'
+
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String, nullable=False)
+  city = db.Column(db.String, nullable=False)
+  state = db.Column(db.String,nullable=False)
+  address = db.Column(db.String,nullable=False)
+  phone = db.Column(db.String, nullable=False)
+  genres = db.relationship('Genre', secondary=venue_genre, order_by='Genre.name', lazy='select')
+  image_link = db.Column(db.String)
+  facebook_link = db.Column(db.String)
+  website = db.Column(db.String, nullable=False)
+  seeking_talent=db.Column(db.String) 
+  seeking_description=db.Column(db.String,nullable = True)
+  shows = db.relationship('Show', backref='venue', lazy='select')
+  upcoming_shows_count = show_counter()
+  past_shows_count = show_counter()
+  version = entity_version()
+  updated_at = entity_updated_at()
+
+  __table_args__ = (
+    # keyset pagination order of the /venues area directory
+    db.Index('ix_venue_state_city_name_id', 'state', 'city', 'name', 'id'),
+  )
+  
+  def __repr__(self):
+    return f'<Venue: {self.id}, name: {self.name}, city: {self.city}, state: {self.state}, address: {self.address}, phone: {self.phone}, image_link: {self.image_link}, facebook_link: {self.facebook_link}, website: {self.website}>'
+  
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+
+class Artist(db.Model):
+  __tablename__ = 'artist'
+
+  id = db.Column(db.Integer, primary_key=True)
+  name = db.Column(db.String, nullable=False)
+  city = db.Column(db.String, nullable=False)
+  state = db.Column(db.String, nullable=False)
+  phone = db.Column(db.String, nullable=False)
+  genres = db.relationship('Genre', secondary=artist_genre, order_by='Genre.name', lazy='select')
+  image_link = db.Column(db.String)
+  facebook_link = db.Column(db.String)
+  website = db.Column(db.String)
+  seeking_talent=db.Column(db.String) 
+  seeking_description=db.Column(db.String,nullable = True)
+  shows = db.relationship('Show', backref='artist', lazy='select')
+  upcoming_shows_count = show_counter()
+  past_shows_count = show_counter()
+  version = entity_version()
+  updated_at = entity_updated_at()
+
+  __table_args__ = (
+    db.Index('ix_artist_name_id', 'name', 'id'),
+  )
+
+  def __repr__(self):
+    return f'<Artist: {self.id}, name: {self.name}, city: {self.city}, state: {self.state}, phone: {self.phone}, image_link: {self.image_link}, facebook_link: {self.facebook_link}>'
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+
+
+
+class Show(db.Model):
+  __tablename__ = 'show'
+
+  id = db.Column(db.Integer, primary_key=True)
+  start_time = db.Column(db.DateTime, nullable=False)
+  # the venue is booked over [start_time, end_time); see bookings.py
+  end_time = db.Column(db.DateTime, nullable=False)
+  artist_id = db.Column(db.Integer, db.ForeignKey("artist.id"), nullable=False)
+  venue_id = db.Column(db.Integer, db.ForeignKey("venue.id"), nullable=False)
+
+  __table_args__ = (
+    # also serves plain start_time range scans, so no separate start_time index
+    db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    # past/upcoming splits on the venue and artist pages
+    db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+  )
+
+  def __repr__(self):
+    return f'<Show {self.id}, start_time: {self.start_time}, end_time: {self.end_time}, artist_id: {self.artist_id}, venue_id: {self.venue_id}>'
+
+  #ralation:
+  # artist = db.relation('Artist',backref = 'shows', lazy="joined")
+  # vanue = db.relation('Venue',backref='shows', lazy="joined")
+# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+
+class Area(db.Model):
+  # per (city, state) rollup of the venues there and their show counts.
+  __tablename__ = 'area'
+
+  city = db.Column(db.String, primary_key=True)
+  state = db.Column(db.String, primary_key=True)
+  venue_count = show_counter()
+  upcoming_shows_count = show_counter()
+  past_shows_count = show_counter()
+
+  def __repr__(self):
+    return f'<Area: {self.city}, {self.state}, venues: {self.venue_count}>'
+
+class CounterSweep(db.Model):
+  # a single row: shows starting after swept_until are counted as upcoming.
+  __tablename__ = 'counter_sweep'
+
+  id = db.Column(db.Integer, primary_key=True)
+  swept_until = db.Column(db.DateTime, nullable=False)
+
+counters = ShowCounters(Show, Venue, Artist, Area, CounterSweep)
+EntityVersions(Show, Venue, Artist)
+
+search.register(Venue, venue_genre)
+search.register(Artist, artist_genre)
+bookings.register(Show)
+
+#----------------------------------------------------------------------------#
+# Loading profiles.
+#----------------------------------------------------------------------------#
+
+# Relationships are never loaded implicitly; each route asks for a profile
+# naming what it needs. With RAISE_ON_LAZY_LOAD set (tests), touching any
+# relationship outside the profile raises instead of quietly querying.
+LOAD_PROFILES = {
+  # entity columns only
+  'entity': lambda model: [],
+  # the entity and its genre names: detail pages and edit forms
+  'detail': lambda model: [db.selectinload(model.genres)],
+  # the entity plus its shows and each show's artist and venue
+  'shows': lambda model: [
+    db.selectinload(model.shows).selectinload(Show.artist),
+    db.selectinload(model.shows).selectinload(Show.venue),
+  ],
+}
+
+def loaded(model, profile):
+  options = LOAD_PROFILES[profile](model)
+  if current_app.config['RAISE_ON_LAZY_LOAD']:
+    options.append(db.raiseload('*'))
+  return model.query.options(*options)
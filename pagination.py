@@ -0,0 +1,128 @@
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#
+# Pages are addressed by an opaque cursor holding the sort key of the row
+# at the page edge, never by OFFSET, so page 1000 costs the same index
+# range scan as page 1.
+#----------------------------------------------------------------------------#
+
+import base64
+import json
+from datetime import datetime
+from flask import abort, current_app, request, url_for
+from sqlalchemy import tuple_
+
+
+class Page(object):
+
+  def __init__(self, items, next_cursor=None, prev_cursor=None, per_page=None):
+    self.items = items
+    self.next_cursor = next_cursor
+    self.prev_cursor = prev_cursor
+    self.per_page = per_page
+
+  def __iter__(self):
+    return iter(self.items)
+
+  def __len__(self):
+    return len(self.items)
+
+
+class StreamedPage(Page):
+  # yields rows straight off the cursor while a template streams; the
+  # cursors are known once iteration is done, which is when the pager
+  # at the bottom of the page renders.
+
+  def __init__(self, rows, key, per_page, has_cursor):
+    super(StreamedPage, self).__init__(None, per_page=per_page)
+    self._rows = rows
+    self._key = key
+    self._has_cursor = has_cursor
+
+  def __iter__(self):
+    last = None
+    for i, row in enumerate(self._rows):
+      if i == self.per_page:
+        self.next_cursor = encode_cursor(self._key(last))
+        break
+      if i == 0 and self._has_cursor:
+        self.prev_cursor = encode_cursor(self._key(row))
+      last = row
+      yield row
+
+  def __len__(self):
+    raise TypeError('a streamed page has no length before it is consumed')
+
+
+def encode_cursor(values):
+  payload = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+  return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    if not isinstance(values, list) or len(values) != len(columns):
+      raise ValueError(cursor)
+    # only scalars compare with the sort key; JSON's true and false are ints
+    if any(isinstance(v, bool) or not isinstance(v, (str, int, float, type(None))) for v in values):
+      raise ValueError(cursor)
+    return [datetime.fromisoformat(v) if col.type.python_type is datetime else v
+            for v, col in zip(values, columns)]
+  except (TypeError, ValueError, NotImplementedError):
+    raise ValueError('invalid cursor: %r' % cursor)
+
+
+def page_size():
+  per_page = request.args.get('per_page', current_app.config['PAGE_SIZE'], type=int)
+  return max(1, min(per_page, current_app.config['MAX_PAGE_SIZE']))
+
+
+def paginate(query, columns, key, descending=False, streamed=False):
+  '''Return one Page of `query` ordered by `columns`.
+
+  `columns` must be a unique, indexed sort key (e.g. (name, id)) and `key`
+  maps a result row to the values of those columns. The cursor is read
+  from the `after` / `before` request args. With `streamed`, forward pages
+  are a StreamedPage that fetches rows only as they are iterated.
+  '''
+  per_page = page_size()
+  after, before = request.args.get('after'), request.args.get('before')
+  try:
+    cursor = decode_cursor(before or after, columns) if (before or after) else None
+  except ValueError:
+    abort(400)
+
+  # walking backwards flips both the comparison and the sort order.
+  backwards = bool(before)
+  reverse = descending != backwards
+  if cursor is not None:
+    edge = tuple_(*columns)
+    query = query.filter(edge < tuple_(*cursor) if reverse else edge > tuple_(*cursor))
+  query = query.order_by(*[c.desc() if reverse else c.asc() for c in columns])
+
+  query = query.limit(per_page + 1)
+  if streamed and not backwards:
+    return StreamedPage(query.yield_per(per_page + 1), key, per_page, cursor is not None)
+
+  rows = query.all()
+  has_more = len(rows) > per_page
+  rows = rows[:per_page]
+  if backwards:
+    rows.reverse()
+
+  next_cursor = prev_cursor = None
+  if rows:
+    if has_more or backwards:
+      next_cursor = encode_cursor(key(rows[-1]))
+    if cursor is not None and (has_more or not backwards):
+      prev_cursor = encode_cursor(key(rows[0]))
+  return Page(rows, next_cursor, prev_cursor, per_page)
+
+
+def page_url(**cursor):
+  # the current listing URL, keeping its filters but swapping the cursor.
+  args = {k: v for k, v in request.args.items() if k not in ('after', 'before')}
+  args.update(request.view_args or {})
+  args.update(cursor)
+  return url_for(request.endpoint, **args)
@@ -0,0 +1,214 @@
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# With DATABASE_REPLICA_URLS set, the statements of GET (and HEAD, OPTIONS)
+# requests, and of views marked read_only (searches, which POST their
+# form), go to a replica, picked round-robin. Writes go to the primary:
+# every flush and every other request. So do the reads of a client whose
+# request wrote (flushed or committed) less than REPLICA_STICKY_SECONDS
+# ago, which a cookie marks, so that it sees its own writes. Outside a
+# request (commands, startup), the primary is used for everything.
+#
+# Each worker checks a replica before reading from it again, at most every
+# REPLICA_CHECK_SECONDS. A replica that cannot be reached, or (Postgres)
+# that replays more than REPLICA_MAX_LAG_SECONDS behind, drops out of the
+# rotation for REPLICA_RETRY_SECONDS. With none left, reads use the
+# primary.
+#----------------------------------------------------------------------------#
+
+import threading
+import time
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, exc, orm, text
+from sqlalchemy.engine.url import make_url
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# set on responses to writes: its holder reads from the primary
+COOKIE = 'fyyur_primary'
+# keys of the request's WSGI environ: the replica it reads from (None for
+# the primary), and whether it wrote
+REPLICA = 'fyyur.replica'
+WROTE = 'fyyur.wrote'
+
+# seconds the replica's replay is behind; 0 when it has replayed all it
+# has received, or when the server is not a replica at all.
+POSTGRES_LAG = text(
+  "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+  "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END")
+
+
+def read_only(view):
+  '''Mark a view that only reads whatever its method, e.g. a search form
+  that POSTs, so that its reads may go to a replica.'''
+  view.replica_reads = True
+  return view
+
+
+class RoutingSession(SignallingSession):
+  '''Reads from the replica the current request was routed to, if any.'''
+
+  def get_bind(self, mapper=None, clause=None):
+    replicas = self.app.extensions.get('replicas')
+    # flushes write, so they always go to the primary
+    if replicas is not None and not self._flushing:
+      engine = replicas.engine()
+      if engine is not None:
+        return engine
+    return super().get_bind(mapper, clause)
+
+
+def _wrote(session, *args):
+  # flushes and commits within a request mark its client as a writer. Kept
+  # in the WSGI environ, which is the request's own: an app context pushed
+  # inside the request has a g of its own.
+  if has_request_context():
+    request.environ[WROTE] = True
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+  def create_session(self, options):
+    return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class Replica(object):
+
+  def __init__(self, name, url):
+    self.name = name
+    self.url = url
+    self.engine = None
+    self.checked = None
+    self.down_until = 0.0
+    self.lag = None
+    # a request is checking it; the others pass it over meanwhile
+    self.checking = False
+
+
+class Replicas(object):
+
+  def __init__(self, app=None, db=None):
+    self.replicas = []
+    if app is not None:
+      self.init_app(app, db)
+
+  def init_app(self, app, db):
+    config = app.config
+    config.setdefault('DATABASE_REPLICA_URLS', '')
+    config.setdefault('REPLICA_CHECK_SECONDS', 5)
+    config.setdefault('REPLICA_RETRY_SECONDS', 30)
+    config.setdefault('REPLICA_MAX_LAG_SECONDS', 10)
+    config.setdefault('REPLICA_STICKY_SECONDS', 15)
+    self.app = app
+    self.db = db
+    self.replicas = []
+    self._next = 0
+    self._lock = threading.Lock()
+
+    urls = [url.strip() for url in config['DATABASE_REPLICA_URLS'].split(',') if url.strip()]
+    self.replicas = [Replica('replica%d' % number, url) for number, url in enumerate(urls, 1)]
+
+    if self.replicas:
+      app.after_request(self._mark_writer)
+      # once per process however many apps are created
+      for name in ('after_flush', 'after_commit'):
+        if not event.contains(RoutingSession, name, _wrote):
+          event.listen(RoutingSession, name, _wrote)
+    app.extensions['replicas'] = self
+
+  def _engine(self, replica):
+    if replica.engine is None:
+      # built the way Flask-SQLAlchemy builds the primary's, with the same
+      # options. Not a bind: create_all() and migrations never see it.
+      url = make_url(replica.url)
+      options = {}
+      self.db.apply_pool_defaults(self.app, options)
+      self.db.apply_driver_hacks(self.app, url, options)
+      options.update(self.app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+      replica.engine = self.db.create_engine(url, options)
+      event.listen(replica.engine, 'handle_error', self._handle_error)
+    return replica.engine
+
+  def engine(self):
+    '''The engine the current request reads from; None for the primary.'''
+    if not self.replicas or not has_request_context():
+      return None
+    # picked on the request's first statement: a page served from the
+    # page cache reads nothing and checks nothing.
+    environ = request.environ
+    if REPLICA not in environ:
+      view = current_app.view_functions.get(request.endpoint)
+      reads = request.method in SAFE_METHODS or getattr(view, 'replica_reads', False)
+      environ[REPLICA] = self.pick() if reads and COOKIE not in request.cookies else None
+    replica = environ[REPLICA]
+    return self._engine(replica) if replica is not None else None
+
+  def pick(self):
+    '''The next replica in rotation that passes its check, or None.'''
+    for _ in range(len(self.replicas)):
+      # a replica is claimed under the lock but checked outside it: other
+      # requests need not wait on one that takes DB_CONNECT_TIMEOUT to fail.
+      with self._lock:
+        replica = self.replicas[self._next]
+        self._next = (self._next + 1) % len(self.replicas)
+        now = time.monotonic()
+        if replica.down_until > now or replica.checking:
+          continue
+        due = replica.checked is None or now - replica.checked >= self.app.config['REPLICA_CHECK_SECONDS']
+        replica.checking = due
+      if due:
+        try:
+          if not self.check(replica):
+            continue
+        finally:
+          replica.checking = False
+      return replica
+    return None
+
+  def check(self, replica):
+    '''Check that `replica` answers and keeps up; take it out of the
+    rotation if not.'''
+    try:
+      with self._engine(replica).connect() as connection:
+        if connection.dialect.name == 'postgresql':
+          lag = float(connection.execute(POSTGRES_LAG).scalar())
+        else:
+          connection.execute(text('SELECT 1'))
+          lag = 0.0
+    except exc.DBAPIError as e:
+      self.take_down(replica, 'unreachable: %s' % getattr(e, 'orig', e))
+      return False
+    replica.lag = lag
+    if lag > self.app.config['REPLICA_MAX_LAG_SECONDS']:
+      self.take_down(replica, '%.1fs behind' % lag)
+      return False
+    replica.checked = time.monotonic()
+    return True
+
+  def take_down(self, replica, reason):
+    retry = self.app.config['REPLICA_RETRY_SECONDS']
+    replica.down_until = time.monotonic() + retry
+    replica.checked = None
+    self.app.logger.warning('read replica %s out of rotation for %ds, %s', replica.name, retry, reason)
+
+  def _handle_error(self, context):
+    # a replica lost mid-request fails that request; later ones skip it.
+    if context.is_disconnect:
+      for replica in self.replicas:
+        if replica.engine is not None and replica.engine is context.engine:
+          self.take_down(replica, 'disconnected')
+
+  def _mark_writer(self, response):
+    if request.environ.get(WROTE):
+      response.set_cookie(COOKIE, '1', max_age=self.app.config['REPLICA_STICKY_SECONDS'],
+                          httponly=True, samesite='Lax')
+    return response
+
+  def up(self):
+    now = time.monotonic()
+    return sum(1 for replica in self.replicas if replica.down_until <= now)
+
+  def dispose(self):
+    for replica in self.replicas:
+      if replica.engine is not None:
+        replica.engine.dispose()
@@ -0,0 +1,198 @@
+#----------------------------------------------------------------------------#
+# Full-text search index for artists and venues.
+#
+# The search document of an artist or venue is its name, city, state and
+# genre names (from the <table>_genre association), kept current by
+# database triggers so every write path, bulk loads included, stays in sync.
+#
+# Postgres: a tsvector search_document column with a GIN index for ranked
+# word-prefix matching, plus a pg_trgm GIN index on name so infix matches
+# ("usic" -> "The Musical Hop") stay indexed.
+# SQLite: an FTS5 table over the same document and a trigram FTS5 table on
+# name.
+#----------------------------------------------------------------------------#
+
+import re
+from sqlalchemy import event, text, column, Integer, Float
+
+# terms shorter than this cannot use the trigram indexes, so they only
+# go through the word-prefix index.
+MIN_INFIX_LENGTH = 3
+
+
+def _genre_names(table, entity_id, aggregate):
+  return ("(SELECT coalesce({agg}(genre.name, ' '), '') FROM {t}_genre "
+          "JOIN genre ON genre.id = {t}_genre.genre_id WHERE {t}_genre.{t}_id = {id})"
+          ).format(t=table, id=entity_id, agg=aggregate)
+
+
+def _postgres_ddl(table):
+  document = ("to_tsvector('simple', coalesce(NEW.name, '') || ' ' || coalesce(NEW.city, '') || ' ' || "
+              "coalesce(NEW.state, '') || ' ' || %s)" % _genre_names(table, 'NEW.id', 'string_agg'))
+  statements = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE {t} ADD COLUMN IF NOT EXISTS search_document tsvector",
+    "CREATE OR REPLACE FUNCTION {t}_search_document() RETURNS trigger AS $$ "
+    "BEGIN NEW.search_document := " + document + "; RETURN NEW; END $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS {t}_search_document ON {t}",
+    "CREATE TRIGGER {t}_search_document BEFORE INSERT OR UPDATE OF name, city, state, search_document ON {t} "
+    "FOR EACH ROW EXECUTE PROCEDURE {t}_search_document()",
+    # a genre change resets the owner's document, which the trigger above recomputes.
+    "CREATE OR REPLACE FUNCTION {t}_genre_search_document() RETURNS trigger AS $$ "
+    "BEGIN "
+    "IF TG_OP = 'DELETE' THEN UPDATE {t} SET search_document = NULL WHERE id = OLD.{t}_id; "
+    "ELSE UPDATE {t} SET search_document = NULL WHERE id = NEW.{t}_id; END IF; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS {t}_genre_search_document ON {t}_genre",
+    "CREATE TRIGGER {t}_genre_search_document AFTER INSERT OR DELETE ON {t}_genre "
+    "FOR EACH ROW EXECUTE PROCEDURE {t}_genre_search_document()",
+    "UPDATE {t} SET search_document = NULL",
+    "CREATE INDEX IF NOT EXISTS ix_{t}_search ON {t} USING gin (search_document)",
+    "CREATE INDEX IF NOT EXISTS ix_{t}_name_trgm ON {t} USING gin (name gin_trgm_ops)",
+  ]
+  return [statement.format(t=table) for statement in statements]
+
+
+def _sqlite_ddl(table):
+  genres = _genre_names(table, '{id}', 'group_concat')
+  refresh_genres = "UPDATE {t}_search SET genres = %s WHERE rowid = {id};" % genres
+  trgm_insert = "INSERT INTO {t}_name_trgm(rowid, name) VALUES (new.id, new.name);"
+  trgm_delete = "INSERT INTO {t}_name_trgm({t}_name_trgm, rowid, name) VALUES ('delete', old.id, old.name);"
+  statements = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {t}_search USING fts5(name, city, state, genres, prefix='2 3')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {t}_name_trgm USING fts5(name, content='{t}', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS {t}_search_ai AFTER INSERT ON {t} BEGIN "
+    "INSERT INTO {t}_search(rowid, name, city, state, genres) VALUES (new.id, new.name, new.city, new.state, ''); "
+    + trgm_insert + " END",
+    "CREATE TRIGGER IF NOT EXISTS {t}_search_ad AFTER DELETE ON {t} BEGIN "
+    "DELETE FROM {t}_search WHERE rowid = old.id; " + trgm_delete + " END",
+    "CREATE TRIGGER IF NOT EXISTS {t}_search_au AFTER UPDATE OF name, city, state ON {t} BEGIN "
+    "UPDATE {t}_search SET name = new.name, city = new.city, state = new.state WHERE rowid = new.id; "
+    + trgm_delete + " " + trgm_insert + " END",
+    "CREATE TRIGGER IF NOT EXISTS {t}_genre_search_ai AFTER INSERT ON {t}_genre BEGIN "
+    + refresh_genres.replace('{id}', 'new.{t}_id') + " END",
+    "CREATE TRIGGER IF NOT EXISTS {t}_genre_search_ad AFTER DELETE ON {t}_genre BEGIN "
+    + refresh_genres.replace('{id}', 'old.{t}_id') + " END",
+    "DELETE FROM {t}_search",
+    "INSERT INTO {t}_search(rowid, name, city, state, genres) SELECT id, name, city, state, "
+    + genres.replace('{id}', '{t}.id') + " FROM {t}",
+    "INSERT INTO {t}_name_trgm({t}_name_trgm) VALUES ('rebuild')",
+  ]
+  return [statement.replace('{t}', table) for statement in statements]
+
+
+def install(connection, table):
+  # idempotent, so it is safe from both create_all() and migrations.
+  dialect = connection.dialect.name
+  if dialect == 'postgresql':
+    statements = _postgres_ddl(table)
+  elif dialect == 'sqlite':
+    statements = _sqlite_ddl(table)
+  else:
+    return
+  for statement in statements:
+    connection.execute(text(statement))
+
+
+def uninstall(connection, table):
+  dialect = connection.dialect.name
+  if dialect == 'postgresql':
+    statements = [
+      "DROP INDEX IF EXISTS ix_{t}_search",
+      "DROP INDEX IF EXISTS ix_{t}_name_trgm",
+      "DROP TRIGGER IF EXISTS {t}_genre_search_document ON {t}_genre",
+      "DROP TRIGGER IF EXISTS {t}_search_document ON {t}",
+      "DROP FUNCTION IF EXISTS {t}_genre_search_document()",
+      "DROP FUNCTION IF EXISTS {t}_search_document()",
+      "ALTER TABLE {t} DROP COLUMN IF EXISTS search_document",
+    ]
+  elif dialect == 'sqlite':
+    statements = ["DROP TRIGGER IF EXISTS {t}_search_%s" % op for op in ('ai', 'ad', 'au')] + [
+      "DROP TRIGGER IF EXISTS {t}_genre_search_%s" % op for op in ('ai', 'ad')] + [
+      "DROP TABLE IF EXISTS {t}_search",
+      "DROP TABLE IF EXISTS {t}_name_trgm",
+    ]
+  else:
+    return
+  for statement in statements:
+    connection.execute(text(statement.replace('{t}', table)))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+  # FTS5 virtual tables and their shadow tables, and the trigger-maintained
+  # search_document column, are not part of the models, so autogenerate
+  # must not try to drop them.
+  if reflected and compare_to is None:
+    if type_ == 'table':
+      return not re.search(r'_(search|name_trgm)(_\w+)?$', name)
+    if type_ == 'column':
+      return name != 'search_document'
+  return True
+
+
+def register(model, genre_table):
+  # build the index once create_all() has created the genre association,
+  # which the triggers read from.
+  table = model.__tablename__
+  event.listen(genre_table, 'after_create',
+               lambda target, connection, **kw: install(connection, table))
+
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def _tokens(term):
+  return re.findall(r'\w+', term.lower())
+
+
+def _escape_like(term):
+  return re.sub(r'([\\%_])', r'\\\1', term)
+
+
+def matches(model, term, dialect, limit):
+  '''Return a selectable of (id, rank) for the `limit` best rows matching
+  `term`.
+
+  Every token must prefix-match one of name, city, state or genres, so
+  "San Francisco, CA" and "jazz" both work. Terms of MIN_INFIX_LENGTH or
+  more also match anywhere inside the name.
+  '''
+  table = model.__tablename__
+  term = term.strip()
+  tokens = _tokens(term)
+  infix = len(term) >= MIN_INFIX_LENGTH
+  params = {'limit': limit}
+
+  if not tokens and not infix:
+    # only punctuation: nothing to look for
+    sql = "SELECT id, 0.0 AS rank FROM %s WHERE 1 = 0" % table
+  elif dialect == 'postgresql':
+    conditions = []
+    rank = ['0.0']
+    if tokens:
+      params['tsquery'] = ' & '.join(token + ':*' for token in tokens)
+      conditions.append("search_document @@ to_tsquery('simple', :tsquery)")
+      rank.append("ts_rank(search_document, to_tsquery('simple', :tsquery))")
+    if infix:
+      params['term'] = term
+      params['pattern'] = '%' + _escape_like(term) + '%'
+      conditions.append("%s.name ILIKE :pattern" % table)
+      rank.append("similarity(%s.name, :term)" % table)
+    sql = "SELECT id, %s AS rank FROM %s WHERE %s" % (' + '.join(rank), table, ' OR '.join(conditions))
+  else:
+    branches = []
+    if tokens:
+      params['fts'] = ' AND '.join('"%s"*' % token for token in tokens)
+      branches.append("SELECT rowid AS id, -rank AS rank FROM {t}_search "
+                      "WHERE {t}_search MATCH :fts".format(t=table))
+    if infix:
+      params['trgm'] = '"%s"' % term.replace('"', '""')
+      branches.append("SELECT rowid AS id, -rank AS rank FROM {t}_name_trgm "
+                      "WHERE {t}_name_trgm MATCH :trgm".format(t=table))
+    sql = "SELECT id, max(rank) AS rank FROM (%s) GROUP BY id" % ' UNION ALL '.join(branches)
+
+  # only the best rows are joined to the table and loaded
+  return text(sql + " ORDER BY rank DESC, id LIMIT :limit").bindparams(**params) \
+    .columns(column('id', Integer), column('rank', Float)) \
+    .alias('matches')
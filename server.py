@@ -0,0 +1,255 @@
+#----------------------------------------------------------------------------#
+# Production server.
+#
+#   FYYUR_ENV=prod python server.py [--workers N] [--bind HOST:PORT]
+#                                   [--max-requests N] [--access-log]
+#
+# The master process imports the app, compiles every template, builds the
+# typeahead index and warms a shared page cache, then forks SERVER_WORKERS
+# processes that accept from one shared listening socket. Workers inherit
+# all of that copy-on-write instead of each building its own, and with no
+# shared interpreter lock throughput grows with the number of cores.
+#
+# A page cache the workers can share takes PAGE_CACHE_BACKEND = 'redis'.
+# The in-process 'lru' one is used by a single worker only, and turned off
+# for more: a write would invalidate it in the worker that made it alone.
+#
+# Between requests, the workers also sweep the show counters every
+# COUNTER_SWEEP_SECONDS (see counters.py), so no cron job is needed.
+#
+# Each worker serves one request at a time and is replaced after
+# SERVER_MAX_REQUESTS of them. SIGTERM or SIGINT stops the server
+# gracefully: workers finish the request in hand, and those still busy
+# after SERVER_GRACEFUL_TIMEOUT seconds are killed. Run it behind a proxy
+# that buffers slow clients (nginx, the Heroku router).
+#----------------------------------------------------------------------------#
+
+import argparse
+import gc
+import os
+import random
+import select
+import signal
+import sys
+import tempfile
+import time
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# seconds between a worker's checks for a stop signal while idle
+IDLE_POLL = 1.0
+
+
+class RequestHandler(WSGIRequestHandler):
+
+  def setup(self):
+    # a client that stalls sending its request holds a whole worker.
+    self.timeout = self.server.request_timeout
+    WSGIRequestHandler.setup(self)
+
+  def log_request(self, *args, **kwargs):
+    if self.server.access_log:
+      WSGIRequestHandler.log_request(self, *args, **kwargs)
+
+
+def preload():
+  '''Import the app and build what every worker uses.'''
+  from app import create_app
+  from extensions import typeahead
+  app = create_app()
+  for name in app.jinja_env.list_templates():
+    app.jinja_env.get_template(name)
+  with app.app_context():
+    typeahead.build()
+  return app
+
+
+def prefork(app, workers):
+  '''Do the rest of the per-process setup once, before forking `workers`.'''
+  from cache import LRUBackend
+  from extensions import db, logs, metrics, page_cache, replicas
+  if isinstance(page_cache.backend, LRUBackend):
+    # each worker would get a cache of its own that only its own writes
+    # invalidate, so the others would go on serving the pages they
+    # replaced. Nor is it warmed here: a worker replacing another must not
+    # start out with pages the master cached before any write.
+    if workers > 1:
+      app.logger.warning('PAGE_CACHE_BACKEND "lru" is per process: page cache off for %d workers, '
+                         'set it to "redis" to share one', workers)
+      page_cache.backend = None
+  else:
+    page_cache.warm()
+  # no connection may be shared across fork; each worker opens its own.
+  db.get_engine(app).dispose()
+  replicas.dispose()
+  # workers log through the master, which alone writes the log file
+  logs.share()
+  # and report /metrics for each other through files in a scratch directory
+  metrics.share(tempfile.mkdtemp(prefix='fyyur-metrics-'))
+  # objects made so far are never collected, so the collector does not
+  # touch (and copy) the pages they live on in every worker.
+  gc.collect()
+  gc.freeze()
+
+
+class Worker(object):
+
+  def __init__(self, server, max_requests):
+    self.server = server
+    self.max_requests = max_requests
+    self.running = True
+    self.sweep_every = server.app.config['COUNTER_SWEEP_SECONDS']
+
+  def stop(self, signum, frame):
+    self.running = False
+
+  def run(self):
+    signal.signal(signal.SIGTERM, self.stop)
+    # ^C reaches the whole process group; the master decides what happens.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    random.seed()
+    # workers take turns at the counter sweep; starting at random points
+    # of the interval, they rarely reach it together.
+    self.next_sweep = time.monotonic() + random.uniform(0, self.sweep_every)
+    listener = self.server.socket
+    metrics = self.server.app.extensions['metrics']
+    served = 0
+    while self.running and served < self.max_requests:
+      metrics.flush()
+      self.sweep()
+      if not select.select([listener], [], [], IDLE_POLL)[0]:
+        continue
+      try:
+        request, address = listener.accept()
+      except (BlockingIOError, InterruptedError):
+        # another worker took the connection
+        continue
+      request.setblocking(True)
+      served += 1
+      try:
+        self.server.finish_request(request, address)
+      except Exception:
+        self.server.handle_error(request, address)
+      finally:
+        self.server.shutdown_request(request)
+
+  def sweep(self):
+    # between requests: move started shows to the past counts once the
+    # last sweep, by whichever worker, is COUNTER_SWEEP_SECONDS old.
+    if not self.sweep_every or time.monotonic() < self.next_sweep:
+      return
+    self.next_sweep = time.monotonic() + self.sweep_every
+    app = self.server.app
+    from views import sweep_counters
+    with app.app_context():
+      try:
+        sweep_counters(every=self.sweep_every)
+      except Exception:
+        app.logger.exception('counter sweep failed')
+
+
+class Master(object):
+
+  def __init__(self, app, server, workers, max_requests, jitter, graceful_timeout):
+    self.app = app
+    self.server = server
+    self.workers = workers
+    self.max_requests = max_requests
+    self.jitter = jitter
+    self.graceful_timeout = graceful_timeout
+    self.pids = {}
+    self.stopping = False
+
+  def spawn(self):
+    max_requests = self.max_requests + random.randint(0, self.jitter)
+    pid = os.fork()
+    if pid:
+      self.pids[pid] = time.monotonic()
+      return
+    status = 0
+    try:
+      Worker(self.server, max_requests).run()
+    except BaseException:
+      self.app.logger.exception('worker %d failed', os.getpid())
+      status = 1
+    finally:
+      self.app.extensions['metrics'].flush(force=True)
+      self.app.extensions['logs'].stop()
+      # never return into the master's code
+      os._exit(status)
+
+  def stop(self, signum, frame):
+    self.stopping = True
+
+  def run(self):
+    signal.signal(signal.SIGTERM, self.stop)
+    signal.signal(signal.SIGINT, self.stop)
+    self.app.logger.info('serving on http://%s:%d with %d workers',
+                         self.server.server_address[0], self.server.server_address[1], self.workers)
+    while not self.stopping:
+      while len(self.pids) < self.workers:
+        self.spawn()
+      self.reap()
+      time.sleep(0.2)
+    self.shutdown()
+
+  def reap(self):
+    while self.pids:
+      try:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+      except ChildProcessError:
+        return
+      if not pid:
+        return
+      started = self.pids.pop(pid, None)
+      self.app.extensions['metrics'].retire(pid)
+      if status:
+        self.app.logger.warning('worker %d exited with status %d', pid, status)
+        # a worker that cannot even start should not be restarted in a loop
+        if started is not None and time.monotonic() - started < 1:
+          time.sleep(1)
+
+  def shutdown(self):
+    for pid in self.pids:
+      os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + self.graceful_timeout
+    while self.pids and time.monotonic() < deadline:
+      self.reap()
+      time.sleep(0.1)
+    for pid in list(self.pids):
+      self.app.logger.warning('worker %d did not stop in %ds, killed', pid, self.graceful_timeout)
+      os.kill(pid, signal.SIGKILL)
+      os.waitpid(pid, 0)
+    self.server.server_close()
+    self.app.extensions['metrics'].close()
+
+
+def main():
+  app = preload()
+  config = app.config
+  parser = argparse.ArgumentParser(description='Serve Fyyur with a pool of preforked worker processes.')
+  parser.add_argument('--bind', default='%s:%d' % (config['SERVER_HOST'], config['SERVER_PORT']),
+                      help='HOST:PORT to listen on (SERVER_HOST, SERVER_PORT / PORT)')
+  parser.add_argument('--workers', type=int, default=config['SERVER_WORKERS'],
+                      help='worker processes; 0 means one per CPU (SERVER_WORKERS)')
+  parser.add_argument('--max-requests', type=int, default=config['SERVER_MAX_REQUESTS'],
+                      help='requests a worker serves before it is replaced (SERVER_MAX_REQUESTS)')
+  parser.add_argument('--access-log', action='store_true', help='log every request to stderr')
+  args = parser.parse_args()
+
+  host, port = args.bind.rsplit(':', 1)
+  server = BaseWSGIServer(host, int(port), app, handler=RequestHandler)
+  server.multiprocess = True
+  server.access_log = args.access_log
+  server.request_timeout = config['SERVER_TIMEOUT']
+  # idle workers all wait on the socket; those that lose the race for a
+  # connection go back to waiting instead of blocking in accept().
+  server.socket.setblocking(False)
+
+  workers = args.workers or os.cpu_count() or 1
+  prefork(app, workers)
+  Master(app, server, workers, args.max_requests,
+         config['SERVER_MAX_REQUESTS_JITTER'], config['SERVER_GRACEFUL_TIMEOUT']).run()
+
+
+if __name__ == '__main__':
+  main()
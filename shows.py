@@ -0,0 +1,166 @@
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+from datetime import timedelta
+from flask import Blueprint, current_app, render_template, request, flash
+from sqlalchemy.exc import IntegrityError
+import bookings
+import bulk
+from extensions import db, page_cache
+from filters import format_datetime, format_datetimes
+from forms import ShowForm, RecurringShowForm
+from models import Artist, Show, Venue, counters
+from pagination import paginate, StreamedPage
+from views import invalidate_show_pages, render_listing, venue_bookings
+
+bp = Blueprint('shows', __name__)
+
+def show_listing():
+  return db.session.query(
+    Show.id,
+    Show.start_time,
+    Venue.id.label('venue_id'),
+    Venue.name.label('venue_name'),
+    Artist.id.label('artist_id'),
+    Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link')
+  ).join(Venue, Show.venue_id == Venue.id).join(Artist, Show.artist_id == Artist.id)
+
+@bp.route('/shows')
+@page_cache.cached('shows')
+def shows():
+  # displays list of shows at /shows
+  query = show_listing()
+  page = paginate(query, (Show.start_time, Show.id), key=lambda row: (row.start_time, row.id),
+                  descending=True, streamed=current_app.config['STREAM_LISTINGS'])
+
+  if isinstance(page, StreamedPage):
+    # rows are only read once, as the template reaches them.
+    tiles = ((show, format_datetime(show.start_time, 'full')) for show in page)
+  else:
+    # the listing can hold thousands of tiles, so start times are formatted
+    # in one batched call rather than through the template filter per tile.
+    tiles = zip(page, format_datetimes([show.start_time for show in page], 'full'))
+  data = ({
+    "venue_id": show.venue_id,
+    "venue_name": show.venue_name,
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_name,
+    "artist_image_link": show.artist_image_link,
+    "start_time": start_time
+  } for show, start_time in tiles)
+  
+  return render_listing('pages/shows.html', shows=data, page=page)
+
+@bp.route('/shows/create')
+def create_shows():
+  # renders form. do not touch.
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+  # called to create new shows in the db, upon submitting new show listing form
+  # TODO: insert form data as a new Show record in the db, instead
+  # Set the FlaskForm
+  data = ShowForm(request.form)
+  # Validate all fields
+  form = ShowForm(request.form, meta={'csrf': False})
+  if form.validate():
+    start_time = form.start_time.data
+    end_time = form.end_time.data or start_time + timedelta(minutes=current_app.config['SHOW_DURATION_MINUTES'])
+    try:
+      venue_id = int(form.venue_id.data)
+      # checked first to name the clashing show; the database still rejects
+      # an overlapping booking committed in between (see bookings.py).
+      clash = venue_bookings(db.session.query(Show.id, Show.start_time, Show.end_time),
+                             venue_id, start_time, end_time).first()
+      if clash is not None:
+        flash('Venue %d is already booked from %s to %s by show %d.' % (
+          venue_id, format_datetime(clash.start_time), format_datetime(clash.end_time), clash.id))
+        return render_template('forms/new_show.html', form=form)
+      show =Show(
+      artist_id = form.artist_id.data,
+      venue_id = venue_id,
+      start_time = start_time,
+      end_time = end_time
+      )
+      db.session.add(show)
+      db.session.commit()
+      invalidate_show_pages(form.venue_id.data, form.artist_id.data)
+      # on successful db insert, flash success
+      flash('Show ' + request.form['artist_id'] + ' was successfully listed!')
+    except ValueError as e:
+      print(e)
+    except IntegrityError as e:
+      db.session.rollback()
+      if not bookings.is_conflict(e, Show.__tablename__):
+        raise
+      flash('Venue %d is already booked at that time.' % venue_id)
+      return render_template('forms/new_show.html', form=form)
+
+  else:
+    #  on unsuccessful db insert, flash an error instead.
+    # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    message = []
+    for field, err in form.errors.items():
+      message.append(field + ' ' + '|'.join(err))
+    flash('Errors ' + str(message))
+    form = ShowForm()
+    return render_template('forms/new_show.html', form=form)
+
+  return render_template('pages/home.html')
+
+#  Batches
+#  ----------------------------------------------------------------
+
+def show_loader():
+  return bulk.ShowLoader(Show, Artist, Venue, ShowForm, timedelta(minutes=current_app.config['SHOW_DURATION_MINUTES']),
+                         after_insert=counters.shows_inserted)
+
+def create_show_batch(numbered_rows):
+  '''Create the shows of `numbered_rows`, (number, row) pairs, in one
+  transaction. Foreign keys are checked with one query per table and the
+  shows go in with one statement; rows that fail are reported by number in
+  the returned report and do not stop the rest. Returns the report and the
+  rows inserted.'''
+  report, rows = bulk.create_rows(db.session, show_loader(), numbered_rows)
+  if rows:
+    page_cache.invalidate('shows')
+    page_cache.invalidate('venues')
+    page_cache.invalidate('venue', {row['venue_id'] for row in rows})
+    page_cache.invalidate('artist', {row['artist_id'] for row in rows})
+  return report, rows
+
+@bp.route('/shows/create/recurring')
+def create_recurring_shows():
+  form = RecurringShowForm()
+  return render_template('forms/new_recurring_show.html', form=form)
+
+@bp.route('/shows/create/recurring', methods=['POST'])
+def create_recurring_shows_submission():
+  # a residency: the same artist and venue every week (day, month) until
+  # a date or for a number of shows.
+  form = RecurringShowForm(request.form, meta={'csrf': False})
+  if not form.validate():
+    flash('Errors ' + str([field + ' ' + '|'.join(errors) for field, errors in form.errors.items()]))
+    return render_template('forms/new_recurring_show.html', form=form)
+  show = {'artist_id': form.artist_id.data, 'venue_id': form.venue_id.data,
+          'start_time': form.start_time.data, 'end_time': form.end_time.data}
+  try:
+    rows = bulk.recurrences(show, form.rrule(), current_app.config['SHOW_BATCH_MAX'])
+  except ValueError as e:
+    flash(str(e))
+    return render_template('forms/new_recurring_show.html', form=form)
+
+  report, created = create_show_batch(rows)
+  starts = dict(rows)
+  for number, errors in sorted(report.rejected, key=lambda rejected: rejected[0]):
+    flash('Show %d (%s) was not listed: %s' % (
+      number, starts[number]['start_time'], '; '.join(e for field in errors.values() for e in field)))
+  flash('%d of %d shows were successfully listed!' % (len(created), len(rows)))
+  if not created:
+    return render_template('forms/new_recurring_show.html', form=form)
+  return render_template('pages/home.html')
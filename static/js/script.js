@@ -2,3 +2,37 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Name suggestions from /api/v1/typeahead for inputs marked
+// data-typeahead="artist|venue". data-typeahead-value picks what a
+// suggestion fills in: the name (search boxes) or the id (show form).
+document.querySelectorAll('[data-typeahead]').forEach(function (input) {
+  var kind = input.getAttribute('data-typeahead');
+  var value = input.getAttribute('data-typeahead-value') || 'name';
+  var list = document.createElement('datalist');
+  var timer = null;
+  list.id = (input.id || input.name) + '-typeahead';
+  input.setAttribute('list', list.id);
+  input.parentNode.appendChild(list);
+
+  input.addEventListener('input', function () {
+    clearTimeout(timer);
+    if (!input.value || (value === 'id' && /^\d+$/.test(input.value))) {
+      return;
+    }
+    timer = setTimeout(function () {
+      var url = '/api/v1/typeahead?kind=' + kind + '&q=' + encodeURIComponent(input.value);
+      fetch(url).then(function (response) {
+        return response.json();
+      }).then(function (matches) {
+        list.innerHTML = '';
+        matches[kind + 's'].forEach(function (match) {
+          var option = document.createElement('option');
+          option.value = match[value];
+          option.textContent = match.name + ' (' + match.city + ', ' + match.state + ')';
+          list.appendChild(option);
+        });
+      });
+    }, 100);
+  });
+});
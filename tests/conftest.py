@@ -0,0 +1,85 @@
+#----------------------------------------------------------------------------#
+# Test fixtures.
+#
+#   python -m pytest -q
+#
+# Each test gets an app of the test profile: an in-memory SQLite database
+# holding a few venues, artists and shows, relationship loads a route did
+# not declare raising (RAISE_ON_LAZY_LOAD), no log file and no page cache,
+# so every request does its own work.
+#----------------------------------------------------------------------------#
+
+import contextlib
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from app import create_app
+from extensions import db
+from models import Artist, Genre, Show, Venue
+
+
+def seed():
+  genres = {name: Genre(name=name) for name in ('Jazz', 'Folk', 'Rock')}
+  venues = [
+    Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom Street',
+          phone='123-123-1234', website='https://www.themusicalhop.com', genres=[genres['Jazz'], genres['Folk']]),
+    Venue(name='Park Square Live Music & Coffee', city='San Francisco', state='CA', address='34 Whiskey Moore Ave',
+          phone='415-000-1234', website='https://www.parksquarelivemusicandcoffee.com', genres=[genres['Jazz']]),
+    Venue(name='The Dueling Pianos Bar', city='New York', state='NY', address='335 Delancey Street',
+          phone='914-003-1132', website='https://www.theduelingpianos.com', genres=[genres['Rock']]),
+  ]
+  artists = [
+    Artist(name='Guns N Petals', city='San Francisco', state='CA', phone='326-123-5000', genres=[genres['Rock']]),
+    Artist(name='Matt Quevedo', city='New York', state='NY', phone='300-400-5000', genres=[genres['Jazz']]),
+    Artist(name='The Wild Sax Band', city='San Francisco', state='CA', phone='432-325-5432', genres=[genres['Jazz']]),
+  ]
+  db.session.add_all(venues + artists)
+  db.session.flush()
+  # past and upcoming shows for every venue and artist
+  now = datetime.now()
+  for i in range(12):
+    start_time = now + timedelta(days=(i - 6) * 7)
+    db.session.add(Show(venue_id=venues[i % 3].id, artist_id=artists[i % 3].id,
+                        start_time=start_time, end_time=start_time + timedelta(hours=3)))
+  db.session.commit()
+
+
+@pytest.fixture
+def app():
+  app = create_app('test', settings={'LOG_FILE': '', 'PAGE_CACHE_BACKEND': None})
+  with app.app_context():
+    db.create_all()
+    seed()
+    yield app
+    db.session.remove()
+    db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+  client = app.test_client()
+  # the first request runs the startup self-check (app.check_database),
+  # whose statements are no route's.
+  client.get('/')
+  return client
+
+
+@pytest.fixture
+def statements(app):
+  '''A context manager collecting the SQL statements run inside it.'''
+  @contextlib.contextmanager
+  def collect():
+    collected = []
+    record = lambda conn, cursor, statement, *args: collected.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+      yield collected
+    finally:
+      event.remove(db.engine, 'before_cursor_execute', record)
+  return collect
@@ -0,0 +1,26 @@
+#----------------------------------------------------------------------------#
+# Bulk imports.
+#----------------------------------------------------------------------------#
+
+from sqlalchemy import select
+
+from bulk import copy_csv, insert_rows
+from extensions import db
+from models import Venue
+
+ROW = {'id': 10, 'name': 'The "Blank" Room', 'city': 'Austin', 'state': 'TX', 'address': '1 Main St',
+       'phone': '5120000000', 'website': 'https://x.com', 'image_link': None, 'seeking_description': ''}
+
+
+def test_copy_keeps_none_apart_from_empty_strings():
+  # COPY's CSV: NULL unquoted and empty, '' quoted
+  assert copy_csv([ROW], ['id', 'name', 'image_link', 'seeking_description']) == \
+    '"10","The ""Blank"" Room",,""\n'
+
+
+def test_none_is_stored_as_null(app):
+  table = Venue.__table__
+  insert_rows(db.session.connection(), table, [ROW])
+  row = db.session.execute(select([table.c.image_link, table.c.seeking_description])
+                           .where(table.c.id == 10)).first()
+  assert tuple(row) == (None, '')
@@ -0,0 +1,38 @@
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+
+from extensions import db
+from models import CounterSweep, Show, counters
+from views import sweep_counters
+
+
+def detail(client, venue_id):
+  data = client.get('/api/v1/venues/%d' % venue_id).get_json()
+  # the lists and the counts above them agree
+  assert len(data['upcoming_shows']) == data['upcoming_shows_count']
+  assert len(data['past_shows']) == data['past_shows_count']
+  return data
+
+
+def test_lists_split_where_the_counters_do(client):
+  now = datetime.now()
+  connection = db.session.connection()
+  connection.execute(CounterSweep.__table__.update().values(swept_until=now - timedelta(hours=1)))
+  counters.reconcile(connection)
+  started = now - timedelta(minutes=30)
+  db.session.add(Show(venue_id=2, artist_id=2, start_time=started, end_time=started + timedelta(hours=3)))
+  db.session.commit()
+
+  # started, but not swept yet: upcoming in both the counts and the lists
+  before = detail(client, 2)
+  assert before['upcoming_shows'][0]['start_time'] == started.isoformat()
+
+  assert sweep_counters(every=7200) == (set(), set())
+  venue_ids, artist_ids = sweep_counters()
+  assert 2 in venue_ids and 2 in artist_ids
+  after = detail(client, 2)
+  assert after['upcoming_shows_count'] == before['upcoming_shows_count'] - 1
+  assert after['past_shows'][0]['start_time'] == started.isoformat()
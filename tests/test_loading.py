@@ -0,0 +1,39 @@
+#----------------------------------------------------------------------------#
+# Loading profiles.
+#
+# The test profile sets RAISE_ON_LAZY_LOAD, so a relationship a route
+# touches without naming it in its loading profile (LOAD_PROFILES in
+# models.py) raises instead of quietly querying. Every page and API
+# resource is rendered here, streamed and not, to its last byte.
+#----------------------------------------------------------------------------#
+
+import pytest
+from sqlalchemy import exc
+
+from models import Venue, loaded
+
+PATHS = [
+  '/venues', '/venues/1', '/venues/2', '/venues/1/edit', '/venues/1/calendar', '/venues/create',
+  '/artists', '/artists/1', '/artists/3', '/artists/1/edit', '/artists/create',
+  '/shows', '/shows/create', '/shows/create/recurring',
+  '/genres/Jazz/venues', '/genres/Jazz/artists',
+  '/api/v1/venues', '/api/v1/venues/1', '/api/v1/artists', '/api/v1/artists/1', '/api/v1/shows',
+  '/api/v1/typeahead?q=th',
+]
+
+
+@pytest.mark.parametrize('stream', [True, False], ids=['streamed', 'rendered'])
+@pytest.mark.parametrize('path', PATHS)
+def test_routes_load_what_they_declare(app, client, path, stream):
+  assert app.config['RAISE_ON_LAZY_LOAD']
+  app.config['STREAM_LISTINGS'] = stream
+  response = client.get(path)
+  # streamed bodies render, and load, while they are read
+  body = response.get_data(as_text=True)
+  assert response.status_code == 200, body
+
+
+def test_undeclared_relationships_raise(app):
+  venue = loaded(Venue, 'entity').get(1)
+  with pytest.raises(exc.InvalidRequestError):
+    venue.genres
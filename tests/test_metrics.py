@@ -0,0 +1,38 @@
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+
+from metrics import Metrics
+
+
+def count(metrics, endpoint):
+  line = 'fyyur_request_queries_count{endpoint="%s"} ' % endpoint
+  body = metrics.expose().get_data(as_text=True)
+  return int(body.split(line)[1].split('\n')[0]) if line in body else 0
+
+
+def test_workers_report_for_each_other(tmp_path):
+  worker = Metrics()
+  worker.share(str(tmp_path))
+  worker.queries.observe(1, endpoint='venues.venues')
+
+  # another worker's numbers, and one that has since exited
+  for pid, observed in ((1, 2), (2, 3)):
+    other = Metrics()
+    for i in range(observed):
+      other.queries.observe(1, endpoint='venues.venues')
+    other.slow_queries.inc(endpoint='venues.venues')
+    worker._write(worker._path(pid), other._state())
+  assert count(worker, 'venues.venues') == 6
+
+  worker.retire(2)
+  assert not (tmp_path / '2.pickle').exists()
+  assert count(worker, 'venues.venues') == 6
+  assert 'fyyur_slow_queries_total{endpoint="venues.venues"} 2' in worker.expose().get_data(as_text=True)
+
+  # its own file is never counted on top of its live numbers
+  worker.changed = True
+  worker.flush(force=True)
+  assert count(worker, 'venues.venues') == 6
+  worker.close()
+  assert not tmp_path.exists()
@@ -0,0 +1,25 @@
+#----------------------------------------------------------------------------#
+# Keyset pagination.
+#----------------------------------------------------------------------------#
+
+import pytest
+
+from pagination import encode_cursor
+
+
+@pytest.mark.parametrize('values', [
+  ['Matt Quevedo', {'id': 2}],
+  [['Matt Quevedo'], 2],
+  ['Matt Quevedo', True],
+  ['Matt Quevedo'],
+])
+def test_malformed_cursors_are_rejected(client, values):
+  assert client.get('/artists?after=%s' % encode_cursor(values)).status_code == 400
+  assert client.get('/artists?after=not-base64!').status_code == 400
+
+
+def test_cursors_page_on(client):
+  response = client.get('/artists?after=%s' % encode_cursor(['Matt Quevedo', 2]))
+  assert response.status_code == 200
+  body = response.get_data(as_text=True)
+  assert 'The Wild Sax Band' in body and 'Guns N Petals' not in body
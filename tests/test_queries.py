@@ -0,0 +1,48 @@
+#----------------------------------------------------------------------------#
+# Query budgets.
+#
+# The SQL statements a route may run, whatever the number of matches or
+# shows: a loop over rows that queries per row fails these at once.
+#----------------------------------------------------------------------------#
+
+import pytest
+
+from models import Artist, Venue
+from views import search_with_upcoming
+
+# one grouped query for the matches and their upcoming show counts
+SEARCH_BUDGET = 1
+# the version check (conditional.py), the entity, its genres, and one
+# range query each for upcoming and past shows
+DETAIL_BUDGET = 5
+
+
+@pytest.mark.parametrize('path', ['/venues/search', '/artists/search'])
+@pytest.mark.parametrize('term', ['a', 'the', 'jazz', 'San Francisco, CA', 'no such thing'])
+def test_search_budget(client, statements, path, term):
+  with statements() as run:
+    response = client.post(path, data={'search_term': term})
+  assert response.status_code == 200
+  assert len(run) <= SEARCH_BUDGET, run
+
+
+@pytest.mark.parametrize('path', ['/venues/%d', '/artists/%d', '/api/v1/venues/%d', '/api/v1/artists/%d'])
+@pytest.mark.parametrize('entity_id', [1, 2, 3])
+def test_detail_budget(client, statements, path, entity_id):
+  with statements() as run:
+    response = client.get(path % entity_id)
+  assert response.status_code == 200
+  assert len(run) <= DETAIL_BUDGET, run
+
+
+@pytest.mark.parametrize('model, term, name', [
+  (Artist, 'sax', 'The Wild Sax Band'),
+  (Venue, 'dueling', 'The Dueling Pianos Bar'),
+])
+def test_search_counts_upcoming_shows(app, statements, model, term, name):
+  # the seeded shows are weekly from six weeks ago: two of each entity's
+  # four are upcoming. The counts come from the same single query.
+  with app.test_request_context(), statements() as run:
+    found = search_with_upcoming(model, term)
+  assert [(row['name'], row['num_upcoming_shows']) for row in found['data']] == [(name, 2)]
+  assert len(run) <= SEARCH_BUDGET, run
@@ -0,0 +1,50 @@
+#----------------------------------------------------------------------------#
+# Query plans of the upcoming / past show splits.
+#
+# The statements the venue and artist pages run against the show table are
+# captured with their parameters and run again under EXPLAIN QUERY PLAN:
+# each must be a range search of the entity's (<entity>_id, start_time)
+# index, returning rows in index order, never a scan of the table or a
+# sort. The test database is SQLite; on Postgres, `EXPLAIN` the same
+# statements against a seeded database (benchmarks/seed.py).
+#----------------------------------------------------------------------------#
+
+import re
+
+import pytest
+from sqlalchemy import event
+
+from extensions import db
+
+
+def show_statements(client, path):
+  captured = []
+  def record(conn, cursor, statement, parameters, context, executemany):
+    if re.search(r'\bFROM show\b', statement):
+      captured.append((statement, parameters))
+  event.listen(db.engine, 'before_cursor_execute', record)
+  try:
+    assert client.get(path).status_code == 200
+  finally:
+    event.remove(db.engine, 'before_cursor_execute', record)
+  return captured
+
+
+def plan(statement, parameters):
+  return [row[-1] for row in db.engine.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+
+@pytest.mark.parametrize('path, index', [
+  ('/venues/1', 'ix_show_venue_id_start_time'),
+  ('/artists/2', 'ix_show_artist_id_start_time'),
+])
+def test_show_splits_search_the_index(client, path, index):
+  captured = show_statements(client, path)
+  # upcoming and past
+  assert len(captured) == 2
+  for statement, parameters in captured:
+    steps = plan(statement, parameters)
+    show_steps = [step for step in steps if step.split(' ')[1] == 'show']
+    assert show_steps and all(step.startswith('SEARCH show USING INDEX %s ' % index) for step in show_steps), steps
+    assert 'start_time' in show_steps[0], steps
+    assert not any(step.startswith('SCAN') or 'TEMP B-TREE' in step for step in steps), steps
@@ -0,0 +1,71 @@
+#----------------------------------------------------------------------------#
+# Read replicas.
+#
+# The "replica" is the primary's own SQLite file, which is enough to see
+# where each request's statements were routed.
+#----------------------------------------------------------------------------#
+
+import pytest
+from flask import request
+
+from app import create_app
+from extensions import db, replicas
+from replicas import COOKIE, REPLICA, WROTE
+from conftest import seed
+
+
+@pytest.fixture
+def app(tmp_path):
+  url = 'sqlite:///%s' % (tmp_path / 'fyyur.db')
+  app = create_app('test', settings={'LOG_FILE': '', 'PAGE_CACHE_BACKEND': None,
+                                     'SQLALCHEMY_DATABASE_URI': url, 'DATABASE_REPLICA_URLS': url})
+  with app.app_context():
+    db.create_all()
+    seed()
+    yield app
+    db.session.remove()
+    replicas.dispose()
+    db.drop_all()
+
+
+PROFILE = {'city': 'Austin', 'state': 'TX', 'phone': '5120000000', 'genres': 'Jazz',
+           'facebook_link': 'https://www.facebook.com/x', 'website_link': 'https://x.com'}
+
+
+def test_searches_read_from_a_replica(client):
+  with client:
+    response = client.post('/venues/search', data={'search_term': 'music'})
+    assert response.status_code == 200
+    assert request.environ[REPLICA] is not None
+    assert not request.environ.get(WROTE)
+  assert COOKIE not in response.headers.get('Set-Cookie', '')
+
+
+@pytest.mark.parametrize('path, data', [
+  ('/venues/create', dict(PROFILE, name='The Blue Room', address='1 Main St')),
+  ('/artists/create', dict(PROFILE, name='The Blue Trio')),
+  ('/shows/create', {'artist_id': '1', 'venue_id': '1', 'start_time': '2030-01-01 20:00:00'}),
+  ('/api/v1/shows/batch', None),
+])
+def test_writes_stick_to_the_primary(client, path, data):
+  with client:
+    if data is None:
+      show = {'artist_id': 1, 'venue_id': 1, 'start_time': '2030-01-01T20:00:00'}
+      response = client.post(path, json={'shows': [show]})
+    else:
+      response = client.post(path, data=data)
+    assert response.status_code in (200, 201)
+    assert request.environ[WROTE]
+  assert COOKIE in response.headers['Set-Cookie']
+
+  with client:
+    client.get('/api/v1/venues/1')
+    assert request.environ[REPLICA] is None
+
+
+def test_replicas_being_checked_are_passed_over(app, monkeypatch):
+  checked = []
+  monkeypatch.setattr(replicas, 'check', checked.append)
+  replicas.replicas[0].checking = True
+  assert replicas.pick() is None
+  assert not checked
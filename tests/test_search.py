@@ -0,0 +1,47 @@
+#----------------------------------------------------------------------------#
+# Venue and artist search.
+#----------------------------------------------------------------------------#
+
+import re
+
+import pytest
+
+from extensions import db
+from models import Venue
+
+
+def names(response):
+  return re.findall(r'<h5>(.*?)</h5>', response.get_data(as_text=True))
+
+
+@pytest.mark.parametrize('term', ['', ' ', 'a', '!'])
+def test_short_terms_are_not_run(client, statements, term):
+  with statements() as run:
+    response = client.post('/venues/search', data={'search_term': term})
+  assert response.status_code == 200
+  assert run == []
+  assert names(response) == []
+  assert b'Enter at least 2 characters' in response.data
+
+
+@pytest.mark.parametrize('path, term, found', [
+  ('/venues/search', 'San Francisco, CA', {'Park Square Live Music &amp; Coffee', 'The Musical Hop'}),
+  ('/artists/search', 'jazz', {'Matt Quevedo', 'The Wild Sax Band'}),
+  ('/venues/search', 'usic', {'Park Square Live Music &amp; Coffee', 'The Musical Hop'}),
+  ('/artists/search', '!!', set()),
+])
+def test_matches(client, path, term, found):
+  assert set(names(client.post(path, data={'search_term': term}))) == found
+
+
+def test_results_are_limited(app, client, statements):
+  app.config['SEARCH_LIMIT'] = 2
+  for i in range(5):
+    db.session.add(Venue(name='Hall %d' % i, city='Austin', state='TX', address='1 Main Street',
+                         phone='512-000-0000', website='https://example.com'))
+  db.session.commit()
+  with statements() as run:
+    response = client.post('/venues/search', data={'search_term': 'hall'})
+  assert len(names(response)) == 2
+  assert b'Showing the 2 best matches' in response.data
+  assert len(run) == 1 and 'LIMIT' in run[0]
@@ -0,0 +1,37 @@
+#----------------------------------------------------------------------------#
+# Typeahead.
+#----------------------------------------------------------------------------#
+
+import sys
+
+import pytest
+
+from typeahead import PrefixIndex
+
+
+def counted(index):
+  # what nbytes() keeps count of, walked in full
+  size = sys.getsizeof(index._names) + sys.getsizeof(index._words) + sys.getsizeof(index._entries)
+  size += sum(sys.getsizeof(key) + sys.getsizeof(key[0]) for key in index._names + index._words)
+  return size + sum(sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry.values())
+                    for entry in index._entries.values())
+
+
+def test_nbytes_follows_changes():
+  index = PrefixIndex()
+  index.load([(1, 'The Musical Hop', 'San Francisco', 'CA'), (2, 'Park Square Live Music & Coffee', None, None)])
+  assert index.nbytes() == counted(index)
+  index.add(3, 'The Dueling Pianos Bar', 'New York', 'NY')
+  index.add(1, 'The Musical Hop Again', 'San Francisco', 'CA')
+  assert index.nbytes() == counted(index)
+  index.remove(2)
+  index.remove(4)
+  assert index.nbytes() == counted(index)
+
+
+@pytest.mark.parametrize('limit, found', [(-1, 1), (0, 2), (1, 1), (100, 2)])
+def test_limit_is_clamped(app, client, limit, found):
+  app.config['TYPEAHEAD_LIMIT'] = 2
+  app.config['TYPEAHEAD_MAX_LIMIT'] = 2
+  response = client.get('/api/v1/typeahead?kind=venue&q=the&limit=%d' % limit)
+  assert len(response.get_json()['venues']) == found
@@ -0,0 +1,43 @@
+#----------------------------------------------------------------------------#
+# Entity versions.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from extensions import db
+from models import CounterSweep, Show, Venue, counters
+from views import sweep_counters
+
+
+def test_rows_inserted_without_the_orm_get_updated_at(app):
+  # as bulk.py's COPY does on Postgres: no Python defaults
+  db.session.execute(text("INSERT INTO venue (name, city, state, address, phone, website) "
+                          "VALUES ('Imported', 'Austin', 'TX', '1 Main St', '5120000000', 'https://x.com')"))
+  venue = Venue.query.filter_by(name='Imported').one()
+  assert venue.version == 1
+  assert abs(venue.updated_at - datetime.utcnow()) < timedelta(minutes=1)
+
+
+def test_etags_change_when_started_shows_are_swept(client):
+  now = datetime.now()
+  connection = db.session.connection()
+  connection.execute(CounterSweep.__table__.update().values(swept_until=now - timedelta(hours=1)))
+  counters.reconcile(connection)
+  started = now - timedelta(minutes=30)
+  db.session.add(Show(venue_id=2, artist_id=2, start_time=started, end_time=started + timedelta(hours=3)))
+  db.session.commit()
+
+  # the show has started since the watermark: the page is unchanged until
+  # the sweep moves it to the past shows, and its version with it.
+  paths = ('/venues/2', '/artists/2', '/api/v1/venues/2', '/api/v1/artists/2')
+  etags = {path: client.get(path).headers['ETag'] for path in paths}
+  for path in paths:
+    assert client.get(path, headers={'If-None-Match': etags[path]}).status_code == 304
+
+  sweep_counters()
+  for path in paths:
+    response = client.get(path, headers={'If-None-Match': etags[path]})
+    assert response.status_code == 200, path
+    assert response.headers['ETag'] != etags[path]
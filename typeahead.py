@@ -0,0 +1,184 @@
+#----------------------------------------------------------------------------#
+# In-process prefix index for artist and venue name typeahead.
+#
+# Each name is stored under every word suffix of its normalized form, so
+# "The Wild Sax Band" is found by "the w", "wild s" and "sax". Keys live in
+# sorted lists searched with bisect: a lookup is a binary search plus a
+# scan of about as many keys as it returns results, and never touches the
+# database.
+#
+# The index is built from the database at startup, kept current by the
+# create and edit handlers of this process, and rebuilt every
+# TYPEAHEAD_REFRESH seconds to pick up writes made by other workers.
+#----------------------------------------------------------------------------#
+
+import bisect
+import re
+import sys
+import threading
+import time
+import unicodedata
+
+
+def normalize(text):
+  # lower case, accents folded, punctuation dropped: "Café  Zürich!" -> "cafe zurich"
+  text = unicodedata.normalize('NFKD', text or '')
+  text = ''.join(c for c in text if not unicodedata.combining(c))
+  return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+class PrefixIndex(object):
+
+  def __init__(self):
+    # sorted (key, id) pairs: whole names, and names from their second,
+    # third... word on.
+    self._names = []
+    self._words = []
+    self._entries = {}
+    # bytes held by the keys and entries, kept as they come and go so
+    # nbytes() never walks the index
+    self._held = 0
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def _keys_for(entity_id, name):
+    words = normalize(name).split(' ')
+    return (' '.join(words), entity_id), [(' '.join(words[i:]), entity_id) for i in range(1, len(words))]
+
+  @staticmethod
+  def _size(entry, name_key, word_keys):
+    # the key tuples and strings, and the entry dict; strings shared
+    # between keys and entries are counted once per key.
+    size = sys.getsizeof(entry) + sum(sys.getsizeof(value) for value in entry.values())
+    return size + sum(sys.getsizeof(key) + sys.getsizeof(key[0]) for key in [name_key] + word_keys)
+
+  def load(self, entries):
+    # (id, name, city, state) rows; replaces the whole index.
+    names, words, by_id, held = [], [], {}, 0
+    for entity_id, name, city, state in entries:
+      entry = by_id[entity_id] = {'id': entity_id, 'name': name, 'city': city, 'state': state}
+      name_key, word_keys = self._keys_for(entity_id, name)
+      names.append(name_key)
+      words.extend(word_keys)
+      held += self._size(entry, name_key, word_keys)
+    names.sort()
+    words.sort()
+    with self._lock:
+      self._names, self._words, self._entries, self._held = names, words, by_id, held
+
+  def add(self, entity_id, name, city=None, state=None):
+    name_key, word_keys = self._keys_for(entity_id, name)
+    entry = {'id': entity_id, 'name': name, 'city': city, 'state': state}
+    with self._lock:
+      self._remove(entity_id)
+      self._entries[entity_id] = entry
+      bisect.insort(self._names, name_key)
+      for key in word_keys:
+        bisect.insort(self._words, key)
+      self._held += self._size(entry, name_key, word_keys)
+
+  def remove(self, entity_id):
+    with self._lock:
+      self._remove(entity_id)
+
+  def _remove(self, entity_id):
+    entry = self._entries.pop(entity_id, None)
+    if entry is None:
+      return
+    name_key, word_keys = self._keys_for(entity_id, entry['name'])
+    self._held -= self._size(entry, name_key, word_keys)
+    for keys, key in [(self._names, name_key)] + [(self._words, key) for key in word_keys]:
+      i = bisect.bisect_left(keys, key)
+      if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+  @staticmethod
+  def _scan(keys, prefix):
+    i = bisect.bisect_left(keys, (prefix,))
+    while i < len(keys) and keys[i][0].startswith(prefix):
+      yield keys[i][1]
+      i += 1
+
+  def search(self, prefix, limit):
+    '''The first `limit` entries whose name, or a word of it, starts with `prefix`.
+
+    Names that start with the prefix come first, then names matching from
+    a later word on; each group in alphabetical order.
+    '''
+    prefix = normalize(prefix)
+    if not prefix:
+      return []
+    found = []
+    with self._lock:
+      for keys in (self._names, self._words):
+        for entity_id in self._scan(keys, prefix):
+          if len(found) == limit:
+            break
+          if entity_id not in found:
+            found.append(entity_id)
+      return [self._entries[entity_id] for entity_id in found]
+
+  def __len__(self):
+    return len(self._entries)
+
+  def nbytes(self):
+    # read without the lock, which lookups would otherwise wait on for
+    # every /metrics scrape.
+    return sys.getsizeof(self._names) + sys.getsizeof(self._words) + sys.getsizeof(self._entries) + self._held
+
+
+class Typeahead(object):
+
+  def __init__(self, app=None, models=None):
+    self.models = {}
+    self.indexes = {}
+    self.built_at = None
+    self._build_lock = threading.Lock()
+    if app is not None:
+      self.init_app(app, models)
+
+  def init_app(self, app, models=None):
+    # models: kind -> model with id, name, city and state columns
+    if models is not None:
+      self.models = models
+      self.indexes = {kind: PrefixIndex() for kind in models}
+      self.built_at = None
+    app.config.setdefault('TYPEAHEAD_LIMIT', 8)
+    app.config.setdefault('TYPEAHEAD_MAX_LIMIT', 20)
+    app.config.setdefault('TYPEAHEAD_REFRESH', 300)
+    self.app = app
+    app.extensions['typeahead'] = self
+
+  def build(self):
+    started = time.perf_counter()
+    for kind, model in self.models.items():
+      self.indexes[kind].load(model.query.with_entities(model.id, model.name, model.city, model.state))
+    self.built_at = time.monotonic()
+    self.app.logger.info('typeahead index built in %.0fms: %s, %.1f KiB',
+      (time.perf_counter() - started) * 1000,
+      ', '.join('%d %ss' % (len(index), kind) for kind, index in self.indexes.items()),
+      self.nbytes() / 1024.0)
+
+  def ensure_built(self):
+    refresh = self.app.config['TYPEAHEAD_REFRESH']
+    if self.built_at is None or (refresh and time.monotonic() - self.built_at > refresh):
+      # one rebuild at a time; other requests keep serving the old index.
+      if self._build_lock.acquire(blocking=self.built_at is None):
+        try:
+          if self.built_at is None or time.monotonic() - self.built_at > refresh:
+            self.build()
+        finally:
+          self._build_lock.release()
+
+  def search(self, prefix, kinds=None, limit=None):
+    self.ensure_built()
+    limit = max(1, min(limit or self.app.config['TYPEAHEAD_LIMIT'], self.app.config['TYPEAHEAD_MAX_LIMIT']))
+    return {kind: self.indexes[kind].search(prefix, limit) for kind in (kinds or self.indexes)}
+
+  def update(self, kind, entity_id, name, city=None, state=None):
+    # before the first build there is nothing to keep current.
+    if self.built_at is not None:
+      self.indexes[kind].add(int(entity_id), name, city, state)
+
+  def nbytes(self):
+    return sum(index.nbytes() for index in self.indexes.values())
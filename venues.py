@@ -0,0 +1,267 @@
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+import itertools
+from datetime import date, datetime, time, timedelta
+from flask import Blueprint, current_app, render_template, request, flash, redirect, url_for, jsonify
+from conditional import conditional
+from extensions import db, page_cache, typeahead
+from forms import VenueForm
+from models import Area, Artist, Genre, Show, Venue, venue_genre, loaded
+from pagination import paginate
+from replicas import read_only
+from views import genre_filter, invalidate_venue_pages, render_listing, search_with_upcoming, split_shows, venue_bookings
+
+bp = Blueprint('venues', __name__)
+
+@bp.route('/venues')
+@page_cache.cached('venues')
+def venues():
+  return render_venue_directory(db.session.query(Venue), rollups=True)
+  
+
+def venue_directory(query):
+  # venues with their upcoming show counts and their area's rollup, all
+  # read from maintained counters.
+  return query.with_entities(
+    Venue.city,
+    Venue.state,
+    Venue.id,
+    Venue.name,
+    Venue.upcoming_shows_count.label('num_upcoming_shows'),
+    Area.venue_count.label('area_venue_count'),
+    Area.upcoming_shows_count.label('area_upcoming_shows_count')
+  ).outerjoin(Area, db.and_(Area.city == Venue.city, Area.state == Venue.state))
+
+def render_venue_directory(query, rollups=False):
+  # a page of the directory comes back ordered by area, so areas are
+  # grouped in a single pass as the rows arrive. `rollups` shows each
+  # area's totals, which count all of its venues.
+  page = paginate(venue_directory(query), (Venue.state, Venue.city, Venue.name, Venue.id),
+                  key=lambda row: (row.state, row.city, row.name, row.id),
+                  streamed=current_app.config['STREAM_LISTINGS'])
+
+  def area(rows):
+    first = next(rows)
+    return {
+      'city': first.city,
+      'state': first.state,
+      'venue_count': first.area_venue_count,
+      'upcoming_shows_count': first.area_upcoming_shows_count,
+      'venues': ({
+        'id': row.id,
+        'name': row.name,
+        'num_upcoming_shows': row.num_upcoming_shows
+      } for row in itertools.chain([first], rows))
+    }
+
+  areas = (area(rows) for key, rows in itertools.groupby(page, key=lambda row: (row.state, row.city)))
+  return render_listing('pages/venues.html', areas=areas, page=page, rollups=rollups)
+
+@bp.route('/venues/search', methods=['POST'])
+@read_only
+def search_venues():
+  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # seach for Hop should return "The Musical Hop".
+  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+  search_term = request.form.get('search_term', '')
+  response = search_with_upcoming(Venue, search_term)
+  return render_template('pages/search_venues.html', results=response, search_term=search_term)
+
+def venue_detail(venue_id):
+  # the venue page's data, shared by the HTML page and the JSON API.
+  venue = loaded(Venue, 'detail').get_or_404(venue_id)
+  query = db.session.query(
+    Show.start_time,
+    Artist.id.label('artist_id'),
+    Artist.name.label('artist_name'),
+    Artist.image_link.label('artist_image_link')
+  ).join(Artist, Show.artist_id == Artist.id).filter(Show.venue_id == venue_id)
+  upcoming, past = split_shows(query)
+
+  upcoming_shows, past_shows = [[{
+    "artist_id": show.artist_id,
+    "artist_name": show.artist_name,
+    "artist_image_link": show.artist_image_link,
+    "start_time": show.start_time
+  } for show in shows] for shows in (upcoming, past)]
+
+  data={
+    "id": venue.id,
+    "name": venue.name,
+    "genres": [genre.name for genre in venue.genres],
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "website": venue.website,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description":venue.seeking_description,
+    "image_link": venue.image_link,
+    "past_shows": past_shows,
+    "upcoming_shows": upcoming_shows,
+    "past_shows_count": venue.past_shows_count,
+    "upcoming_shows_count": venue.upcoming_shows_count
+  }
+  return data
+
+@bp.route('/venues/<int:venue_id>')
+@conditional(Venue, 'venue_id')
+@page_cache.cached('venue', 'venue_id')
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  data = venue_detail(venue_id)
+  
+  return render_template('pages/show_venue.html', venue=data)
+
+@bp.route('/venues/<int:venue_id>/calendar')
+def venue_calendar(venue_id):
+  # ?from=YYYY-MM-DD&to=YYYY-MM-DD, both days included (default: the next
+  # 30 days); the shows booked at the venue in that range, as JSON.
+  try:
+    first = date.fromisoformat(request.args['from']) if request.args.get('from') else date.today()
+    last = date.fromisoformat(request.args['to']) if request.args.get('to') else first + timedelta(days=29)
+  except ValueError:
+    return jsonify({'error': 'from and to must be dates (YYYY-MM-DD)'}), 400
+  days = (last - first).days + 1
+  if not 0 < days <= current_app.config['CALENDAR_MAX_DAYS']:
+    return jsonify({'error': 'to must be on or after from, at most %d days later'
+                             % (current_app.config['CALENDAR_MAX_DAYS'] - 1)}), 400
+  if db.session.query(Venue.id).filter_by(id=venue_id).first() is None:
+    return jsonify({'error': 'not found'}), 404
+
+  start = datetime.combine(first, time.min)
+  slots = venue_bookings(db.session.query(
+    Show.id,
+    Show.start_time,
+    Show.end_time,
+    Artist.id.label('artist_id'),
+    Artist.name.label('artist_name')
+  ).join(Artist, Show.artist_id == Artist.id), venue_id, start, start + timedelta(days=days))
+
+  return jsonify({
+    'venue_id': venue_id,
+    'from': first.isoformat(),
+    'to': last.isoformat(),
+    'slots': [{
+      'show_id': slot.id,
+      'start_time': slot.start_time.isoformat(),
+      'end_time': slot.end_time.isoformat(),
+      'artist_id': slot.artist_id,
+      'artist_name': slot.artist_name
+    } for slot in slots]
+  })
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/create', methods=['GET'])
+def create_venue_form():
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+  # TODO: insert form data as a new Venue record in the db, instead
+  # TODO: modify data to be the data object returned from db insertion
+  form = VenueForm(request.form, meta={'csrf': False})
+  if form.validate():
+    try:
+      venue = Venue(name = form.name.data,
+      city = form.city.data,
+      state = form.state.data,
+      address = form.address.data,
+      phone = form.phone.data,
+      genres = Genre.named(form.genres.data),
+      facebook_link = form.facebook_link.data,
+      image_link = form.image_link.data,
+      website = form.website_link.data,
+      seeking_talent = form.seeking_description.data,
+      seeking_description = form.seeking_description.data)
+      
+      db.session.add(venue)
+      db.session.flush()
+      venue_id = venue.id
+      db.session.commit()
+      invalidate_venue_pages()
+      typeahead.update('venue', venue_id, form.name.data, form.city.data, form.state.data)
+      # on successful db insert, flash success
+      flash('Venue ' + request.form['name'] + ' was successfully listed!')
+    except ValueError as e:
+      print(e)
+
+  else:
+    #  on unsuccessful db insert, flash an error instead.
+    # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+    # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+    message = []
+    for field, err in form.errors.items():
+      message.append(field + ' ' + '|'.join(err))
+    flash('Errors ' + str(message))
+    form = VenueForm()
+    return render_template('forms/new_venue.html', form=form)
+  return render_template('pages/home.html')   
+    
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  # TODO: Complete this endpoint for taking a venue_id, and using
+  # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+
+  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+  # clicking that button delete it from the db then redirect the user to the homepage
+  return None
+#  Update
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+def edit_venue(venue_id):
+  form = VenueForm()
+  venue = loaded(Venue, 'detail').get_or_404(venue_id)
+  form = VenueForm(obj=venue)
+  form.genres.data = [genre.name for genre in venue.genres]
+  
+  #
+  #  TODO: populate form with values from venue with ID <venue_id>
+  return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+  form = VenueForm(request.form, meta={'csrf': False})
+  if form.validate():
+        try:
+            venue = loaded(Venue, 'detail').get_or_404(venue_id)
+            venue.name = form.name.data
+            venue.genres=Genre.named(form.genres.data)
+            venue.address=form.address.data
+            venue.city=form.city.data
+            venue.state=form.state.data
+            venue.phone=form.phone.data
+            venue.website_link=form.website_link.data
+            venue.facebook_link=form.facebook_link.data
+            venue.seeking_telant=form.seeking_talent.data
+            venue.seeking_disctiption=form.seeking_description.data
+            venue.image_link = form.image_link.data
+            db.session.commit()
+            invalidate_venue_pages(venue_id)
+            typeahead.update('venue', venue_id, form.name.data, form.city.data, form.state.data)
+            flash("venue " + venue.name + " was successfully edited!")
+        except:
+            db.session.rollback()
+            flash("Venue was not edited successfully.")
+        finally:
+            db.session.close()
+  else:
+      print("\n\n", form.errors)
+      flash("Venue was not edited successfully.")
+  # TODO: take values from the form submitted, and update existing
+  # venue record with ID <venue_id> using the new attributes
+  return redirect(url_for('venues.show_venue', venue_id=venue_id))
+
+#  Genres
+#  ----------------------------------------------------------------
+
+@bp.route('/genres/<name>/venues')
+def genre_venues(name):
+  return render_venue_directory(genre_filter(db.session.query(Venue), Venue, venue_genre, name))
@@ -0,0 +1,71 @@
+#----------------------------------------------------------------------------#
+# Entity versions.
+#
+# Venues and artists carry a version, bumped by every write that changes
+# what their pages show, and updated_at, the (UTC) time of that write;
+# conditional.py serves them as ETag and Last-Modified.
+#
+# An edit bumps the edited row. A new name or image also bumps the rows
+# whose pages list it: an artist's venues, a venue's artists. Show writes,
+# the sweep and reconcile bump the venues and artists whose counters they
+# change, in the counter update itself (counters.py). As the pages split
+# their shows where the sweep did, a show starting changes neither the
+# page nor its version until it is swept.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from sqlalchemy import DateTime, event, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import attributes, object_session
+from sqlalchemy.sql.functions import FunctionElement
+
+# what a venue page shows of each artist, and an artist page of each venue
+LISTED = ('name', 'image_link')
+
+
+class utcnow(FunctionElement):
+  '''The database's current UTC time, as a DateTime without a zone: the
+  server default of updated_at, for rows inserted without the ORM (bulk.py
+  imports by COPY on Postgres).'''
+  type = DateTime()
+
+
+@compiles(utcnow)
+def _utcnow(element, compiler, **kw):
+  # SQLite's CURRENT_TIMESTAMP is UTC
+  return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+  return "(now() AT TIME ZONE 'utc')"
+
+
+def bumped(table, now=None):
+  '''Values for an UPDATE that marks rows of `table` changed.'''
+  return {'version': table.c.version + 1, 'updated_at': now or datetime.utcnow()}
+
+
+class EntityVersions(object):
+
+  def __init__(self, show, venue, artist):
+    show = show.__table__
+    # model: (the table listing it, the show column of its id, of theirs)
+    self.listed_by = {
+      venue: (artist.__table__, show.c.venue_id, show.c.artist_id),
+      artist: (venue.__table__, show.c.artist_id, show.c.venue_id),
+    }
+    for model in (venue, artist):
+      event.listen(model, 'before_update', self._updated)
+
+  def _updated(self, mapper, connection, instance):
+    # also fires for rows with no net change, which keep their version.
+    if not object_session(instance).is_modified(instance):
+      return
+    now = datetime.utcnow()
+    for name, value in bumped(mapper.local_table, now).items():
+      setattr(instance, name, value)
+    if any(attributes.get_history(instance, name).has_changes() for name in LISTED):
+      table, own, theirs = self.listed_by[mapper.class_]
+      listing = select([theirs]).where(own == instance.id)
+      connection.execute(table.update().where(table.c.id.in_(listing)).values(**bumped(table, now)))
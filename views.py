@@ -0,0 +1,142 @@
+#----------------------------------------------------------------------------#
+# Helpers shared by the venue, artist, show and API blueprints.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+from flask import current_app, render_template, request, Response, stream_with_context
+import search
+import bookings
+from extensions import db, page_cache
+from models import Genre, Show, counters
+
+#----------------------------------------------------------------------------#
+# Queries.
+#----------------------------------------------------------------------------#
+
+def search_with_upcoming(model, search_term):
+  # matches come from the search index, ranked by relevance, and only the
+  # SEARCH_LIMIT best are shown; upcoming show counts are maintained on the
+  # rows, so a search is a single join. A term shorter than
+  # SEARCH_MIN_LENGTH (an empty one would list the whole table) is not run.
+  config = current_app.config
+  if len(search_term.strip()) < config['SEARCH_MIN_LENGTH']:
+    return {'count': 0, 'data': [], 'min_length': config['SEARCH_MIN_LENGTH']}
+  limit = config['SEARCH_LIMIT']
+  # one row more than is shown tells whether there were more
+  matches = search.matches(model, search_term, db.engine.dialect.name, limit + 1)
+  rows = db.session.query(
+    model.id,
+    model.name,
+    model.upcoming_shows_count
+  ).join(matches, matches.c.id == model.id) \
+   .order_by(matches.c.rank.desc(), model.name, model.id) \
+   .all()
+
+  data = [{
+    'id': entity_id,
+    'name': name,
+    'num_upcoming_shows': num_upcoming_shows
+  } for entity_id, name, num_upcoming_shows in rows[:limit]]
+  return {'count': len(data), 'data': data, 'more': len(rows) > limit}
+
+def split_shows(query):
+  # upcoming and past shows are two bounded range scans over the
+  # (venue_id, start_time) / (artist_id, start_time) indexes; their totals
+  # are the entity's maintained counters. Both split at the sweep
+  # watermark, not the clock, so a list always agrees with its total and
+  # a page only changes when a write or a sweep gives it a new version.
+  swept_until = counters.watermark()
+  limit = current_app.config['DETAIL_SHOWS_LIMIT']
+  upcoming = query.filter(Show.start_time > swept_until).order_by(Show.start_time).limit(limit).all()
+  past = query.filter(Show.start_time <= swept_until).order_by(Show.start_time.desc()).limit(limit).all()
+  return upcoming, past
+
+def venue_bookings(query, venue_id, start, end):
+  # shows holding the venue at any time in [start, end), found through the
+  # booking index rather than by reading the venue's whole history.
+  overlapping = bookings.overlapping(Show.__table__, [venue_id], start, end, db.engine.dialect.name)
+  return query.filter(overlapping).order_by(Show.start_time)
+
+#----------------------------------------------------------------------------#
+# Rendering.
+#----------------------------------------------------------------------------#
+
+def stream_template(template_name, **context):
+  # the layout goes out before the rows are even fetched; rows then flush
+  # every STREAM_BUFFER template chunks instead of one string at the end.
+  current_app.update_template_context(context)
+  stream = current_app.jinja_env.get_template(template_name).stream(context)
+  stream.enable_buffering(current_app.config['STREAM_BUFFER'])
+  return Response(stream_with_context(stream))
+
+def render_listing(template_name, **context):
+  if current_app.config['STREAM_LISTINGS']:
+    return stream_template(template_name, **context)
+  return render_template(template_name, **context)
+
+#----------------------------------------------------------------------------#
+# Page cache invalidation.
+#----------------------------------------------------------------------------#
+
+# Each write drops exactly the cached pages that render what it changed.
+
+def invalidate_venue_pages(venue_id=None):
+  # no id: a new venue, which only appears in the directory so far.
+  page_cache.invalidate('venues')
+  if venue_id is None:
+    return
+  # the venue's name also appears on /shows and on the pages of artists
+  # who have shows there.
+  page_cache.invalidate('venue', [venue_id])
+  page_cache.invalidate('shows')
+  artist_ids = db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()
+  page_cache.invalidate('artist', [artist_id for artist_id, in artist_ids])
+
+def invalidate_artist_pages(artist_id=None):
+  page_cache.invalidate('artists')
+  if artist_id is None:
+    return
+  page_cache.invalidate('artist', [artist_id])
+  page_cache.invalidate('shows')
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  page_cache.invalidate('venue', [venue_id for venue_id, in venue_ids])
+
+def invalidate_show_pages(venue_id, artist_id):
+  # a new show changes both detail pages, /shows and the upcoming counts
+  # on the venue directory.
+  page_cache.invalidate('shows')
+  page_cache.invalidate('venues')
+  page_cache.invalidate('venue', [venue_id])
+  page_cache.invalidate('artist', [artist_id])
+
+def sweep_counters(every=None):
+  # move the shows that have started from the upcoming to the past counts
+  # (counters.py) and drop the pages showing them. With `every` (seconds),
+  # only once the last sweep, by any process, is that old.
+  connection = db.session.connection()
+  if every and datetime.now() - counters.swept_until(connection) < timedelta(seconds=every):
+    db.session.rollback()
+    return set(), set()
+  venue_ids, artist_ids = counters.sweep(connection)
+  db.session.commit()
+  if venue_ids:
+    page_cache.invalidate('venues')
+    page_cache.invalidate('venue', venue_ids)
+    page_cache.invalidate('artist', artist_ids)
+  return venue_ids, artist_ids
+
+#----------------------------------------------------------------------------#
+# Genre browsing.
+#----------------------------------------------------------------------------#
+
+def genre_filter(query, model, association, name):
+  # genre name -> id through the unique name index, then the
+  # (genre_id, <entity>_id) index; ?city= and ?state= narrow further.
+  genre = Genre.query.filter_by(name=name).first_or_404()
+  query = query.join(association, association.c[model.__tablename__ + '_id'] == model.id) \
+               .filter(association.c.genre_id == genre.id)
+  if request.args.get('state'):
+    query = query.filter(model.state == request.args['state'])
+  if request.args.get('city'):
+    query = query.filter(model.city == request.args['city'])
+  return query